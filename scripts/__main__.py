@@ -1,12 +1,30 @@
-"""The file to run the program"""
+"""The file to run the program
 
+    python scripts                      plans the evaluation maps (like `python scripts plan`)
+    python scripts plan [maps ...]      plans maps and saves the movements of the robot
+    python scripts batch <maps> ...     plans many maps in parallel (see `batch.py`)
+    python scripts tune ...             searches the best planner weights (see `tuner.py`)
+    python scripts render <map> ...     shows the simulation of a map, or saves it as a video
+    python scripts replay <scripts> ... replays movement scripts on their maps (see `replay.py`)
+
+The modules are only imported by the commands that use them : matplotlib is only loaded to render a simulation.
+"""
+
+import argparse
+import os
+import sys
 import inoutfilereader as io
 import pathsearch as ps
-import visualise as vs
+import pipeline
+import instrumentation as instr
+import scoring
+from plancache import PlanCache
 
+# The maps planned when none are given
+EVAL_MAPS = [os.path.join('examples', 'maps-eval', f'donnees-map-{mapId}.txt') for mapId in range(1, 11)]
 
 
-def runSimulation(filename, outDir, outFilename, show=True):
+def runSimulation(filename, outDir, outFilename, show=True, withinBudget=False, cache=None, deadline=None, records=None, router='midpoint', solver='heuristic'):
     """
     Run the simulation for a given map file.
 
@@ -15,29 +33,125 @@ def runSimulation(filename, outDir, outFilename, show=True):
 
     Args:
         path (str): The file path to load the cylinder data from.
+        show (bool, optional): Whether to show the simulation (which loads matplotlib). Defaults to True.
+        withinBudget (bool, optional): Whether to only plan the cylinders that can be collected before running out of time or fuel. Defaults to False.
+        cache (PlanCache, optional): The cache of the plans, to not plan again a map already planned. Defaults to no cache.
+        deadline (float, optional): If given, the best plan found within this time (s) is used instead (see `anytime.planWithDeadline`),
+            which always plans within the budget, with the heuristic and without a cache.
+        records (list, optional): If given, the counters and timers of the run are measured and added to it (see `instrumentation.record`).
+        router (str, optional): The router of the avoidance paths, 'midpoint' or 'visibility'. Defaults to 'midpoint'.
+        solver (str, optional): The solver of the order, 'heuristic', 'exact' or 'alns' (see `pipeline.planMap`). Defaults to 'heuristic'.
+
+    Raises:
+        ValueError: If a deadline is given with a whole tour, a cache or another solver than the heuristic.
     """
+    if deadline is not None and (not withinBudget or cache is not None or solver != 'heuristic'):
+        raise ValueError("A deadline only plans within the budget, with the heuristic and without a cache")
+    if records is not None:
+        with instr.recording() as measures:
+            points = runSimulation(filename, outDir, outFilename, show, withinBudget, cache, deadline, router=router, solver=solver)
+        records.append({'map': filename, 'points': points, **measures})
+        return points
     # Load cylinder data from the file
-    cylinders = io.loadCylinders(filename)
-    # Find a dumb of exploration of cylinders
-    dumbOrder = ps.dumbOrderOfCylinders(cylinders, (0, 0))
-    # Improve it wit 2-opt
-    improvedOrder = ps.improveWith2Opt(cylinders, dumbOrder)
-    # Generate the path from the best order
-    path = ps.pathFromCylindersOrder(cylinders, improvedOrder, (0, 0))
-    # Generate the movements for the robot
-    movements = ps.generateMouvement(path)
+    with instr.stage('load'):
+        cylinders = io.loadCylinders(filename)
+    # Find the order of the cylinders, the path and the movements for the robot (or take them from the cache)
+    if deadline is not None:
+        import anytime
+        _, path, _ = anytime.planWithDeadline(cylinders, deadline, distances=ps.AvoidanceDistances(cylinders, router=router))
+        movements = ps.generateMouvement(path)
+    else:
+        _, path, movements = pipeline.planMovements(cylinders, (0, 0), withinBudget, cache=cache, router=router, solver=solver)
     # Save the movements to a file
     io.saveMovements(movements, outFilename, outDir)
     # Visualize the path
     if show:
+        import visualise as vs
         return vs.showSimulation(cylinders, (0, 0), path)
     else:
-        return vs.justEstimatePoints(path, cylinders)
+        return scoring.scorePath(path, cylinders).points
 
 
-if __name__ == "__main__":
+def plan(arguments):
+    """
+    The `plan` command : plans each map, saves its movements as `script-<map>.txt` and prints the points.
+    """
+    cache = PlanCache(arguments.cache) if arguments.cache is not None else None
+    records = [] if arguments.records is not None else None
     points = []
-    for mapId in range(1,11):
-        points.append(runSimulation(f'examples\maps-eval\donnees-map-{mapId}.txt', 'dist', f'script-{mapId}.txt', show=False))
+    for mapId, filename in enumerate(arguments.maps or EVAL_MAPS, 1):
+        # The evaluation maps keep their number in the name of their script
+        name = mapId if not arguments.maps else os.path.splitext(os.path.basename(filename))[0]
+        points.append(runSimulation(filename, arguments.out, f'script-{name}.txt', show=arguments.show, withinBudget=not arguments.whole_tour,
+                                    cache=cache, deadline=arguments.deadline, records=records, router=arguments.router, solver=arguments.solver))
+    if records is not None:
+        import json
+        with open(arguments.records, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
     print(points)
-    print(sum(points)/len(points))
\ No newline at end of file
+    print(sum(points)/len(points))
+
+
+def render(arguments):
+    """
+    The `render` command : plans a map, then shows its simulation or saves it as a video.
+    """
+    import visualise as vs
+    cylinders = io.loadCylinders(arguments.map)
+    cache = PlanCache(arguments.cache) if arguments.cache is not None else None
+    _, path, _ = pipeline.planMovements(cylinders, (0, 0), not arguments.whole_tour, cache=cache, router=arguments.router, solver=arguments.solver)
+    if arguments.out is None:
+        points = vs.showSimulation(cylinders, (0, 0), path)
+    else:
+        points = vs.saveSimulation(cylinders, (0, 0), path, arguments.out, fps=arguments.fps)
+        print(f"Saved in {arguments.out}")
+    print(points)
+
+
+def main(argv=None):
+    """
+    Runs the command given on the command line (see the documentation of this file).
+    """
+    parser = argparse.ArgumentParser(prog='scripts', description="Plan the path of the robot that collects the cylinders.")
+    subparsers = parser.add_subparsers(dest='command')
+    planParser = subparsers.add_parser('plan', help="Plan maps and save the movements of the robot.")
+    planParser.add_argument('maps', nargs='*', help="The map files. Defaults to the evaluation maps.")
+    planParser.add_argument('--out', default='dist', help="The directory where the movements are saved. Defaults to 'dist'.")
+    planParser.add_argument('--deadline', type=float, default=None, help="Use the best plan found within this time (s).")
+    planParser.add_argument('--records', default=None, help="A JSON lines file where the measures of each map are saved.")
+    planParser.add_argument('--show', action='store_true', help="Show the simulation of each map.")
+    renderParser = subparsers.add_parser('render', help="Show the simulation of a map, or save it as a video.")
+    renderParser.add_argument('map', help="The map file.")
+    renderParser.add_argument('--out', default=None, help="A .gif or .mp4 file where the simulation is saved instead of shown.")
+    renderParser.add_argument('--fps', type=int, default=4)
+    for commandParser in (planParser, renderParser):
+        commandParser.add_argument('--router', choices=ps.ROUTERS, default='midpoint', help="The router of the paths around the cylinders.")
+        commandParser.add_argument('--solver', choices=pipeline.SOLVERS, default='heuristic',
+                                   help=f"'exact' finds the best order on the maps of at most {pipeline.exactsolver.EXACT_MAX_CYLINDERS} cylinders (a few seconds each), "
+                                        f"'alns' improves the heuristic order for {pipeline.metaheuristic.CHAINS * pipeline.metaheuristic.TIME_BUDGET:g} s of CPU.")
+        commandParser.add_argument('--whole-tour', action='store_true', help="Plan all the cylinders instead of only the ones within the budget.")
+        commandParser.add_argument('--cache', default=None, help="The directory of a cache of the plans, to not plan again the same maps. Defaults to no cache.")
+    # These commands have their own options
+    subparsers.add_parser('batch', help="Plan many maps in parallel (see `batch --help`).", add_help=False)
+    subparsers.add_parser('tune', help="Search the best planner weights with CMA-ES (see `tune --help`).", add_help=False)
+    subparsers.add_parser('replay', help="Replay movement scripts on their maps (see `replay --help`).", add_help=False)
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['batch']:
+        import batch
+        return batch.main(argv[1:], prog='scripts batch')
+    if argv[:1] == ['replay']:
+        import replay
+        return replay.main(argv[1:], prog='scripts replay')
+    if argv[:1] == ['tune']:
+        import tuner
+        return tuner.main(argv[1:], prog='scripts tune')
+    arguments = parser.parse_args(argv)
+    if arguments.command == 'render':
+        render(arguments)
+    else:
+        plan(arguments if arguments.command == 'plan' else parser.parse_args(['plan']))
+
+
+if __name__ == "__main__":
+    main()
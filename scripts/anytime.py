@@ -0,0 +1,169 @@
+"""Anytime planning : a plan is ready at once, and it is improved in the background until the caller takes it."""
+import threading
+import time
+import pathsearch as ps
+import localsearch as ls
+import orienteering as ori
+import scoring
+
+
+class AnytimePlanner:
+    """
+    Plans a map within a wall-clock budget. The greedy plan is made when the planner is created, then a background thread
+    tries better plans (2-opt, then rounds of the orienteering planner) and keeps the one that scores the most points.
+    The best plan found so far can be taken at any time. The 2-opt is done by slices of the time budget, so that the
+    thread stops soon after it is asked to.
+
+    Attributes:
+        cylinders (CylinderSet): The cylinders of the map.
+        initialPosition (tuple): The starting position as a tuple (x, y).
+        distances (AvoidanceDistances): The distance matrix of the map, only used by the background thread once started.
+        config (PlannerConfig): The weights to use.
+        history (list): The progress, as (seconds since the creation, points, stage) for each better plan.
+        error (Exception): The exception raised in the background thread, if any.
+    """
+
+    def __init__(self, cylinders, initialPosition=(0, 0), distances=None, config=None, onProgress=None):
+        """
+        Makes the greedy plan of a map.
+
+        Args:
+            cylinders (list): A list of cylinder objects.
+            initialPosition (tuple, optional): The starting position as a tuple (x, y). Defaults to (0, 0).
+            distances (AvoidanceDistances, optional): The distance matrix of the map, built if not given.
+            config (PlannerConfig, optional): The weights to use. Defaults to the module globals of `pathsearch`.
+            onProgress (function, optional): Called with (seconds since the creation, points, stage) each time a better plan is found.
+        """
+        self.startTime = time.perf_counter()
+        self.initialPosition = initialPosition
+        self.distances = distances if distances is not None else ps.AvoidanceDistances(cylinders, initialPosition)
+        self.cylinders = self.distances.cylinders
+        self.config = config
+        self.onProgress = onProgress
+        self.history = []
+        self.error = None
+        self._best = None
+        self._lock = threading.Lock()
+        self._stopEvent = threading.Event()
+        self._thread = None
+        self.greedyOrder = ps.dumbOrderOfCylinders(self.cylinders, initialPosition, self.distances, config)
+        self._offer(self.greedyOrder, 'greedy')
+
+    def _offer(self, order, stage):
+        """
+        Keeps a plan if it scores more points than the best one (or as many with less time). Returns whether it was kept.
+        A plan found after the planner was stopped is not kept, so the plan taken at the deadline doesn't change anymore.
+        """
+        path = ps.pathFromCylindersOrder(self.cylinders, order, self.initialPosition, self.distances)
+        score = scoring.scorePath(path, self.cylinders)
+        with self._lock:
+            if self._stopEvent.is_set() or self._best is not None and (score.points, -score.time) <= (self._best[2].points, -self._best[2].time):
+                return False
+            self._best = (list(order), path, score)
+        elapsed = time.perf_counter() - self.startTime
+        self.history.append((elapsed, score.points, stage))
+        if self.onProgress is not None:
+            self.onProgress(elapsed, score.points, stage)
+        return True
+
+    def _improve(self, rounds, timeBudget):
+        """
+        The work of the background thread, that stops between two steps when asked to.
+        """
+        try:
+            # A slice of the 2-opt that ends before its time budget has reached a local optimum
+            order = list(self.greedyOrder)
+            while True:
+                if self._stopEvent.is_set():
+                    return
+                sliceStart = time.perf_counter()
+                improvedOrder = ls.twoOpt(self.distances, order, timeBudget=timeBudget, config=self.config)
+                converged = time.perf_counter() - sliceStart < timeBudget / 1000
+                if improvedOrder != order:
+                    order = improvedOrder
+                    self._offer(order, '2opt')
+                if converged:
+                    break
+            # Each round starts from the best plan, and it stops when a round doesn't find a better one
+            planner = ori.OrienteeringPlanner(self.distances, config=self.config)
+            for _ in range(rounds):
+                if self._stopEvent.is_set() or not self._offer(planner.plan(self.best()[0], rounds=1, timeBudget=timeBudget), 'orienteering'):
+                    return
+        except Exception as exc:
+            self.error = exc
+
+    def start(self, rounds=10, timeBudget=50):
+        """
+        Starts improving the plan in a background thread.
+
+        Args:
+            rounds (int, optional): The maximum number of rounds of the orienteering planner. Defaults to 10.
+            timeBudget (float, optional): The time given to each local search and each slice of the 2-opt, in milliseconds. Defaults to 50.
+
+        Returns:
+            AnytimePlanner: The planner itself.
+        """
+        self._thread = threading.Thread(target=self._improve, args=(rounds, timeBudget), daemon=True)
+        self._thread.start()
+        return self
+
+    def best(self):
+        """
+        Returns the best plan found so far.
+
+        Returns:
+            tuple: The order of the cylinders, the path and its `PathScore`.
+        """
+        with self._lock:
+            return self._best
+
+    def isRunning(self):
+        """
+        Returns whether the background thread is still improving the plan.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        """
+        Waits until the background thread has finished, or for at most `timeout` seconds.
+
+        Returns:
+            bool: Whether it has finished.
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.isRunning()
+
+    def stop(self, wait=False):
+        """
+        Asks the background thread to stop after its current step.
+
+        Args:
+            wait (bool, optional): Whether to wait until it has stopped. Defaults to False.
+        """
+        self._stopEvent.set()
+        if wait:
+            self.wait()
+
+
+def planWithDeadline(cylinders, deadline, initialPosition=(0, 0), distances=None, config=None, onProgress=None):
+    """
+    Returns the best plan found before a deadline. The greedy plan is always returned, even if the deadline is already over.
+    It waits for the background thread to finish its current step, so that nothing is still planning once it returns.
+
+    Args:
+        cylinders (list): A list of cylinder objects.
+        deadline (float): The time given to the planning, in seconds.
+        initialPosition (tuple, optional): The starting position as a tuple (x, y). Defaults to (0, 0).
+        distances (AvoidanceDistances, optional): The distance matrix of the map, built if not given.
+        config (PlannerConfig, optional): The weights to use. Defaults to the module globals of `pathsearch`.
+        onProgress (function, optional): Called with (seconds since the start, points, stage) each time a better plan is found.
+
+    Returns:
+        tuple: The order of the cylinders, the path and its `PathScore`.
+    """
+    planner = AnytimePlanner(cylinders, initialPosition, distances, config, onProgress)
+    planner.start()
+    planner.wait(max(0, deadline - (time.perf_counter() - planner.startTime)))
+    planner.stop(wait=True)
+    return planner.best()
@@ -0,0 +1,201 @@
+"""Planning of many maps in parallel, on all the cores of the computer."""
+import argparse
+import concurrent.futures as cf
+import glob
+import json
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+import numpy as np
+import inoutfilereader as io
+import instrumentation as instr
+import mappack
+import pipeline
+import pathsearch as ps
+import scoring
+from plancache import PlanCache
+from simulation import CylinderSet
+
+
+def findMaps(pattern):
+    """
+    Returns the map files given by a glob pattern or a directory.
+
+    Args:
+        pattern (str): A glob pattern (like `examples/maps-eval/*.txt`) or a directory that contains `.txt` map files.
+
+    Returns:
+        list: The sorted paths of the map files.
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*.txt')
+    return sorted(glob.glob(pattern))
+
+
+# The maps of a worker, set once by `_initWorker`
+_worker = {}
+
+
+def _initWorker(source, paths, options):
+    """
+    Gives the maps to a worker once, so they are not copied for each map : the source is either ('shared', name, shape, offsets)
+    for the arrays of all the maps in a shared memory block, or ('pack', path) for a map pack that each worker memory-maps.
+    """
+    if source[0] == 'pack':
+        pack = mappack.MapPack(source[1])
+        _worker['loadMap'] = pack.cylinders
+    else:
+        _, sharedName, shape, offsets = source
+        sharedBlock = shared_memory.SharedMemory(name=sharedName)
+        _worker['sharedBlock'] = sharedBlock
+        maps = np.ndarray(shape, dtype=float, buffer=sharedBlock.buf)
+        _worker['loadMap'] = lambda mapIndex: CylinderSet.fromArray(maps[offsets[mapIndex]:offsets[mapIndex + 1]])
+    _worker['paths'] = paths
+    _worker['options'] = options
+    _worker['cache'] = PlanCache(options['cacheDir']) if options['cacheDir'] is not None else None
+
+
+def _planMap(mapIndex):
+    """
+    Plans one of the maps of the worker and returns its result (with its measures if the instrumentation is asked).
+    """
+    if _worker['options']['instrument']:
+        with instr.recording() as measures:
+            result = _planMapWithoutMeasures(mapIndex)
+        result['instrumentation'] = measures
+        return result
+    return _planMapWithoutMeasures(mapIndex)
+
+
+def _planMapWithoutMeasures(mapIndex):
+    """
+    Plans one of the maps of the worker and returns its result.
+    """
+    startTime = time.perf_counter()
+    options = _worker['options']
+    cylinders = _worker['loadMap'](mapIndex)
+    order, path, movements = pipeline.planMovements(cylinders, (0, 0), withinBudget=options['withinBudget'], cache=_worker['cache'], router=options['router'], solver=options['solver'])
+    planTime = time.perf_counter() - startTime
+    # Save the movements for the robot
+    if options['outDir'] is not None:
+        name = os.path.splitext(os.path.basename(_worker['paths'][mapIndex]))[0]
+        io.saveMovements(movements, f'script-{name}.txt', options['outDir'])
+    result = {
+        'map': _worker['paths'][mapIndex],
+        'points': scoring.scorePath(path, cylinders).points,
+        'order': order,
+        'planSeconds': planTime,
+        'seconds': time.perf_counter() - startTime,
+    }
+    if options['withMovements']:
+        result['movements'] = movements
+    return result
+
+
+def planMaps(paths, outDir=None, withinBudget=True, workers=None, cacheDir=None, instrument=False, router='midpoint', withMovements=False, solver='heuristic'):
+    """
+    Plans many maps in parallel and yields the result of each map as soon as it is finished.
+    The maps are loaded once and shared with all the workers (only the index of a map is sent for each task).
+
+    Args:
+        paths (list or str): The paths of the map files, or the path of a map pack (see `mappack`) whose maps are named after their name in the pack.
+        outDir (str, optional): The directory where the movements of each map are saved. Defaults to not saving them.
+        withinBudget (bool, optional): Whether to only plan the cylinders that can be collected. Defaults to True.
+        workers (int, optional): The number of processes. Defaults to the number of cores.
+        cacheDir (str, optional): The directory of a plan cache shared by the workers. Defaults to no cache.
+        instrument (bool, optional): Whether to add the counters and timers of each map to its result, as 'instrumentation'. Defaults to False.
+        router (str, optional): The router of the avoidance paths, 'midpoint' or 'visibility'. Defaults to 'midpoint'.
+        withMovements (bool, optional): Whether to add the movements to the result of each map, as 'movements' (to write them
+            all in one `inoutfilereader.ScriptArchive` instead of one file per map). Defaults to False.
+        solver (str, optional): The solver of the order, 'heuristic', 'exact' or 'alns' (see `pipeline.planMap`). Defaults to 'heuristic'.
+
+    Yields:
+        dict: The result of a map, with its path, points, order and timings (in seconds), or its path and an 'error'
+        if it couldn't be planned (the other maps are still planned).
+    """
+    options = {'outDir': outDir, 'withinBudget': withinBudget, 'cacheDir': cacheDir, 'instrument': instrument, 'router': router, 'withMovements': withMovements, 'solver': solver}
+    # A pack is already a file that the workers can memory-map
+    if isinstance(paths, str):
+        names = mappack.MapPack(paths).names
+        yield from _planWithWorkers(('pack', paths), names, options, workers)
+        return
+    # We put all the maps one after the other in a shared memory block
+    mapArrays = [np.loadtxt(path, ndmin=2) for path in paths]
+    offsets = np.cumsum([0] + [len(mapArray) for mapArray in mapArrays]).tolist()
+    shape = (offsets[-1], 3)
+    sharedBlock = shared_memory.SharedMemory(create=True, size=max(1, offsets[-1] * 3 * np.dtype(float).itemsize))
+    try:
+        np.ndarray(shape, dtype=float, buffer=sharedBlock.buf)[:] = np.concatenate(mapArrays) if mapArrays else np.empty((0, 3))
+        yield from _planWithWorkers(('shared', sharedBlock.name, shape, offsets), list(paths), options, workers)
+    finally:
+        sharedBlock.close()
+        sharedBlock.unlink()
+
+
+def _planWithWorkers(source, paths, options, workers):
+    """
+    Plans all the maps of a source (see `_initWorker`) in a pool of processes and yields their results as they are finished.
+    A map that fails gives a result with its error instead of stopping the others.
+    """
+    with cf.ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(source, paths, options)) as executor:
+        futures = {executor.submit(_planMap, mapIndex): mapIndex for mapIndex in range(len(paths))}
+        for completedFuture in cf.as_completed(futures):
+            try:
+                yield completedFuture.result()
+            except Exception as exc:
+                yield {'map': paths[futures[completedFuture]], 'error': repr(exc)}
+
+
+def main(argv=None, prog=None):
+    """
+    Plans the maps given on the command line (see `python scripts/batch.py --help`).
+    Exits with 1 if a map can't be planned.
+
+    Args:
+        argv (list, optional): The arguments. Defaults to the arguments of the program.
+        prog (str, optional): The name of the program in the help. Defaults to the name of the script.
+    """
+    parser = argparse.ArgumentParser(prog=prog, description="Plan many maps in parallel.")
+    parser.add_argument('maps', help=f"A glob pattern or a directory of map files, or a map pack ({mappack.EXTENSION} file).")
+    parser.add_argument('--out', default=None, help="The directory where the movements are saved.")
+    parser.add_argument('--archive', default=None, help="A .zip archive or a JSON lines file where all the movements are saved.")
+    parser.add_argument('--workers', type=int, default=None, help="The number of processes.")
+    parser.add_argument('--cache', default=None, help="The directory of a cache of the plans.")
+    parser.add_argument('--records', default=None, help="A JSON lines file where the result and the measures of each map are saved.")
+    parser.add_argument('--router', choices=ps.ROUTERS, default='midpoint', help="The router of the paths around the cylinders.")
+    parser.add_argument('--solver', choices=pipeline.SOLVERS, default='heuristic', help="The solver of the order of the cylinders.")
+    parser.add_argument('--whole-tour', action='store_true', help="Plan all the cylinders instead of only the ones within the budget.")
+    arguments = parser.parse_args(argv)
+    points, errors = [], 0
+    recordsFile = open(arguments.records, 'w') if arguments.records is not None else None
+    archive = io.ScriptArchive(arguments.archive) if arguments.archive is not None else None
+    try:
+        for result in planMaps(arguments.maps if mappack.isPack(arguments.maps) else findMaps(arguments.maps), arguments.out, not arguments.whole_tour,
+                               arguments.workers, arguments.cache, recordsFile is not None, arguments.router, archive is not None, arguments.solver):
+            if 'error' in result:
+                errors += 1
+                print(f"{result['map']}: /!\\ {result['error']}")
+                if recordsFile is not None:
+                    recordsFile.write(json.dumps(result) + '\n')
+                continue
+            if archive is not None:
+                name = os.path.splitext(os.path.basename(result['map']))[0]
+                archive.write(f'script-{name}.txt', result.pop('movements'))
+            points.append(result['points'])
+            print(f"{result['map']}: {result['points']} points in {result['seconds']:.3f} s")
+            if recordsFile is not None:
+                recordsFile.write(json.dumps(result) + '\n')
+    finally:
+        if recordsFile is not None:
+            recordsFile.close()
+        if archive is not None:
+            archive.close()
+    if points:
+        print(f"Average points: {sum(points) / len(points)}")
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
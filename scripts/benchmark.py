@@ -0,0 +1,201 @@
+"""Benchmark of the planning stages on synthetic maps, with JSON results that can be compared between commits."""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import inoutfilereader as io
+import localsearch as ls
+import mapgen
+import pathsearch as ps
+import scoring
+
+# The stages of the planning, in the order they are run
+STAGES = ('load', 'greedy', '2opt', 'path', 'movements', 'scoring')
+
+
+def _commit():
+    """
+    Returns the git commit of the scripts, or `None` if it isn't known.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmarkMap(filename, twoOpt='classic', trackMemory=False, router='midpoint'):
+    """
+    Plans a map file stage by stage and measures each stage.
+
+    Args:
+        filename (str): The path of the map file.
+        twoOpt (str, optional): 'classic' for `pathsearch.improveWith2Opt`, 'neighbour' for `localsearch.twoOpt`
+            (which stays fast on big maps). Defaults to 'classic'.
+        trackMemory (bool, optional): Whether to measure the memory peak of each stage with tracemalloc (which slows everything down). Defaults to False.
+        router (str, optional): The router of the avoidance paths, 'midpoint' or 'visibility'. Defaults to 'midpoint'.
+
+    Returns:
+        tuple: The measures of each stage as {stage: {'seconds', 'peakBytes'}}, the points of the path and the error that
+        stopped the planning (`None` if there was none, otherwise the stages after it are missing).
+    """
+    measures, results = {}, {}
+    stages = {
+        'load': lambda: io.loadCylinders(filename),
+        'greedy': lambda: ps.dumbOrderOfCylinders(results['load'], (0, 0), results['distances']),
+        '2opt': lambda: (ps.improveWith2Opt(results['load'], results['greedy'], results['distances']) if twoOpt == 'classic'
+                         else ls.twoOpt(results['distances'], results['greedy'])),
+        'path': lambda: ps.pathFromCylindersOrder(results['load'], results['2opt'], (0, 0), results['distances']),
+        'movements': lambda: ps.generateMouvement(results['path']),
+        'scoring': lambda: scoring.scorePath(results['path'], results['load']),
+    }
+    for stage in STAGES:
+        if trackMemory:
+            tracemalloc.start()
+        startTime = time.perf_counter()
+        try:
+            results[stage] = stages[stage]()
+        except Exception as exc:
+            return measures, None, f"{stage}: {exc!r}"
+        finally:
+            seconds = time.perf_counter() - startTime
+            peakBytes = tracemalloc.get_traced_memory()[1] if trackMemory else None
+            if trackMemory:
+                tracemalloc.stop()
+        # The distance matrix is built lazily, so its cost is in the stages that use it
+        if stage == 'load':
+            results['distances'] = ps.AvoidanceDistances(results['load'], (0, 0), router=router)
+        measures[stage] = {'seconds': seconds, 'peakBytes': peakBytes}
+    return measures, results['scoring'].points, None
+
+
+def runBenchmark(sizes=(20, 50, 100), layouts=mapgen.LAYOUTS, seed=0, repeat=1, twoOpt='classic', trackMemory=False, log=False, router='midpoint'):
+    """
+    Generates a map for each size and layout and benchmarks the planning on it.
+
+    Args:
+        sizes (tuple, optional): The numbers of cylinders. Defaults to (20, 50, 100).
+        layouts (tuple, optional): The layouts of the maps. Defaults to all of them.
+        seed (int, optional): The seed of the maps. Defaults to 0.
+        repeat (int, optional): The number of times each map is planned, the fastest time of each stage is kept. Defaults to 1.
+        twoOpt (str, optional): The 2-opt used, see `benchmarkMap`. Defaults to 'classic'.
+        trackMemory (bool, optional): Whether to measure the memory peak of each stage. Defaults to False.
+        log (bool, optional): Whether to print each result. Defaults to False.
+        router (str, optional): The router of the avoidance paths. Defaults to 'midpoint'.
+
+    Returns:
+        dict: The results, with a 'meta' part (commit, versions, options) and a 'runs' part (one for each map).
+    """
+    runs = []
+    with tempfile.TemporaryDirectory() as directory:
+        for layout in layouts:
+            for size in sizes:
+                filename = os.path.join(directory, f'{layout}-{size}-{seed}.txt')
+                mapgen.writeMap(mapgen.generateMap(size, layout, seed), filename)
+                allMeasures = [benchmarkMap(filename, twoOpt, trackMemory, router) for _ in range(repeat)]
+                # We keep the fastest time of each stage, and the error of the first run that failed
+                firstMeasures, points, error = allMeasures[0]
+                stages = {stage: {'seconds': min(measures[stage]['seconds'] for measures, _, _ in allMeasures),
+                                  'peakBytes': firstMeasures[stage]['peakBytes']}
+                          for stage in STAGES if all(stage in measures for measures, _, _ in allMeasures)}
+                error = next((error for _, _, error in allMeasures if error is not None), None)
+                run = {'name': f'{layout}-{size}-{seed}', 'layout': layout, 'size': size, 'seed': seed, 'points': points,
+                       'error': error, 'stages': stages, 'totalSeconds': sum(stage['seconds'] for stage in stages.values())}
+                runs.append(run)
+                if log:
+                    print(f"{run['name']}: {run['totalSeconds']:.3f} s, {run['points']} points ("
+                          + ', '.join(f"{stage} {measures['seconds']:.3f} s" for stage, measures in stages.items()) + ')'
+                          + (f" /!\\ {error}" if error is not None else ''))
+    meta = {
+        'commit': _commit(),
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'repeat': repeat,
+        'twoOpt': twoOpt,
+        'trackMemory': trackMemory,
+        'router': router,
+    }
+    return {'meta': meta, 'runs': runs}
+
+
+def compareResults(old, new, tolerance=0.2, minSeconds=0.005):
+    """
+    Compares two benchmark results and returns the regressions : the stages that got slower or use more memory,
+    and the maps that get fewer points.
+
+    Args:
+        old (dict): The reference results (from `runBenchmark`).
+        new (dict): The new results.
+        tolerance (float, optional): The relative increase that is allowed. Defaults to 0.2 (20 %).
+        minSeconds (float, optional): The smallest increase of time that counts, to ignore the noise of short stages. Defaults to 5 ms.
+
+    Returns:
+        list: The regressions, as dictionaries with the map, the stage (or 'points'), the measure, and the old and new values.
+    """
+    regressions = []
+    oldRuns = {run['name']: run for run in old['runs']}
+    for run in new['runs']:
+        oldRun = oldRuns.get(run['name'])
+        if oldRun is None:
+            continue
+        if run['error'] is not None and oldRun['error'] is None:
+            regressions.append({'map': run['name'], 'stage': 'error', 'measure': 'error', 'old': None, 'new': run['error']})
+        if None not in (run['points'], oldRun['points']) and run['points'] < oldRun['points']:
+            regressions.append({'map': run['name'], 'stage': 'points', 'measure': 'points', 'old': oldRun['points'], 'new': run['points']})
+        for stage, measures in run['stages'].items():
+            oldMeasures = oldRun['stages'].get(stage)
+            if oldMeasures is None:
+                continue
+            if measures['seconds'] > oldMeasures['seconds'] * (1 + tolerance) and measures['seconds'] - oldMeasures['seconds'] > minSeconds:
+                regressions.append({'map': run['name'], 'stage': stage, 'measure': 'seconds', 'old': oldMeasures['seconds'], 'new': measures['seconds']})
+            if None not in (measures['peakBytes'], oldMeasures['peakBytes']) and measures['peakBytes'] > oldMeasures['peakBytes'] * (1 + tolerance):
+                regressions.append({'map': run['name'], 'stage': stage, 'measure': 'peakBytes', 'old': oldMeasures['peakBytes'], 'new': measures['peakBytes']})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the planning stages on synthetic maps.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    runParser = subparsers.add_parser('run', help="Run the benchmark and save the results in JSON.")
+    runParser.add_argument('--out', default=None, help="The JSON file of the results. Defaults to the standard output.")
+    runParser.add_argument('--sizes', type=int, nargs='+', default=[20, 50, 100])
+    runParser.add_argument('--layouts', nargs='+', choices=mapgen.LAYOUTS, default=list(mapgen.LAYOUTS))
+    runParser.add_argument('--seed', type=int, default=0)
+    runParser.add_argument('--repeat', type=int, default=1)
+    runParser.add_argument('--two-opt', choices=('classic', 'neighbour'), default='classic')
+    runParser.add_argument('--router', choices=ps.ROUTERS, default='midpoint')
+    runParser.add_argument('--memory', action='store_true', help="Measure the memory peak of each stage (slower).")
+    compareParser = subparsers.add_parser('compare', help="Compare two JSON results, exits with 1 if there are regressions.")
+    compareParser.add_argument('old')
+    compareParser.add_argument('new')
+    compareParser.add_argument('--tolerance', type=float, default=0.2)
+    arguments = parser.parse_args()
+    if arguments.command == 'run':
+        results = runBenchmark(arguments.sizes, arguments.layouts, arguments.seed, arguments.repeat, arguments.two_opt, arguments.memory, log=arguments.out is not None, router=arguments.router)
+        if arguments.out is None:
+            json.dump(results, sys.stdout, indent=2)
+        else:
+            with open(arguments.out, 'w') as f:
+                json.dump(results, f, indent=2)
+    else:
+        with open(arguments.old) as f:
+            old = json.load(f)
+        with open(arguments.new) as f:
+            new = json.load(f)
+        for option in ('twoOpt', 'trackMemory', 'repeat', 'router'):
+            if old['meta'].get(option) != new['meta'].get(option):
+                print(f"/!\\ The results were not made with the same {option}: {old['meta'].get(option)} and {new['meta'].get(option)}")
+        regressions = compareResults(old, new, arguments.tolerance)
+        for regression in regressions:
+            print(f"{regression['map']} {regression['stage']}: {regression['measure']} {regression['old']} -> {regression['new']}")
+        print(f"{len(regressions)} regression(s) between {old['meta']['commit']} and {new['meta']['commit']}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,107 @@
+"""Vectorized tests of segments against the cylinders, with the cylinder coordinates stored as arrays."""
+import numpy as np
+import math
+
+
+def cylinderCoordinates(cylinders):
+    """
+    Returns the coordinates of the cylinders as a structure of arrays.
+
+    Args:
+        cylinders (list): A list of cylinder objects.
+
+    Returns:
+        tuple: Two numpy arrays with the x and the y coordinates of the cylinders.
+    """
+    positions = np.array([cylinder.getPosition() for cylinder in cylinders], dtype=float).reshape(-1, 2)
+    return positions[:, 0].copy(), positions[:, 1].copy()
+
+
+def firstBlockingCylinder(xs, ys, candidatesId, beginPosition, endPosition, tooCloseDistance, nearest=False):
+    """
+    Finds the cylinder that blocks the line between two points, with the same test as `pathsearch.avoidCylinder`.
+    A candidate blocks the way if it is in the circle whose diameter is the segment (extended by the too close distance)
+    and if its distance to the line is smaller than the too close distance.
+
+    Args:
+        xs (numpy.ndarray): The x coordinates of all the cylinders.
+        ys (numpy.ndarray): The y coordinates of all the cylinders.
+        candidatesId (list): The sorted id of the cylinders to test.
+        beginPosition (tuple): A tuple (x, y) representing the starting point of the line.
+        endPosition (tuple): A tuple (x, y) representing the ending point of the line.
+        tooCloseDistance (float): The distance under which a cylinder is in the way.
+        nearest (bool, optional): Whether to return the blocking cylinder the nearest to the start instead of the first one. Defaults to False.
+
+    Returns:
+        tuple: The id of the blocking cylinder, its distance to the line and the (x, y) point of the line the closest to it,
+               or `None` if nothing is in the way.
+    """
+    candidatesId = np.asarray(candidatesId, dtype=np.intp)
+    a = endPosition[1] - beginPosition[1]
+    b = beginPosition[0] - endPosition[0]
+    # A segment with no length can't be blocked
+    if candidatesId.size == 0 or (a == 0 and b == 0):
+        return None
+    cx, cy = xs[candidatesId], ys[candidatesId]
+    blocking, distances, x, y = _blockingMask(cx, cy, beginPosition, endPosition, tooCloseDistance)
+    blockingIndices = np.flatnonzero(blocking)
+    if blockingIndices.size == 0:
+        return None
+    # We take the first one, or the one whose closest point is the nearest to the start
+    index = blockingIndices[0]
+    if nearest:
+        alongLine = (x[blockingIndices] - beginPosition[0]) * -b + (y[blockingIndices] - beginPosition[1]) * a
+        index = blockingIndices[np.argmin(alongLine)]
+    # The distance is calculated again with python floats, to be exactly the one of `pathsearch.distance`
+    cylinderX, cylinderY, pointX, pointY = float(cx[index]), float(cy[index]), float(x[index]), float(y[index])
+    return int(candidatesId[index]), math.sqrt((cylinderX - pointX) ** 2 + (cylinderY - pointY) ** 2), pointX, pointY
+
+
+def segmentBlockers(xs, ys, candidatesId, beginPosition, endPosition, tooCloseDistance):
+    """
+    Finds all the cylinders that are closer to a segment than a distance. Unlike `firstBlockingCylinder`, it is the real
+    distance to the segment (not to its line), so a cylinder behind one of the ends doesn't block it.
+
+    Args:
+        xs (numpy.ndarray): The x coordinates of all the cylinders.
+        ys (numpy.ndarray): The y coordinates of all the cylinders.
+        candidatesId (list): The id of the cylinders to test.
+        beginPosition (tuple): A tuple (x, y) representing the starting point of the segment.
+        endPosition (tuple): A tuple (x, y) representing the ending point of the segment.
+        tooCloseDistance (float): The distance under which a cylinder is in the way.
+
+    Returns:
+        list: The id of the blocking cylinders.
+    """
+    candidatesId = np.asarray(candidatesId, dtype=np.intp)
+    if candidatesId.size == 0:
+        return []
+    (bx, by), (ex, ey) = beginPosition, endPosition
+    dx, dy = ex - bx, ey - by
+    cx, cy = xs[candidatesId] - bx, ys[candidatesId] - by
+    squaredLength = dx ** 2 + dy ** 2
+    # The point of the segment the closest to each cylinder
+    t = np.clip((cx * dx + cy * dy) / squaredLength, 0, 1) if squaredLength > 0 else np.zeros(candidatesId.size)
+    squaredDistances = (cx - t * dx) ** 2 + (cy - t * dy) ** 2
+    return candidatesId[squaredDistances < tooCloseDistance ** 2].tolist()
+
+
+def _blockingMask(cx, cy, beginPosition, endPosition, tooCloseDistance):
+    """
+    Returns which cylinders are in the way of the line, with their distance to it and the point of the line the closest to them.
+    The operations are done in the same order as in `pathsearch.avoidCylinder` so that the results are the same.
+    """
+    (bx, by), (ex, ey) = beginPosition, endPosition
+    # Only the cylinders in the circle of the bird flight distance diameter can be in the way
+    birdFlightDistance = np.sqrt((bx - ex) ** 2 + (by - ey) ** 2)
+    middleX, middleY = (bx + ex) / 2, (by + ey) / 2
+    inCircle = np.sqrt((middleX - cx) ** 2 + (middleY - cy) ** 2) <= birdFlightDistance / 2 + tooCloseDistance
+    # Parameter of the line between the two points
+    a = ey - by
+    b = bx - ex
+    c = ex * by - bx * ey
+    # The point on the line the closest to the cylinder
+    x = (b * (b * cx - a * cy) - a * c) / (a ** 2 + b ** 2)
+    y = (a * (-b * cx + a * cy) - b * c) / (a ** 2 + b ** 2)
+    distances = np.sqrt((cx - x) ** 2 + (cy - y) ** 2)
+    return inCircle & (distances < tooCloseDistance), distances, x, y
@@ -0,0 +1,152 @@
+"""Exact planning of small maps : a Held-Karp dynamic programming over the subsets of cylinders already collected."""
+import math
+import numpy as np
+import instrumentation as instr
+import pathsearch as ps
+import simulation as sim
+from simulation import Robot
+
+# Number of cylinders above which the exact solver is not used (its time and memory grow as 2^n * n^2)
+EXACT_MAX_CYLINDERS = 20
+
+
+def planExact(cylinders, initialPosition=(0, 0), distances=None, withinBudget=True, maxTime=sim.totalTime, maxFuel=Robot.initialFuelQuantity, config=None):
+    """
+    Returns the best order of cylinders for the model of the orienteering planner : the legs are the paths that avoid
+    all the other cylinders (`AvoidanceDistances.legLength`), and the time and fuel of a leg depend on the mass carried,
+    which only depends on the set of cylinders already collected (within the budget, the mass of a cylinder is carried
+    from the point where the robot collects it, like in `orienteering._legUsage`).
+
+    A state is a set of collected cylinders and the last one, that keeps the least fuel used to reach it (among the ways
+    that stay within the time), or the least cost of `pathsearch.costOfTravel` when the whole tour is planned. The states
+    are built layer by layer (by number of cylinders), with one array operation for each cylinder added, and the states
+    over the budget are dropped. The result is exact when the robot can't run out of time before fuel (like on the
+    evaluation maps, where the time isn't followed at all), otherwise a state could keep a way that uses less fuel but
+    too much time for the cylinders after it.
+
+    Args:
+        cylinders (list): A list of cylinder objects.
+        initialPosition (tuple, optional): The starting position as a tuple (x, y). Defaults to (0, 0).
+        distances (AvoidanceDistances, optional): The distance matrix of the map, built if not given.
+        withinBudget (bool, optional): Whether to find the cylinders that give the most points within the budget (and the
+            least fuel among them), otherwise the order of all the cylinders with the least cost, the objective of the
+            local search (`localsearch.routeCost`). Defaults to True.
+        maxTime (float, optional): The time budget (s). Defaults to the simulation time.
+        maxFuel (float, optional): The fuel budget (l). Defaults to the initial fuel of the robot.
+        config (PlannerConfig, optional): The weights of the cost of the whole tour. Defaults to the module globals of `pathsearch`.
+
+    Returns:
+        list: The order of the cylinders, that `pathsearch.pathFromCylindersOrder` accepts.
+
+    Raises:
+        ValueError: If the map has more than `EXACT_MAX_CYLINDERS` cylinders.
+    """
+    distances = distances if distances is not None else ps.AvoidanceDistances(cylinders, initialPosition)
+    cylinders = distances.cylinders
+    count = len(cylinders)
+    if count > EXACT_MAX_CYLINDERS:
+        raise ValueError(f"The exact solver only plans maps of at most {EXACT_MAX_CYLINDERS} cylinders, not {count}")
+    if count == 0:
+        return []
+    if not withinBudget:
+        maxTime, maxFuel = math.inf, math.inf
+    # The legs from the initial position, and between the cylinders (the last line), and the end of each leg on which
+    # the cylinder is carried (the whole tour is costed like the local search, with the mass of the cylinder at its centre)
+    legs = distances.legMatrix()
+    contacts = np.minimum(legs, ps.TOO_CLOSE_CYLINDER) if withinBudget else np.zeros_like(legs)
+    legs = legs - contacts
+    # The mass, the value and the fuel and time by meter of each set of cylinders (a bit for each cylinder)
+    allMasks = np.arange(1 << count, dtype=np.int64)
+    massOfMask, valueOfMask, sizeOfMask = np.zeros(1 << count), np.zeros(1 << count), np.zeros(1 << count, dtype=np.int64)
+    for cylinderId in range(count):
+        hasCylinder = (allMasks >> cylinderId) & 1 == 1
+        massOfMask[hasCylinder] += cylinders.masses[cylinderId]
+        valueOfMask[hasCylinder] += cylinders.values[cylinderId]
+        sizeOfMask += hasCylinder
+    fuelByMeter = Robot.costModel.consumption(massOfMask)
+    timeByMeter = Robot.costModel.timeCost(1, massOfMask)
+    # If the robot can't run out of time before it uses all the fuel (with the mass that takes the most time by litre),
+    # the time doesn't need to be followed
+    followTime = maxFuel * (timeByMeter / fuelByMeter).max() > maxTime
+    if not withinBudget:
+        # The whole tour has no budget, the fuel of the states is the cost of the local search instead
+        fuelByMeter = ps.costOfTravel(1, massOfMask, config)
+    # The sets of each layer, and the index of each set in its layer
+    layers = [np.flatnonzero(sizeOfMask == size) for size in range(count + 1)]
+    indexInLayer = np.empty(1 << count, dtype=np.int64)
+    for layer in layers:
+        indexInLayer[layer] = np.arange(len(layer))
+    # The first layer : one cylinder collected from the initial position
+    fuel = np.full((count, count), np.inf)
+    time = np.full((count, count), np.inf)
+    firstIds = np.arange(count)
+    firstRows = indexInLayer[1 << firstIds]
+    fuel[firstRows, firstIds] = legs[count] * fuelByMeter[0] + contacts[count] * fuelByMeter[1 << firstIds]
+    time[firstRows, firstIds] = legs[count] * timeByMeter[0] + contacts[count] * timeByMeter[1 << firstIds]
+    fuel[(fuel > maxFuel) | (time > maxTime)] = np.inf
+    if not followTime:
+        time = None
+    parents = [None, np.full((count, count), -1, dtype=np.int8)]
+    best = _bestState(fuel, layers[1], valueOfMask, 1, None)
+    for size in range(1, count):
+        masks = layers[size]
+        alive = np.isfinite(fuel).any(axis=1)
+        if not alive.any():
+            break
+        nextFuel = np.full((len(layers[size + 1]), count), np.inf)
+        nextTime = np.full((len(layers[size + 1]), count), np.inf) if followTime else None
+        nextParents = np.full((len(layers[size + 1]), count), -1, dtype=np.int8)
+        for toId in range(count):
+            rows = np.flatnonzero(alive & ((masks >> toId) & 1 == 0))
+            if len(rows) == 0:
+                continue
+            rowMasks = masks[rows]
+            nextMasks = rowMasks | (1 << toId)
+            # The fuel and time to add this cylinder after each last cylinder, the least fuel that stays within the time is kept
+            candidateFuels = (fuel[rows] + legs[np.newaxis, :count, toId] * fuelByMeter[rowMasks, np.newaxis]
+                              + contacts[np.newaxis, :count, toId] * fuelByMeter[nextMasks, np.newaxis])
+            if followTime:
+                candidateTimes = (time[rows] + legs[np.newaxis, :count, toId] * timeByMeter[rowMasks, np.newaxis]
+                                  + contacts[np.newaxis, :count, toId] * timeByMeter[nextMasks, np.newaxis])
+                candidateFuels[candidateTimes > maxTime] = np.inf
+            fromIds = np.argmin(candidateFuels, axis=1)
+            bestFuels = candidateFuels[np.arange(len(rows)), fromIds]
+            kept = np.flatnonzero(bestFuels <= maxFuel)
+            nextRows = indexInLayer[nextMasks[kept]]
+            nextFuel[nextRows, toId] = bestFuels[kept]
+            if followTime:
+                nextTime[nextRows, toId] = candidateTimes[kept, fromIds[kept]]
+            nextParents[nextRows, toId] = fromIds[kept]
+        if instr.enabled:
+            instr.count('exact.states', int(np.isfinite(nextFuel).sum()))
+        fuel, time = nextFuel, nextTime
+        parents.append(nextParents)
+        best = _bestState(fuel, layers[size + 1], valueOfMask, size + 1, best)
+    if best is None:
+        return []
+    # We go back from the best state to the first cylinder
+    _, _, size, mask, lastId = best
+    order = []
+    while size > 0:
+        order.append(lastId)
+        previousId = int(parents[size][indexInLayer[mask], lastId])
+        mask &= ~(1 << lastId)
+        size, lastId = size - 1, previousId
+    return order[::-1]
+
+
+def _bestState(fuel, masks, valueOfMask, size, best):
+    """
+    Returns the best state between the given one and the states of a layer : the most value, then the least fuel,
+    as (value, -fuel, size, mask, last cylinder).
+    """
+    leastFuels = fuel.min(axis=1)
+    rows = np.flatnonzero(np.isfinite(leastFuels))
+    if len(rows) == 0:
+        return best
+    # The most value, then the least fuel
+    values = valueOfMask[masks[rows]]
+    rows = rows[values == values.max()]
+    row = rows[np.argmin(leastFuels[rows])]
+    state = (float(valueOfMask[masks[row]]), -float(leastFuels[row]), size, int(masks[row]), int(np.argmin(fuel[row])))
+    return state if best is None or state[:2] > best[:2] else best
@@ -1,26 +1,43 @@
+import json
+import os
+import zipfile
 import numpy as np
-from simulation import Cylinder
+from simulation import CylinderSet
 from os import makedirs
 
+# The directories already created by `saveMovements`
+_madeDirs = set()
+
 
 def loadCylinders(path):
     """
-    Load cylinder data from a file and return a list of cylinder objects.
+    Load cylinder data from a file and return a set of cylinders.
     Args:
         path (str): The file path to load the cylinder data from.
     Returns:
-        list of dict: A list of dictionaries, each containing 'x', 'y', and 'cat' keys 
-                      representing the cylinder's x-coordinate, y-coordinate, and category, respectively.
+        CylinderSet: The cylinders, stored as arrays of x-coordinates, y-coordinates, categories, masses and values.
+                     Indexing it gives an object with the same methods as a `Cylinder`.
     Raises:
         IOError: If the file cannot be opened or read.
         ValueError: If the file content cannot be converted to a numpy array.
     """
     
     # We load file content as a numpy array
-    cylinderArray = np.loadtxt(path)
+    cylinderArray = np.loadtxt(path, ndmin=2)
     
-    # We fill a list with some cylinder objects
-    return [Cylinder(float(cylinder[0]), float(cylinder[1]), int(cylinder[2])) for cylinder in cylinderArray]
+    # We keep the columns as arrays
+    return CylinderSet.fromArray(cylinderArray)
+
+
+def formatMovements(movements):
+    """
+    Returns the text of a script : one movement per line.
+    Args:
+        movements (iterable of str): The movements (a list or the generator `pathsearch.iterMovements`).
+    Returns:
+        str: The script, that ends with a new line.
+    """
+    return ''.join(f"{movement}\n" for movement in movements)
 
 
 def saveMovements(movements, filename, dirs):
@@ -30,7 +47,62 @@ def saveMovements(movements, filename, dirs):
         movements (list of str): A list of movements to save.
         path (str): The file path to save the movements to.
     """
-    makedirs(dirs, exist_ok=True)
-    with open(dirs + '/' + filename , 'w') as f:
-        for movement in movements:
-            f.write(f"{movement}\n")
\ No newline at end of file
+    # We only create each directory once
+    if dirs not in _madeDirs:
+        makedirs(dirs, exist_ok=True)
+        _madeDirs.add(dirs)
+    with open(os.path.join(dirs, filename), 'w') as f:
+        f.write(formatMovements(movements))
+
+
+class ScriptArchive:
+    """
+    Writes the scripts of many maps in one file instead of one file per map : a zip archive (`.zip`) with one entry per
+    script, or a JSON lines stream (any other extension) with one {"name", "movements"} object per line.
+    It can be used in a with statement, that closes it.
+    Attributes:
+        path (str): The path of the archive.
+        count (int): The number of scripts written.
+    """
+
+    def __init__(self, path):
+        """
+        Creates the archive (the file is replaced if it exists).
+        Args:
+            path (str): The path of the archive, its extension chooses the format.
+        """
+        self.path = path
+        self.count = 0
+        directory = os.path.dirname(path)
+        if directory:
+            makedirs(directory, exist_ok=True)
+        if os.path.splitext(path)[1] == '.zip':
+            self._zip, self._stream = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED), None
+        else:
+            self._zip, self._stream = None, open(path, 'w')
+
+    def write(self, name, movements):
+        """
+        Adds the script of a map.
+        Args:
+            name (str): The name of the script (the name of its entry in a zip archive).
+            movements (iterable of str): The movements of the script.
+        """
+        if self._zip is not None:
+            self._zip.writestr(name, formatMovements(movements))
+        else:
+            self._stream.write(json.dumps({'name': name, 'movements': list(movements)}) + '\n')
+        self.count += 1
+
+    def close(self):
+        """
+        Finishes writing the archive.
+        """
+        (self._zip if self._zip is not None else self._stream).close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
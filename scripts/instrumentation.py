@@ -0,0 +1,112 @@
+"""Opt-in counters and timers of the planning, to know where the time of a slow map goes.
+
+The instrumented code only checks the `enabled` flag when it is off, so it costs almost nothing unless it is turned on:
+
+    with instrumentation.recording() as measures:
+        pipeline.planMap(cylinders)
+    print(measures['counters']['avoidCylinder.calls'])
+"""
+import contextlib
+import time
+
+# Whether the measures are recorded
+enabled = False
+# The measures : the counters, the maximum of the levels (like a recursion depth) and the timers as [seconds, calls]
+counters = {}
+maxima = {}
+timers = {}
+_levels = {}
+_disabledStage = contextlib.nullcontext()
+
+
+def count(name, amount=1):
+    """
+    Adds an amount to a counter.
+    """
+    counters[name] = counters.get(name, 0) + amount
+
+
+def descend(name):
+    """
+    Goes one level deeper (for example in a recursion), and keeps the deepest level reached.
+    """
+    level = _levels.get(name, 0) + 1
+    _levels[name] = level
+    if level > maxima.get(name, 0):
+        maxima[name] = level
+
+
+def ascend(name):
+    """
+    Goes back one level up (the level stays at 0 if the measures were reset since `descend`).
+    """
+    _levels[name] = max(_levels.get(name, 0) - 1, 0)
+
+
+class _Stage:
+    """
+    Adds the wall time of a block to a timer.
+    """
+    __slots__ = ('name', 'startTime')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.startTime = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        timer = timers.setdefault(self.name, [0, 0])
+        timer[0] += time.perf_counter() - self.startTime
+        timer[1] += 1
+        return False
+
+
+def stage(name):
+    """
+    Returns a context manager that adds the wall time of its block to the timer `name` (it does nothing when disabled).
+    """
+    return _Stage(name) if enabled else _disabledStage
+
+
+def reset():
+    """
+    Sets all the measures back to zero.
+    """
+    counters.clear()
+    maxima.clear()
+    timers.clear()
+    _levels.clear()
+
+
+def record():
+    """
+    Returns the measures as a dictionary that can be saved in JSON.
+
+    Returns:
+        dict: The 'counters', the 'maxima' and the 'timers' (as {name: {'seconds', 'calls'}}).
+    """
+    return {
+        'counters': dict(counters),
+        'maxima': dict(maxima),
+        'timers': {name: {'seconds': seconds, 'calls': calls} for name, (seconds, calls) in timers.items()},
+    }
+
+
+@contextlib.contextmanager
+def recording():
+    """
+    Records the measures of a block, from zero. The dictionary given by the context manager is filled with the
+    measures (see `record`) when the block ends, and the recording is turned back to what it was before.
+    """
+    global enabled
+    wasEnabled = enabled
+    measures = {}
+    reset()
+    enabled = True
+    try:
+        yield measures
+    finally:
+        enabled = wasEnabled
+        measures.update(record())
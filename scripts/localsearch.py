@@ -0,0 +1,377 @@
+"""Local search on the order of the cylinders, with the real cost of the route (that depends on the carried mass)."""
+from collections import deque
+import math
+import time
+import numpy as np
+import instrumentation as instr
+import pathsearch as ps
+from simulation import Robot, CylinderSet
+
+
+def routeCost(distances, order, config=None):
+    """
+    Returns the cost of a route, as a linear combination of the fuel and the time used (see `pathsearch.costOfTravel`).
+    Each leg is paid with the mass of all the cylinders collected before it.
+
+    Args:
+        distances (AvoidanceDistances): The distance matrix of the map.
+        order (list): A list of indices representing the order in which to visit the cylinders.
+        config (PlannerConfig, optional): The weights to use. Defaults to the module globals of `pathsearch`.
+
+    Returns:
+        float: The cost of the route.
+    """
+    masses = distances.cylinders.masses
+    cost, mass, previousId = 0, 0, None
+    for cylinderId in order:
+        cost += ps.costOfTravel(distances.legLength(previousId, cylinderId), mass, config)
+        mass += masses[cylinderId]
+        previousId = cylinderId
+    return cost
+
+
+def nearestNeighbours(cylinders, count, initialPosition=None):
+    """
+    Returns the nearest cylinders (as the bird flies) of each cylinder.
+
+    Args:
+        cylinders (CylinderSet): The cylinders of the map.
+        count (int): The number of neighbours to keep for each cylinder.
+        initialPosition (tuple, optional): If given, the neighbours of this position are also returned, with the key `None`.
+
+    Returns:
+        dict: The list of the neighbour ids of each cylinder id, from the nearest to the furthest.
+    """
+    cylinders = CylinderSet.of(cylinders)
+    count = min(count, len(cylinders) - 1)
+    neighbours = {}
+    if count > 0:
+        positions = np.stack((cylinders.x, cylinders.y), axis=1)
+        # The distances are calculated by blocks of rows so that big maps don't need a full matrix
+        for first in range(0, len(cylinders), 512):
+            block = positions[first:first + 512]
+            squaredDistances = ((block[:, np.newaxis, :] - positions[np.newaxis, :, :]) ** 2).sum(axis=2)
+            squaredDistances[np.arange(len(block)), np.arange(first, first + len(block))] = np.inf
+            nearest = np.argpartition(squaredDistances, count - 1, axis=1)[:, :count]
+            for row in range(len(block)):
+                neighbours[first + row] = nearest[row][np.argsort(squaredDistances[row, nearest[row]])].tolist()
+    if initialPosition is not None:
+        squaredDistances = (cylinders.x - initialPosition[0]) ** 2 + (cylinders.y - initialPosition[1]) ** 2
+        neighbours[None] = np.argsort(squaredDistances)[:count + 1].tolist()
+    return neighbours
+
+
+class _RouteState:
+    """
+    A route (starting with `None` for the initial position) with the mass carried and the cost paid before each of its points.
+    """
+
+    def __init__(self, distances, order, config=None):
+        self.distances = distances
+        self.config = config if config is not None else ps.PlannerConfig()
+        self.masses = distances.cylinders.masses
+        self.route = [None] + list(order)
+        self.rebuild()
+
+    def rebuild(self):
+        """
+        Calculates again the masses, the prefix costs and the positions after the route has changed.
+        """
+        route = self.route
+        self.massBefore = [0] * len(route)
+        self.costBefore = [0] * len(route)
+        mass, cost = 0, 0
+        for point in range(1, len(route)):
+            self.massBefore[point] = mass
+            cost += ps.costOfTravel(self.distances.legLength(route[point - 1], route[point]), mass, self.config)
+            self.costBefore[point] = cost
+            mass += self.masses[route[point]]
+        self.positionOf = {cylinderId: point for point, cylinderId in enumerate(route)}
+
+    def replacementDelta(self, first, newPoints):
+        """
+        Returns the change of cost if the points of the route from `first` are replaced by `newPoints` (the same cylinders in another order).
+        The legs after the replaced part carry the same mass as before, so only the legs of the replaced part are calculated.
+        """
+        route, masses, legLength, config = self.route, self.masses, self.distances.legLength, self.config
+        n = len(route) - 1
+        last = first + len(newPoints) - 1
+        mass, previousId, cost = self.massBefore[first], route[first - 1], 0
+        for cylinderId in newPoints:
+            cost += ps.costOfTravel(legLength(previousId, cylinderId), mass, config)
+            mass += masses[cylinderId]
+            previousId = cylinderId
+        if last < n:
+            cost += ps.costOfTravel(legLength(previousId, route[last + 1]), mass, config)
+        return cost - (self.costBefore[min(last + 1, n)] - self.costBefore[first - 1])
+
+    def replace(self, first, newPoints):
+        """
+        Replaces the points of the route from `first` by `newPoints`.
+        """
+        self.route[first:first + len(newPoints)] = newPoints
+        self.rebuild()
+
+
+def _bestReversal(state, i, targets, lastJ, threshold=-1e-9):
+    """
+    Finds the best reversal of the route between the points i+1 and j, for j in the targets.
+    The cost of the reversed part is updated in O(1) for each j : when a point is added in front of the reversed part,
+    every leg in it carries its mass more, which adds to the fuel linearly and multiplies the time by exp(alpha * mass).
+
+    Returns:
+        tuple: The change of cost and the j of the best reversal (`None` if no reversal changes the cost by less than the threshold).
+    """
+    route, massBefore, costBefore, masses = state.route, state.massBefore, state.costBefore, state.masses
+    legLength, config = state.distances.legLength, state.config
+    comsumptionParams, speedParams = Robot.costModel.comsumptionParams, Robot.costModel.speedParams
+    fuelWeight = config.fuelImportance * comsumptionParams['b']
+    baseFuelWeight = config.fuelImportance * comsumptionParams['b0']
+    alpha = speedParams['alpha']
+    n = len(route) - 1
+    startMass = massBefore[i + 1]
+    timeWeight = config.timeImportance / speedParams['V0'] * math.exp(alpha * startMass)
+    # Length, mass-weighted length (relative to the start mass) and exp-weighted length of the reversed legs
+    innerLength, innerMassLength, innerExpLength = 0, 0, 0
+    bestDelta, bestJ = threshold, None
+    for j in range(i + 2, lastJ + 1):
+        # The point j is added in front of the reversed part
+        mass = masses[route[j]]
+        d = legLength(route[j], route[j - 1])
+        innerMassLength += mass * innerLength + d * mass
+        innerExpLength = innerExpLength * math.exp(alpha * mass) + d * math.exp(alpha * mass)
+        innerLength += d
+        if j not in targets:
+            continue
+        # New cost of the changed legs
+        newCost = ps.costOfTravel(legLength(route[i], route[j]), startMass, config)
+        newCost += fuelWeight * (startMass * innerLength + innerMassLength) + baseFuelWeight * innerLength + timeWeight * innerExpLength
+        if j < n:
+            newCost += ps.costOfTravel(legLength(route[i + 1], route[j + 1]), massBefore[j + 1], config)
+        delta = newCost - (costBefore[min(j + 1, n)] - costBefore[i])
+        if delta < bestDelta:
+            bestDelta, bestJ = delta, j
+    return bestDelta, bestJ
+
+
+def _expired(deadline):
+    return deadline is not None and time.perf_counter() >= deadline
+
+
+def _reversalTargets(state, neighbours, cylinderId, maxSegment):
+    """
+    Returns the reversals (as a dictionary of i to the set of j) that create a leg between a cylinder and one of its neighbours.
+    """
+    n = len(state.route) - 1
+    position = state.positionOf[cylinderId]
+    neighbourPositions = [state.positionOf[neighbourId] for neighbourId in neighbours.get(cylinderId, []) if neighbourId in state.positionOf]
+    reversals = {}
+    # New leg from the cylinder to a neighbour (the neighbour is the end of the reversed part)
+    targets = {neighbourPosition for neighbourPosition in neighbourPositions if position + 2 <= neighbourPosition <= position + maxSegment}
+    if targets:
+        reversals[position] = targets
+    # New leg from the cylinder to a neighbour (the cylinder is the start of the reversed part)
+    if position >= 1:
+        targets = {neighbourPosition - 1 for neighbourPosition in neighbourPositions if position + 2 <= neighbourPosition <= min(n, position + maxSegment)}
+        if targets:
+            reversals[position - 1] = targets
+    return reversals
+
+
+def _twoOptPass(state, neighbours, deadline, maxSegment):
+    """
+    Applies improving reversals until none is found (or the deadline is passed).
+    """
+    n = len(state.route) - 1
+    improved = False
+    # The cylinders to look at (the initial position is `None`)
+    active = deque(state.route)
+    isActive = set(active)
+    while active and not _expired(deadline):
+        cylinderId = active.popleft()
+        isActive.discard(cylinderId)
+        bestDelta, bestMove = 0, None
+        for i, targets in _reversalTargets(state, neighbours, cylinderId, maxSegment).items():
+            if instr.enabled:
+                instr.count('2opt.tried', len(targets))
+            delta, j = _bestReversal(state, i, targets, max(targets))
+            if j is not None and delta < bestDelta:
+                bestDelta, bestMove = delta, (i, j)
+        if bestMove is None:
+            continue
+        # We apply the best reversal and look again at the cylinders around the changed legs
+        i, j = bestMove
+        state.replace(i + 1, state.route[i + 1:j + 1][::-1])
+        improved = True
+        if instr.enabled:
+            instr.count('2opt.accepted')
+        for point in (i, i + 1, j, j + 1):
+            if point <= n and state.route[point] not in isActive:
+                active.append(state.route[point])
+                isActive.add(state.route[point])
+    return improved
+
+
+def _orOptPass(state, neighbours, deadline, maxSegment, segmentLengths=(1, 2, 3)):
+    """
+    Moves segments of one to three cylinders (maybe reversed) next to a neighbour of one of their ends.
+    This is where collecting a heavy cylinder later can be found.
+    """
+    n = len(state.route) - 1
+    improved = False
+    for segmentLength in segmentLengths:
+        start = 1
+        while start + segmentLength - 1 <= n:
+            if _expired(deadline):
+                return improved
+            segment = state.route[start:start + segmentLength]
+            # The segment is put after a point p, next to a neighbour of one of its ends
+            insertions = set()
+            for neighbourId in neighbours.get(segment[0], []) + neighbours.get(segment[-1], []):
+                if neighbourId in state.positionOf:
+                    insertions.update((state.positionOf[neighbourId], state.positionOf[neighbourId] - 1))
+            bestDelta, bestMove = -1e-9, None
+            for p in insertions:
+                if start - 1 <= p <= start + segmentLength - 1 or p < 0 or abs(p - start) > maxSegment:
+                    continue
+                for movedSegment in (segment, segment[::-1]) if segmentLength > 1 else (segment,):
+                    if p < start:
+                        first, newPoints = p + 1, movedSegment + state.route[p + 1:start]
+                    else:
+                        first, newPoints = start, state.route[start + segmentLength:p + 1] + movedSegment
+                    delta = state.replacementDelta(first, newPoints)
+                    if delta < bestDelta:
+                        bestDelta, bestMove = delta, (first, newPoints)
+            if bestMove is not None:
+                state.replace(*bestMove)
+                improved = True
+            start += 1
+    return improved
+
+
+def _threeOptPass(state, neighbours, deadline, maxSegment):
+    """
+    Exchanges two following parts of the route (the 3-opt move that keeps the direction of both parts).
+    The first leg created goes to a neighbour, and the second one must also go to a neighbour.
+    """
+    n = len(state.route) - 1
+    neighbourSets = {cylinderId: set(neighbourIds) for cylinderId, neighbourIds in neighbours.items()}
+    improved = False
+    for i in range(0, n - 1):
+        if _expired(deadline):
+            return improved
+        bestDelta, bestMove = -1e-9, None
+        for neighbourId in neighbours.get(state.route[i], []):
+            # route[i+1..j] and route[j+1..k] are exchanged, the new legs are route[i] -> route[j+1] and route[k] -> route[i+1]
+            secondStart = state.positionOf.get(neighbourId, -1)
+            if secondStart < i + 2 or secondStart - i > maxSegment:
+                continue
+            for k in range(secondStart, min(n, secondStart + maxSegment - 1) + 1):
+                if state.route[i + 1] not in neighbourSets.get(state.route[k], ()):
+                    continue
+                newPoints = state.route[secondStart:k + 1] + state.route[i + 1:secondStart]
+                delta = state.replacementDelta(i + 1, newPoints)
+                if delta < bestDelta:
+                    bestDelta, bestMove = delta, (i + 1, newPoints)
+        if bestMove is not None:
+            state.replace(*bestMove)
+            improved = True
+    return improved
+
+
+def _linKernighanPass(state, neighbours, deadline, maxSegment, maxDepth=5):
+    """
+    Lin-Kernighan style chains of reversals : from each cylinder, the best reversal is applied even if it is worse,
+    and the chain goes on from the end that got a new leg. The best route of the chain is kept if it is better.
+    """
+    improved = False
+    for startId in list(state.route):
+        if _expired(deadline):
+            break
+        originalRoute = state.route[:]
+        totalDelta, bestTotalDelta, bestRoute = 0, -1e-9, None
+        cylinderId, usedIds = startId, set()
+        for _ in range(maxDepth):
+            usedIds.add(cylinderId)
+            position = state.positionOf[cylinderId]
+            targets = {j for j in _reversalTargets(state, neighbours, cylinderId, maxSegment).get(position, ()) if state.route[j] not in usedIds}
+            if not targets:
+                break
+            delta, j = _bestReversal(state, position, targets, max(targets), threshold=math.inf)
+            if j is None:
+                break
+            # The cylinder that was after the current one is now at j, with a new leg after it
+            state.replace(position + 1, state.route[position + 1:j + 1][::-1])
+            totalDelta += delta
+            cylinderId = state.route[j]
+            if totalDelta < bestTotalDelta:
+                bestTotalDelta, bestRoute = totalDelta, state.route[:]
+        # We keep the best route of the chain or go back to the route before it
+        if bestRoute is not None:
+            state.route = bestRoute
+            improved = True
+        else:
+            state.route = originalRoute
+        state.rebuild()
+    return improved
+
+
+# The local search operators, that can be chosen by name
+OPERATORS = {
+    '2opt': _twoOptPass,
+    'oropt': _orOptPass,
+    '3opt': _threeOptPass,
+    'lk': _linKernighanPass,
+}
+
+
+def improve(distances, order, operators=('2opt', 'oropt', '3opt', 'lk'), neighbourCount=8, maxSegment=None, timeBudget=None, config=None):
+    """
+    Improves an order of cylinders with several local search operators, on the real mass-weighted cost of the route.
+    The operators are applied one after the other, and it starts again from the first one as long as one of them improves the route.
+
+    Args:
+        distances (AvoidanceDistances): The distance matrix of the map.
+        order (list): A list of indices representing the order in which to visit the cylinders (it can be only some of them).
+        operators (list, optional): The names of the operators in `OPERATORS`, or functions with the same arguments. Defaults to all of them.
+        neighbourCount (int, optional): The number of neighbours of each cylinder. Defaults to 8.
+        maxSegment (int, optional): The maximum number of cylinders between the changed legs. Defaults to no limit.
+        timeBudget (float, optional): The time after which it stops, in milliseconds. Defaults to no limit.
+        config (PlannerConfig, optional): The weights to use. Defaults to the module globals of `pathsearch`.
+
+    Returns:
+        list: The improved order (a new list).
+    """
+    deadline = time.perf_counter() + timeBudget / 1000 if timeBudget is not None else None
+    state = _RouteState(distances, order, config)
+    neighbours = nearestNeighbours(distances.cylinders, neighbourCount, distances.initialPosition)
+    maxSegment = maxSegment if maxSegment is not None else len(order)
+    operators = [OPERATORS[operator] if isinstance(operator, str) else operator for operator in operators]
+    improved = True
+    while improved and not _expired(deadline):
+        improved = False
+        for operator in operators:
+            if operator(state, neighbours, deadline, maxSegment):
+                improved = True
+                break
+    return state.route[1:]
+
+
+def twoOpt(distances, order, neighbourCount=8, maxSegment=None, timeBudget=None, config=None):
+    """
+    Improves an order of cylinders with the 2-opt heuristic, on the real mass-weighted cost of the route.
+    Only the reversals that create a leg towards one of the nearest neighbours of a cylinder are tried, and a cylinder
+    is only looked at again (don't-look bits) when one of the legs around it has changed.
+
+    Args:
+        distances (AvoidanceDistances): The distance matrix of the map.
+        order (list): A list of indices representing the order in which to visit the cylinders.
+        neighbourCount (int, optional): The number of neighbours of each cylinder. Defaults to 8.
+        maxSegment (int, optional): The maximum number of cylinders in a reversed part. Defaults to no limit.
+        timeBudget (float, optional): The time after which it stops, in milliseconds. Defaults to no limit.
+        config (PlannerConfig, optional): The weights to use. Defaults to the module globals of `pathsearch`.
+
+    Returns:
+        list: The improved order (a new list).
+    """
+    return improve(distances, order, ('2opt',), neighbourCount, maxSegment, timeBudget, config)
@@ -0,0 +1,77 @@
+"""Generation of synthetic maps, in the same format as the map files of the examples."""
+import argparse
+import math
+import numpy as np
+from simulation import Cylinder
+
+# The surface of the map for each cylinder (m²), like the evaluation maps (about 20 cylinders on 25 m x 25 m)
+SURFACE_BY_CYLINDER = 31
+# The surface for each cylinder of the dense layout, where most legs have to avoid other cylinders
+DENSE_SURFACE_BY_CYLINDER = 7
+# The number of cylinders of a cluster and its spread (m) in the clustered layout
+CLUSTER_SIZE = 10
+CLUSTER_SPREAD = 3.5
+LAYOUTS = ('uniform', 'clustered', 'dense')
+
+
+def generateMap(count, layout='uniform', seed=None):
+    """
+    Generates the cylinders of a map in a square that starts at (0, 0). Two cylinders never overlap.
+
+    Args:
+        count (int): The number of cylinders.
+        layout (str, optional): 'uniform' (spread like the evaluation maps), 'clustered' (groups of cylinders)
+            or 'dense' (four times more cylinders on the same surface). Defaults to 'uniform'.
+        seed (int, optional): The seed of the random generator, the same seed always gives the same map.
+
+    Returns:
+        numpy.ndarray: An array with one (x, y, category) row for each cylinder.
+
+    Raises:
+        ValueError: If the layout is unknown.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}', it must be one of {LAYOUTS}")
+    generator = np.random.default_rng(seed)
+    side = math.sqrt(count * (DENSE_SURFACE_BY_CYLINDER if layout == 'dense' else SURFACE_BY_CYLINDER))
+    minDistance = 2 * Cylinder.radius
+    centers = generator.uniform(0, side, (max(1, count // CLUSTER_SIZE), 2))
+    # We draw positions by batches and keep the ones far enough from the kept ones (a grid finds the close ones)
+    positions, grid = [], {}
+    while len(positions) < count:
+        if layout == 'clustered':
+            candidates = centers[generator.integers(len(centers), size=count)] + generator.normal(0, CLUSTER_SPREAD, (count, 2))
+            candidates = candidates[((candidates >= 0) & (candidates <= side)).all(axis=1)]
+        else:
+            candidates = generator.uniform(0, side, (count, 2))
+        for x, y in candidates.tolist():
+            cell = (int(x // minDistance), int(y // minDistance))
+            if all(math.hypot(x - ox, y - oy) >= minDistance
+                   for dx in (-1, 0, 1) for dy in (-1, 0, 1) for ox, oy in grid.get((cell[0] + dx, cell[1] + dy), ())):
+                grid.setdefault(cell, []).append((x, y))
+                positions.append((x, y))
+                if len(positions) == count:
+                    break
+    categories = generator.integers(1, 4, count)
+    return np.column_stack([np.array(positions).reshape(-1, 2), categories])
+
+
+def writeMap(cylinderArray, path):
+    """
+    Writes the cylinders of a map in a file that `inoutfilereader.loadCylinders` reads.
+
+    Args:
+        cylinderArray (numpy.ndarray): An array with one (x, y, category) row for each cylinder.
+        path (str): The path of the map file.
+    """
+    np.savetxt(path, cylinderArray, fmt=['%.4f', '%.4f', '%.4f'], delimiter='    ')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic map.")
+    parser.add_argument('out', help="The path of the map file.")
+    parser.add_argument('--count', type=int, default=20, help="The number of cylinders.")
+    parser.add_argument('--layout', choices=LAYOUTS, default='uniform')
+    parser.add_argument('--seed', type=int, default=None)
+    arguments = parser.parse_args()
+    writeMap(generateMap(arguments.count, arguments.layout, arguments.seed), arguments.out)
@@ -0,0 +1,179 @@
+"""A binary file format that holds many maps, read by memory-mapping it instead of parsing text.
+
+The file is a header, an index of the first record of each map, the records of all the maps one after the other,
+and the names of the maps:
+
+    header  : magic (8 bytes), version (uint32), number of maps (uint32), number of records (uint64), size of the names (uint64)
+    index   : number of maps + 1 offsets (uint64), the records of map i are between offsets i and i + 1
+    records : one packed (x float32, y float32, category uint8) record for each cylinder
+    names   : the names of the maps in UTF-8, separated by new lines
+
+Everything is little-endian.
+"""
+import argparse
+import os
+import struct
+import numpy as np
+from simulation import CylinderSet
+
+MAGIC = b'CBMAPS\x00\x00'
+VERSION = 1
+EXTENSION = '.cbm'
+HEADER = struct.Struct('<8sIIQQ')
+INDEX_DTYPE = np.dtype('<u8')
+RECORD_DTYPE = np.dtype([('x', '<f4'), ('y', '<f4'), ('cat', 'u1')])
+
+
+def writePack(mapArrays, path, names=None):
+    """
+    Writes maps in a pack file.
+
+    Args:
+        mapArrays (iterable): The maps, as arrays with one (x, y, category) row for each cylinder.
+        path (str): The path of the pack file.
+        names (list, optional): The name of each map (without new lines). Defaults to their index.
+    """
+    mapArrays = [np.asarray(mapArray, dtype=float).reshape(-1, 3) for mapArray in mapArrays]
+    names = [str(mapIndex) for mapIndex in range(len(mapArrays))] if names is None else list(names)
+    if len(names) != len(mapArrays) or any('\n' in name for name in names):
+        raise ValueError("There must be one name without new lines for each map")
+    offsets = np.cumsum([0] + [len(mapArray) for mapArray in mapArrays], dtype=INDEX_DTYPE)
+    records = np.empty(int(offsets[-1]), dtype=RECORD_DTYPE)
+    if mapArrays:
+        allCylinders = np.concatenate(mapArrays)
+        records['x'], records['y'] = allCylinders[:, 0], allCylinders[:, 1]
+        records['cat'] = np.rint(allCylinders[:, 2])
+    encodedNames = '\n'.join(names).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(mapArrays), len(records), len(encodedNames)))
+        f.write(offsets.tobytes())
+        f.write(records.tobytes())
+        f.write(encodedNames)
+
+
+def convertMaps(paths, outPath):
+    """
+    Converts `.txt` map files (the format read by `inoutfilereader.loadCylinders`) to a pack file.
+    The coordinates are stored as float32, which keeps the 4 decimals of the text files.
+
+    Args:
+        paths (list): The paths of the map files.
+        outPath (str): The path of the pack file, the maps are named after their file.
+    """
+    writePack((np.loadtxt(path, ndmin=2) for path in paths), outPath,
+              [os.path.splitext(os.path.basename(path))[0] for path in paths])
+
+
+class MapPack:
+    """
+    The maps of a pack file, memory-mapped : opening it reads only the header, the index and the names,
+    and the records of a map are only read from the disk when it is used.
+
+    Attributes:
+        path (str): The path of the pack file.
+        names (list): The name of each map.
+        offsets (numpy.memmap): The index of the first record of each map (and the number of records at the end).
+        records (numpy.memmap): The packed records of all the maps.
+    """
+
+    def __init__(self, path):
+        """
+        Opens a pack file.
+
+        Args:
+            path (str): The path of the pack file.
+
+        Raises:
+            ValueError: If the file is not a pack file or has another version.
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"'{path}' is not a map pack")
+        _, version, mapCount, recordCount, namesSize = HEADER.unpack(header)
+        if version != VERSION:
+            raise ValueError(f"'{path}' has the version {version} of the map packs, only the version {VERSION} can be read")
+        self.offsets = np.memmap(path, dtype=INDEX_DTYPE, mode='r', offset=HEADER.size, shape=(mapCount + 1,))
+        recordsStart = HEADER.size + self.offsets.nbytes
+        # We can't map an empty array
+        self.records = (np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=recordsStart, shape=(recordCount,))
+                        if recordCount else np.empty(0, dtype=RECORD_DTYPE))
+        with open(path, 'rb') as f:
+            f.seek(recordsStart + recordCount * RECORD_DTYPE.itemsize)
+            encodedNames = f.read(namesSize)
+        self.names = encodedNames.decode('utf-8').split('\n') if mapCount else []
+
+    def __len__(self):
+        return len(self.names)
+
+    def mapRecords(self, mapIndex):
+        """
+        Returns the records of a map, as a view of the file (nothing is copied).
+
+        Args:
+            mapIndex (int): The index of the map.
+
+        Returns:
+            numpy.ndarray: The records of the map, with the fields 'x', 'y' and 'cat'.
+        """
+        if not -len(self) <= mapIndex < len(self):
+            raise IndexError(f"There is no map {mapIndex} in '{self.path}'")
+        mapIndex %= len(self)
+        return self.records[int(self.offsets[mapIndex]):int(self.offsets[mapIndex + 1])]
+
+    def mapArray(self, mapIndex):
+        """
+        Returns a map as an array with one (x, y, category) row for each cylinder, like the text map files.
+        """
+        records = self.mapRecords(mapIndex)
+        return np.column_stack([records['x'], records['y'], records['cat']]).astype(float)
+
+    def cylinders(self, mapIndex):
+        """
+        Returns the cylinders of a map.
+
+        Args:
+            mapIndex (int): The index of the map.
+
+        Returns:
+            CylinderSet: The cylinders of the map.
+        """
+        records = self.mapRecords(mapIndex)
+        return CylinderSet(records['x'], records['y'], records['cat'])
+
+    def __getitem__(self, mapIndex):
+        return self.cylinders(mapIndex)
+
+    def __iter__(self):
+        return (self.cylinders(mapIndex) for mapIndex in range(len(self)))
+
+
+def isPack(path):
+    """
+    Returns whether a path is a pack file (by its extension).
+    """
+    return os.path.splitext(path)[1] == EXTENSION
+
+
+if __name__ == "__main__":
+    import batch
+    import mapgen
+    parser = argparse.ArgumentParser(description="Convert map files to and from a map pack.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    packParser = subparsers.add_parser('pack', help="Put text map files in a pack.")
+    packParser.add_argument('out', help=f"The path of the pack file (usually with the {EXTENSION} extension).")
+    packParser.add_argument('maps', help="A glob pattern or a directory of map files.")
+    unpackParser = subparsers.add_parser('unpack', help="Write the maps of a pack as text map files.")
+    unpackParser.add_argument('pack')
+    unpackParser.add_argument('outDir')
+    arguments = parser.parse_args()
+    if arguments.command == 'pack':
+        paths = batch.findMaps(arguments.maps)
+        convertMaps(paths, arguments.out)
+        print(f"{len(paths)} maps packed in {arguments.out}")
+    else:
+        pack = MapPack(arguments.pack)
+        os.makedirs(arguments.outDir, exist_ok=True)
+        for mapIndex, name in enumerate(pack.names):
+            mapgen.writeMap(pack.mapArray(mapIndex), os.path.join(arguments.outDir, f'{name}.txt'))
@@ -0,0 +1,334 @@
+"""Search of the order of the cylinders with an adaptive large neighbourhood search (ALNS) in a simulated annealing.
+
+Each iteration removes some cylinders from the order (a destroy operator) and inserts them again (a repair operator).
+The new order is scored with the time and fuel model of the robot : the points of the cylinders reached before running
+out of time or fuel, and a small part for the budget used. It is kept if it is better, or with a probability that
+decreases with the temperature if it is worse, so that the search can leave the local optima of the local search.
+The operators that find better orders are chosen more often. Several independent chains run in a process pool.
+"""
+import concurrent.futures as cf
+import math
+import multiprocessing
+import os
+import time
+import numpy as np
+import instrumentation as instr
+import pathsearch as ps
+import simulation as sim
+from simulation import Robot
+
+# The default number of chains and the time (s) given to each of them
+CHAINS = 4
+TIME_BUDGET = 1.0
+# The weight of the used budget (time and fuel, 1 for each whole budget) in the objective, so that it only breaks ties between orders
+USAGE_WEIGHT = 0.1
+# The temperatures at the start and at the end of a chain, in points (a loss of T points is accepted with a probability of 1/e)
+START_TEMPERATURE = 1.0
+END_TEMPERATURE = 0.01
+# The part of the collected cylinders removed at each iteration, and the most cylinders removed
+REMOVED_PART = (0.1, 0.4)
+MAX_REMOVED = 30
+# The rewards of an operator when its order is the best so far, better than the current one, or accepted
+REWARDS = (10.0, 4.0, 1.0)
+# The number of iterations between two updates of the weights of the operators, and how much the weights follow the rewards
+SEGMENT_LENGTH = 50
+REACTION = 0.2
+# Number of cylinders above which only the legs between neighbours use the avoidance paths (the others are straight lines)
+FULL_LEGS_MAX_CYLINDERS = 64
+LEG_NEIGHBOURS = 12
+
+
+class _Problem:
+    """
+    What a chain needs to score the orders of a map, with arrays only so that it can be sent to the worker processes.
+    The legs have one more line for the initial position and one more column for the end of the route (of length 0).
+    """
+
+    def __init__(self, legs, masses, values, withinBudget, maxTime, maxFuel, costModel):
+        count = len(masses)
+        self.count = count
+        self.legs = np.zeros((count + 1, count + 1))
+        self.legs[:, :count] = legs
+        self.masses = np.asarray(masses, dtype=float)
+        self.values = np.asarray(values, dtype=float)
+        self.withinBudget = withinBudget
+        self.maxTime = maxTime
+        self.maxFuel = maxFuel
+        self.speedParams = dict(costModel.speedParams)
+        self.comsumptionParams = dict(costModel.comsumptionParams)
+
+    def evaluate(self, order):
+        """
+        Returns the objective of an order (the more the better), and the number of cylinders collected before the robot
+        runs out of time or fuel.
+        """
+        if len(order) == 0:
+            return 0.0, 0
+        lengths = self.legs[np.concatenate(([self.count], order[:-1])), order]
+        carriedAfter = np.cumsum(self.masses[order])
+        carried = np.concatenate(([0.0], carriedAfter[:-1]))
+        # The time and fuel of each leg, with the formulas of `CostModel` on the whole route at once, the mass of a cylinder
+        # is carried from the point where the robot collects it (like in `orienteering._legUsage`)
+        contacts = np.minimum(lengths, ps.TOO_CLOSE_CYLINDER)
+        lengths = lengths - contacts
+        times = np.cumsum((lengths * np.exp(self.speedParams['alpha'] * carried) + contacts * np.exp(self.speedParams['alpha'] * carriedAfter))
+                          / self.speedParams['V0'])
+        fuels = np.cumsum(lengths * (self.comsumptionParams['b'] * carried + self.comsumptionParams['b0'])
+                          + contacts * (self.comsumptionParams['b'] * carriedAfter + self.comsumptionParams['b0']))
+        overBudget = (times > self.maxTime) | (fuels > self.maxFuel)
+        collected = int(np.argmax(overBudget)) if overBudget.any() else len(order)
+        points = float(self.values[order[:collected]].sum())
+        # Within the budget, only the legs that are followed use it, otherwise the whole tour is costed
+        last = collected - 1 if self.withinBudget else len(order) - 1
+        usage = times[last] / self.maxTime + fuels[last] / self.maxFuel if last >= 0 else 0.0
+        return points - USAGE_WEIGHT * usage, collected
+
+    def removalSavings(self, order, positions):
+        """
+        Returns the length saved by removing each of the given positions of an order.
+        """
+        previous = np.where(positions > 0, order[np.maximum(positions - 1, 0)], self.count)
+        following = np.where(positions + 1 < len(order), order[np.minimum(positions + 1, len(order) - 1)], self.count)
+        cylinders = order[positions]
+        return self.legs[previous, cylinders] + self.legs[cylinders, following] - self.legs[previous, following]
+
+    def insertionCosts(self, order, cylinderIds, limit):
+        """
+        Returns the length added by inserting each cylinder before each of the first `limit` + 1 positions of an order
+        (the last position is after the `limit` first cylinders), as an array of shape (cylinders, positions).
+        """
+        previous = np.concatenate(([self.count], order[:limit]))
+        following = np.concatenate((order[:limit], [order[limit] if limit < len(order) else self.count]))
+        cylinderIds = np.asarray(cylinderIds)
+        return (self.legs[previous[np.newaxis, :], cylinderIds[:, np.newaxis]] + self.legs[cylinderIds[:, np.newaxis], following[np.newaxis, :]]
+                - self.legs[previous, following][np.newaxis, :])
+
+
+def _randomRemoval(problem, order, scope, removedCount, rng):
+    """
+    Removes random cylinders.
+    """
+    return rng.choice(scope, removedCount, replace=False)
+
+
+def _worstRemoval(problem, order, scope, removedCount, rng):
+    """
+    Removes the cylinders that make the longest detours for their value (with some noise).
+    """
+    positions = np.arange(scope)
+    ratios = problem.removalSavings(order, positions) / problem.values[order[positions]]
+    return positions[np.argsort(-ratios * rng.uniform(0.7, 1.3, scope))[:removedCount]]
+
+
+def _relatedRemoval(problem, order, scope, removedCount, rng):
+    """
+    Removes a cylinder and its nearest ones, collected or not, so that the cylinders of an area can be exchanged.
+    """
+    first = order[rng.integers(scope)]
+    lengths = problem.legs[first, :problem.count].copy()
+    lengths[first] = 0
+    nearest = np.argpartition(lengths, removedCount - 1)[:removedCount]
+    positionOf = np.empty(problem.count, dtype=np.int64)
+    positionOf[order] = np.arange(len(order))
+    return positionOf[nearest]
+
+
+def _segmentRemoval(problem, order, scope, removedCount, rng):
+    """
+    Removes consecutive cylinders.
+    """
+    first = rng.integers(scope - removedCount + 1)
+    return np.arange(first, first + removedCount)
+
+
+def _greedyRepair(problem, order, removed, limit, rng, noise=0.0, regret=False):
+    """
+    Inserts the removed cylinders one by one, each time the one that adds the least length for its value
+    (only the length when the whole tour is planned), where it adds the least. With `regret`, the cylinder that would
+    lose the most by not being inserted at its best position is inserted first.
+    Within the budget, a cylinder is only inserted if all the cylinders before the limit are still collected, the others
+    are put at the end of the order.
+    """
+    order, removed, left = list(order), list(removed), []
+    while removed:
+        costs = problem.insertionCosts(np.array(order, dtype=np.int64), removed, limit)
+        if noise:
+            costs *= rng.uniform(1 - noise, 1 + noise, costs.shape)
+        if problem.withinBudget:
+            costs /= problem.values[removed][:, np.newaxis]
+        bestPositions = np.argmin(costs, axis=1)
+        bestCosts = costs[np.arange(len(removed)), bestPositions]
+        if regret and costs.shape[1] > 1:
+            secondCosts = np.partition(costs, 1, axis=1)[:, 1]
+            index = int(np.argmax(secondCosts - bestCosts))
+        else:
+            index = int(np.argmin(bestCosts))
+        position, cylinderId = int(bestPositions[index]), removed.pop(index)
+        order.insert(position, cylinderId)
+        if problem.withinBudget and problem.evaluate(np.array(order, dtype=np.int64))[1] < limit + 1:
+            del order[position]
+            left.append(cylinderId)
+            continue
+        limit += 1
+    return np.array(order + left, dtype=np.int64)
+
+
+def _noisyRepair(problem, order, removed, limit, rng):
+    """
+    Inserts the removed cylinders like `_greedyRepair`, with noise on the added lengths.
+    """
+    return _greedyRepair(problem, order, removed, limit, rng, noise=0.2)
+
+
+def _regretRepair(problem, order, removed, limit, rng):
+    """
+    Inserts the removed cylinders like `_greedyRepair`, the ones with the highest regret first.
+    """
+    return _greedyRepair(problem, order, removed, limit, rng, regret=True)
+
+
+DESTROY_OPERATORS = {
+    'random': _randomRemoval,
+    'worst': _worstRemoval,
+    'related': _relatedRemoval,
+    'segment': _segmentRemoval,
+}
+
+REPAIR_OPERATORS = {
+    'greedy': _greedyRepair,
+    'noisy': _noisyRepair,
+    'regret': _regretRepair,
+}
+
+
+def _runChain(problem, initialOrder, seed, timeBudget, iterations):
+    """
+    Runs one chain of the search from an order of all the cylinders.
+
+    Returns:
+        tuple: The objective of the best order, the best order, the number of cylinders it collects and the number of iterations.
+    """
+    rng = np.random.default_rng(seed)
+    destroyOperators, repairOperators = list(DESTROY_OPERATORS.values()), list(REPAIR_OPERATORS.values())
+    destroyWeights, repairWeights = np.ones(len(destroyOperators)), np.ones(len(repairOperators))
+    destroyRewards, repairRewards = np.zeros(len(destroyOperators)), np.zeros(len(repairOperators))
+    destroyUses, repairUses = np.zeros(len(destroyOperators)), np.zeros(len(repairOperators))
+    current = np.array(initialOrder, dtype=np.int64)
+    currentScore, currentCollected = problem.evaluate(current)
+    best, bestScore, bestCollected = current, currentScore, currentCollected
+    startTime = time.perf_counter()
+    iteration = 0
+    while True:
+        progress = iteration / iterations if iterations is not None else (time.perf_counter() - startTime) / timeBudget
+        if progress >= 1 or problem.count < 2:
+            break
+        temperature = START_TEMPERATURE * (END_TEMPERATURE / START_TEMPERATURE) ** progress
+        # The cylinders are removed among the collected ones (all of them for the whole tour)
+        scope = max(currentCollected if problem.withinBudget else len(current), 1)
+        low = max(1, int(REMOVED_PART[0] * scope))
+        removedCount = int(rng.integers(low, max(low, min(MAX_REMOVED, int(REMOVED_PART[1] * scope), scope)) + 1))
+        destroyIndex = rng.choice(len(destroyOperators), p=destroyWeights / destroyWeights.sum())
+        repairIndex = rng.choice(len(repairOperators), p=repairWeights / repairWeights.sum())
+        positions = destroyOperators[destroyIndex](problem, current, scope, removedCount, rng)
+        if problem.withinBudget and scope < len(current):
+            # Some cylinders that are not collected can take the place of the removed ones
+            positions = np.union1d(positions, rng.choice(np.arange(scope, len(current)), min(removedCount, len(current) - scope), replace=False))
+        isRemoved = np.zeros(len(current), dtype=bool)
+        isRemoved[positions] = True
+        # The cylinders can be inserted among the collected ones, or just after them
+        limit = int(np.count_nonzero(~isRemoved[:scope])) if problem.withinBudget else len(current) - len(positions)
+        removed = current[positions]
+        candidate = repairOperators[repairIndex](problem, current[~isRemoved], removed[rng.permutation(len(removed))], limit, rng)
+        score, collected = problem.evaluate(candidate)
+        reward = 0.0
+        if score > bestScore + 1e-9:
+            best, bestScore, bestCollected = candidate, score, collected
+            reward = REWARDS[0]
+        if score > currentScore + 1e-9:
+            reward = max(reward, REWARDS[1])
+        if score >= currentScore or rng.random() < math.exp((score - currentScore) / temperature):
+            current, currentScore, currentCollected = candidate, score, collected
+            reward = max(reward, REWARDS[2])
+        destroyRewards[destroyIndex] += reward
+        repairRewards[repairIndex] += reward
+        destroyUses[destroyIndex] += 1
+        repairUses[repairIndex] += 1
+        iteration += 1
+        if iteration % SEGMENT_LENGTH == 0:
+            # The weights follow the mean reward of each operator during the segment
+            destroyWeights = np.maximum((1 - REACTION) * destroyWeights + REACTION * destroyRewards / np.maximum(destroyUses, 1), 0.05)
+            repairWeights = np.maximum((1 - REACTION) * repairWeights + REACTION * repairRewards / np.maximum(repairUses, 1), 0.05)
+            destroyRewards[:], repairRewards[:], destroyUses[:], repairUses[:] = 0, 0, 0, 0
+    return bestScore, best.tolist(), bestCollected, iteration
+
+
+def _searchLegs(distances, initialOrder):
+    """
+    Returns the legs used by the search (see `AvoidanceDistances.legMatrix`). On big maps, only the legs from each cylinder to
+    its nearest neighbours and the legs of the initial order use the avoidance paths, the others are straight lines.
+    """
+    count = len(distances.cylinders)
+    if count <= FULL_LEGS_MAX_CYLINDERS:
+        return distances.legMatrix()
+    import localsearch as ls
+    points = np.vstack((distances.cylinders.positions, [distances.initialPosition]))
+    legs = np.sqrt(((points[:, np.newaxis, :] - points[np.newaxis, :count, :]) ** 2).sum(axis=2))
+    np.fill_diagonal(legs, np.inf)
+    for fromId, neighbourIds in ls.nearestNeighbours(distances.cylinders, LEG_NEIGHBOURS, distances.initialPosition).items():
+        for toId in neighbourIds:
+            legs[count if fromId is None else fromId, toId] = distances.legLength(fromId, toId)
+    for fromId, toId in zip([None] + list(initialOrder[:-1]), initialOrder):
+        legs[count if fromId is None else fromId, toId] = distances.legLength(fromId, toId)
+    return legs
+
+
+def searchOrder(cylinders, initialPosition=(0, 0), distances=None, withinBudget=True, initialOrder=None, chains=CHAINS, timeBudget=TIME_BUDGET,
+                iterations=None, seed=0, workers=None, maxTime=sim.totalTime, maxFuel=Robot.initialFuelQuantity):
+    """
+    Searches a better order of cylinders with independent chains of the ALNS, and returns the best one.
+
+    Args:
+        cylinders (list): A list of cylinder objects.
+        initialPosition (tuple, optional): The starting position as a tuple (x, y). Defaults to (0, 0).
+        distances (AvoidanceDistances, optional): The distance matrix of the map, built if not given.
+        withinBudget (bool, optional): Whether to only return the cylinders collected within the budget, otherwise an order
+            of all the cylinders (that also uses as little time and fuel as it can). Defaults to True.
+        initialOrder (list, optional): The order the chains start from (for example the one of the orienteering planner),
+            the missing cylinders are put after it. Defaults to the greedy order.
+        chains (int, optional): The number of independent chains. Defaults to `CHAINS`.
+        timeBudget (float, optional): The time (s) given to each chain. Defaults to `TIME_BUDGET`.
+        iterations (int, optional): If given, each chain makes this number of iterations instead of stopping after its time,
+            so that the result only depends on the seed.
+        seed (int, optional): The seed of the random numbers of the chains. Defaults to 0.
+        workers (int, optional): The number of processes. Defaults to one per chain (at most the number of cores), the chains
+            run one after the other in the process itself if it is 1 or if it is already a worker process.
+        maxTime (float, optional): The time budget (s). Defaults to the simulation time.
+        maxFuel (float, optional): The fuel budget (l). Defaults to the initial fuel of the robot.
+
+    Returns:
+        list: The order of the cylinders, that `pathsearch.pathFromCylindersOrder` accepts.
+    """
+    distances = distances if distances is not None else ps.AvoidanceDistances(cylinders, initialPosition)
+    cylinders = distances.cylinders
+    count = len(cylinders)
+    if count == 0:
+        return []
+    if initialOrder is None:
+        initialOrder = ps.dumbOrderOfCylinders(cylinders, initialPosition, distances)
+    # The chains work on orders of all the cylinders, the ones that are not collected are at the end
+    isInOrder = np.zeros(count, dtype=bool)
+    isInOrder[list(initialOrder)] = True
+    initialOrder = list(initialOrder) + np.flatnonzero(~isInOrder).tolist()
+    problem = _Problem(_searchLegs(distances, initialOrder), cylinders.masses, cylinders.values, withinBudget, maxTime, maxFuel, Robot.costModel)
+    seeds = np.random.SeedSequence(seed).spawn(chains)
+    workers = workers if workers is not None else min(chains, os.cpu_count() or 1)
+    if workers <= 1 or multiprocessing.parent_process() is not None:
+        results = [_runChain(problem, initialOrder, chainSeed, timeBudget, iterations) for chainSeed in seeds]
+    else:
+        with cf.ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_runChain, [problem] * chains, [initialOrder] * chains, seeds, [timeBudget] * chains, [iterations] * chains))
+    if instr.enabled:
+        instr.count('alns.iterations', sum(result[3] for result in results))
+    # The first chain wins the ties, so that the result only depends on the seed
+    _, order, collected, _ = max(results, key=lambda result: result[0])
+    return order[:collected] if withinBudget else order
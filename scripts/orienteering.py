@@ -0,0 +1,242 @@
+"""Planning of the cylinders to collect within the time and the fuel of the robot (orienteering problem)."""
+import math
+import instrumentation as instr
+import pathsearch as ps
+import localsearch as ls
+import simulation as sim
+from simulation import Robot
+
+
+class _BudgetedRoute:
+    """
+    A route (starting with `None` for the initial position) with the time and the fuel used by each of its legs.
+    Suffix sums let the effect of inserting or removing a cylinder be calculated in O(1) : all the legs after it
+    carry its mass more (or less), which multiplies their time by exp(alpha * mass) and adds b * mass * length to their fuel.
+    The mass of a cylinder is carried from the point where the robot collects it, at the end of the leg towards it
+    (see `_legUsage`).
+    """
+
+    def __init__(self, distances, order):
+        self.distances = distances
+        self.masses = distances.cylinders.masses
+        self.route = [None] + list(order)
+        self.rebuild()
+
+    def rebuild(self):
+        """
+        Calculates again the masses, times and fuels after the route has changed.
+        """
+        route, legLength = self.route, self.distances.legLength
+        count = len(route)
+        self.massAfter = [0] * count
+        lengths, times, fuels = [0] * (count + 1), [0] * (count + 1), [0] * (count + 1)
+        mass = 0
+        for point in range(1, count):
+            lengths[point] = legLength(route[point - 1], route[point])
+            times[point], fuels[point] = _legUsage(lengths[point], mass, self.masses[route[point]])
+            mass += self.masses[route[point]]
+            self.massAfter[point] = mass
+        # Sums of the legs from a point to the end (the leg into a point has the index of the point)
+        self.lengthFrom, self.timeFrom, self.fuelFrom = [0] * (count + 1), [0] * (count + 1), [0] * (count + 1)
+        for point in range(count - 1, 0, -1):
+            self.lengthFrom[point] = self.lengthFrom[point + 1] + lengths[point]
+            self.timeFrom[point] = self.timeFrom[point + 1] + times[point]
+            self.fuelFrom[point] = self.fuelFrom[point + 1] + fuels[point]
+        self.time, self.fuel = self.timeFrom[1], self.fuelFrom[1]
+        self.positionOf = {cylinderId: point for point, cylinderId in enumerate(route)}
+
+    def insertionUsage(self, cylinderId, p):
+        """
+        Returns the (time, fuel) used by the route if a cylinder is inserted after the point p.
+        """
+        route, legLength = self.route, self.distances.legLength
+        mass, massOfCylinder = self.massAfter[p], self.masses[cylinderId]
+        newTime, newFuel = _legUsage(legLength(route[p], cylinderId), mass, massOfCylinder)
+        time = self.time - self.timeFrom[p + 1] + newTime
+        fuel = self.fuel - self.fuelFrom[p + 1] + newFuel
+        if p + 1 < len(route):
+            newTime, newFuel = _legUsage(legLength(cylinderId, route[p + 1]), mass + massOfCylinder, self.masses[route[p + 1]])
+            time += newTime + math.exp(Robot.costModel.speedParams['alpha'] * massOfCylinder) * self.timeFrom[p + 2]
+            fuel += newFuel + self.fuelFrom[p + 2] + Robot.costModel.comsumptionParams['b'] * massOfCylinder * self.lengthFrom[p + 2]
+        return time, fuel
+
+    def removalUsage(self, p):
+        """
+        Returns the (time, fuel) used by the route if the point p is removed.
+        """
+        route, legLength = self.route, self.distances.legLength
+        massOfCylinder = self.masses[route[p]]
+        time = self.time - self.timeFrom[p]
+        fuel = self.fuel - self.fuelFrom[p]
+        if p + 1 < len(route):
+            newTime, newFuel = _legUsage(legLength(route[p - 1], route[p + 1]), self.massAfter[p - 1], self.masses[route[p + 1]])
+            time += newTime + math.exp(-Robot.costModel.speedParams['alpha'] * massOfCylinder) * self.timeFrom[p + 2]
+            fuel += newFuel + self.fuelFrom[p + 2] - Robot.costModel.comsumptionParams['b'] * massOfCylinder * self.lengthFrom[p + 2]
+        return time, fuel
+
+
+def _legUsage(length, mass, massOfCylinder):
+    """
+    Returns the (time, fuel) used by a leg towards a cylinder. Like the scorer, the robot collects the cylinder when it comes
+    within `pathsearch.TOO_CLOSE_CYLINDER` of it, so its mass is carried on the end of the leg.
+    """
+    contact = min(ps.TOO_CLOSE_CYLINDER, length)
+    return (Robot.timeCost(length - contact, mass) + Robot.timeCost(contact, mass + massOfCylinder),
+            Robot.fuelCost(length - contact, mass) + Robot.fuelCost(contact, mass + massOfCylinder))
+
+
+def routeUsage(distances, order):
+    """
+    Returns the time and the fuel used by the robot to follow an order of cylinders.
+
+    Args:
+        distances (AvoidanceDistances): The distance matrix of the map.
+        order (list): A list of indices representing the order in which to visit the cylinders.
+
+    Returns:
+        tuple: The time (s) and the fuel (l) used.
+    """
+    route = _BudgetedRoute(distances, order)
+    return route.time, route.fuel
+
+
+class OrienteeringPlanner:
+    """
+    A planner that chooses which cylinders to collect and in which order, so that the robot never runs out of time or fuel.
+    It only works on routes within the budget : cylinders are inserted where they cost the least time and fuel
+    for their value, the worst ones are removed when the route goes over the budget, and the order is improved
+    with the local search to make room for more cylinders.
+
+    Attributes:
+        distances (AvoidanceDistances): The distance matrix of the map.
+        maxTime (float): The time budget (s).
+        maxFuel (float): The fuel budget (l).
+        neighbourCount (int): The number of neighbours next to which a cylinder can be inserted.
+    """
+
+    def __init__(self, distances, maxTime=sim.totalTime, maxFuel=Robot.initialFuelQuantity, neighbourCount=10, config=None):
+        """
+        Initializes the planner for a map.
+
+        Args:
+            distances (AvoidanceDistances): The distance matrix of the map.
+            maxTime (float, optional): The time budget (s). Defaults to the simulation time.
+            maxFuel (float, optional): The fuel budget (l). Defaults to the initial fuel of the robot.
+            neighbourCount (int, optional): The number of neighbours next to which a cylinder can be inserted. Defaults to 10.
+            config (PlannerConfig, optional): The weights used by the local search. Defaults to the module globals of `pathsearch`.
+        """
+        self.distances = distances
+        self.maxTime = maxTime
+        self.maxFuel = maxFuel
+        self.neighbourCount = neighbourCount
+        self.config = config
+        self.values = distances.cylinders.values
+        self.neighbours = ls.nearestNeighbours(distances.cylinders, neighbourCount)
+
+    def _usageCost(self, time, fuel, route):
+        # The part of the budget used more than by the route
+        return (time - route.time) / self.maxTime + (fuel - route.fuel) / self.maxFuel
+
+    def _isFeasible(self, time, fuel):
+        return time <= self.maxTime and fuel <= self.maxFuel
+
+    def insertCylinders(self, route):
+        """
+        Inserts cylinders in the route, the best value for the used budget first, as long as the route stays within the budget.
+        """
+        remainingIds = set(range(len(self.values))) - set(route.route)
+        while remainingIds:
+            best = None
+            for cylinderId in remainingIds:
+                # The cylinder is put next to a neighbour already in the route, at the start or at the end
+                points = {0, len(route.route) - 1}
+                for neighbourId in self.neighbours.get(cylinderId, []):
+                    if neighbourId in route.positionOf:
+                        points.update((route.positionOf[neighbourId] - 1, route.positionOf[neighbourId]))
+                for p in points:
+                    time, fuel = route.insertionUsage(cylinderId, p)
+                    if not self._isFeasible(time, fuel):
+                        continue
+                    ratio = self.values[cylinderId] / max(self._usageCost(time, fuel, route), 1e-12)
+                    if best is None or ratio > best[0]:
+                        best = (ratio, cylinderId, p)
+            if best is None:
+                return
+            _, cylinderId, p = best
+            route.route.insert(p + 1, cylinderId)
+            route.rebuild()
+            remainingIds.discard(cylinderId)
+
+    def removeCylinders(self, route):
+        """
+        Removes cylinders from the route, the worst value for the saved budget first, until the route is within the budget.
+        """
+        while len(route.route) > 1 and not self._isFeasible(route.time, route.fuel):
+            worst = None
+            for p in range(1, len(route.route)):
+                time, fuel = route.removalUsage(p)
+                ratio = self.values[route.route[p]] / max(-self._usageCost(time, fuel, route), 1e-12)
+                if worst is None or ratio < worst[0]:
+                    worst = (ratio, p)
+            del route.route[worst[1]]
+            route.rebuild()
+
+    def _value(self, route):
+        return sum(self.values[cylinderId] for cylinderId in route.route[1:])
+
+    def plan(self, initialOrder=None, rounds=10, timeBudget=None):
+        """
+        Chooses the cylinders to collect and their order.
+
+        Args:
+            initialOrder (list, optional): An order to start from (for example the greedy one), cut to fit in the budget. Defaults to an empty route.
+            rounds (int, optional): The maximum number of rounds of improvement and insertion. Defaults to 10.
+            timeBudget (float, optional): The time given to each local search, in milliseconds. Defaults to no limit.
+
+        Returns:
+            list: The order of the cylinders to collect, that `pathsearch.pathFromCylindersOrder` accepts.
+        """
+        route = _BudgetedRoute(self.distances, initialOrder or [])
+        self.removeCylinders(route)
+        self.insertCylinders(route)
+        for _ in range(rounds):
+            valueBefore = self._value(route)
+            # We shorten the route to make room for more cylinders (only if it stays within the budget)
+            improvedRoute = _BudgetedRoute(self.distances, ls.improve(self.distances, route.route[1:], timeBudget=timeBudget, config=self.config))
+            if self._isFeasible(improvedRoute.time, improvedRoute.fuel) and improvedRoute.time / self.maxTime + improvedRoute.fuel / self.maxFuel < route.time / self.maxTime + route.fuel / self.maxFuel:
+                route = improvedRoute
+            self.insertCylinders(route)
+            # We try to exchange the worst cylinder of the route for better ones
+            if len(route.route) > 1:
+                swappedRoute = _BudgetedRoute(self.distances, route.route[1:])
+                worst = min(range(1, len(swappedRoute.route)), key=lambda p: self.values[swappedRoute.route[p]] / max(-self._usageCost(*swappedRoute.removalUsage(p), swappedRoute), 1e-12))
+                del swappedRoute.route[worst]
+                swappedRoute.rebuild()
+                self.insertCylinders(swappedRoute)
+                if self._value(swappedRoute) > self._value(route):
+                    route = swappedRoute
+            if self._value(route) <= valueBefore:
+                break
+        return route.route[1:]
+
+
+def planWithinBudget(cylinders, initialPosition, distances=None, config=None, **options):
+    """
+    Returns the order of the cylinders to collect so that the robot never runs out of time or fuel.
+    It starts from the greedy order of `pathsearch.dumbOrderOfCylinders`.
+
+    Args:
+        cylinders (list): A list of cylinder objects.
+        initialPosition (tuple): The starting position as a tuple (x, y).
+        distances (AvoidanceDistances, optional): The distance matrix of the map, built if not given.
+        config (PlannerConfig, optional): The weights to use. Defaults to the module globals of `pathsearch`.
+        **options: The options of `OrienteeringPlanner.plan`.
+
+    Returns:
+        list: The order of the cylinders to collect.
+    """
+    distances = distances if distances is not None else ps.AvoidanceDistances(cylinders, initialPosition)
+    with instr.stage('greedy'):
+        greedyOrder = ps.dumbOrderOfCylinders(cylinders, initialPosition, distances, config)
+    with instr.stage('orienteering'):
+        return OrienteeringPlanner(distances, config=config).plan(greedyOrder, **options)
@@ -1,6 +1,11 @@
 """Script that handle the all the logic for pathsearching."""
-from simulation import Robot, Cylinder
+from simulation import Robot, Cylinder, CylinderSet
+from spatialindex import CylinderGrid
+from collision import firstBlockingCylinder
+from visibility import VisibilityRouter
+import instrumentation as instr
 import math
+import numpy as np
 #import matplotlib.pyplot as plt
 
 # Ponderation of the fuel cost, the time cost and the value gain
@@ -13,8 +18,47 @@ VALUE_IMPORTANCE = 0.3685
 TOO_CLOSE_CYLINDER = Cylinder.touchingRadius + 0.05
 AVOID_DISTANCE = Cylinder.touchingRadius + 0.15
 
+# Number of cylinders from which a spatial index is used to find the cylinders in the way
+GRID_MIN_CYLINDERS = 64
+# Number of candidates from which they are tested with numpy instead of one by one
+VECTORIZE_MIN_CANDIDATES = 32
+# The ways of finding a path around the cylinders : the recursive detours of `avoidCylinder` or the shortest paths of `VisibilityRouter`
+ROUTERS = ('midpoint', 'visibility')
+# The smallest rotation (degrees) and move (m) written in the movements, smaller ones are lost by the rounding of the commands
+MIN_TURN = 0.01
+MIN_GO = 0.01
+# The distance (m) from a straight line under which the points of a path are followed by the same GO
+LINE_TOLERANCE = 0.005
 
-def costOfTravel(distance, mass):
+
+class PlannerConfig:
+    """
+    The weights used by the planner, so that they can be given to it instead of changing the module globals.
+    Attributes:
+        fuelImportance (float): The ponderation of the fuel cost.
+        timeImportance (float): The ponderation of the time cost.
+        valueImportance (float): The ponderation of the value gain.
+    """
+
+    def __init__(self, fuelImportance=None, timeImportance=None, valueImportance=None):
+        """
+        Initializes the weights, the ones not given are taken from the module globals.
+        """
+        self.fuelImportance = FUEL_IMPORTANCE if fuelImportance is None else fuelImportance
+        self.timeImportance = TIME_IMPORTANCE if timeImportance is None else timeImportance
+        self.valueImportance = VALUE_IMPORTANCE if valueImportance is None else valueImportance
+
+    def __repr__(self):
+        return f"PlannerConfig(fuelImportance={self.fuelImportance}, timeImportance={self.timeImportance}, valueImportance={self.valueImportance})"
+
+    def asTuple(self):
+        """
+        Returns the weights as a (fuelImportance, timeImportance, valueImportance) tuple.
+        """
+        return (self.fuelImportance, self.timeImportance, self.valueImportance)
+
+
+def costOfTravel(distance, mass, config=None):
     """
     Returns the cost of traveling a certain distance with a given mass.
     This use a linear combination of fuel cost and time cost, with the specified weights.
@@ -22,68 +66,136 @@ def costOfTravel(distance, mass):
     Parameters:
     distance (float): The distance to travel.
     mass (float): The mass of the object traveling the distance.
+    config (PlannerConfig, optional): The weights to use. Defaults to the module globals.
 
     Returns:
     float: The cost of traveling the distance with the given mass.
     """
-    return FUEL_IMPORTANCE * Robot.fuelCost(distance, mass) + TIME_IMPORTANCE * Robot.timeCost(distance, mass)
+    model = Robot.costModel
+    if config is None:
+        return FUEL_IMPORTANCE * model.fuelCost(distance, mass) + TIME_IMPORTANCE * model.timeCost(distance, mass)
+    return config.fuelImportance * model.fuelCost(distance, mass) + config.timeImportance * model.timeCost(distance, mass)
 
 
-def dumbOrderOfCylinders(cylinders, initialPosition):
+def dumbOrderOfCylinders(cylinders, initialPosition, distances=None, config=None, lookahead=1):
     """
     Returns an order of cylinders to pick up based on the cost of traveling between them.
-    This function uses a brute-force approach to calculate the best order of cylinders to pick up based on the cost of traveling between them.
+    At each step, the cylinder with the smallest cost of travel divided by its value weight is taken.
+
+    The costs are linear in the distance, so the straight-line distance gives a lower bound of the cost of every remaining
+    cylinder in one array operation : the avoidance distances are only calculated, by increasing bound, for the cylinders
+    that can still be the best one.
 
     Parameters:
     cylinders (list): A list of cylinder objects.
     initialPosition (float): The initial position of the robot.
+    distances (AvoidanceDistances, optional): The distance matrix of the map, built if not given.
+    config (PlannerConfig, optional): The weights to use. Defaults to the module globals.
+    lookahead (int, optional): The number of best cylinders that are compared on the cost of the step after them too
+        (1 is the plain greedy choice). Defaults to 1.
 
     Returns:
     list: A list of cylinder objects representing the best order to pick up the cylinders.
     """
+    distances = distances if distances is not None else AvoidanceDistances(cylinders, initialPosition)
+    config = config if config is not None else PlannerConfig()
+    cylinders = distances.cylinders
+    # The value weight of each cylinder is calculated only once
+    valueWeights = np.array([value ** config.valueImportance for value in cylinders.values], dtype=float)
     
     # We save the position and the not explored cylinders
-    remainingCylindersId = [i for i in range(len(cylinders))]
-    currentPosition = initialPosition
+    remaining = np.ones(len(cylinders), dtype=bool)
+    currentCylinderId = None
     currentMass = 0
     order = []
     
     # Get best order
     for _ in range(len(cylinders)):
-        leastCost, leastCostCylinderId = None, None
-        for cylinderId in remainingCylindersId:
-            # We calculate the cost of traveling between the current position and the cylinder
-            cost = costOfTravel(distanceToCylindersWithAvoidance(cylinders, cylinderId, currentPosition, order), currentMass)
-            # We divide the cost if the value is good
-            cost /= cylinders[cylinderId].getValue() ** VALUE_IMPORTANCE
-            leastCostCylinderId, leastCost = (cylinderId, cost) if leastCost is None or cost < leastCost else (leastCostCylinderId, leastCost)
-        remainingCylindersId.remove(leastCostCylinderId)
+        candidates = _leastCostCylinders(distances, valueWeights, remaining, currentCylinderId, order, currentMass, config, lookahead)
+        if lookahead > 1 and len(candidates) > 1:
+            # We add the cost of the best step after each candidate
+            totalCosts = []
+            for cost, cylinderId in candidates:
+                remaining[cylinderId] = False
+                nextCandidates = _leastCostCylinders(distances, valueWeights, remaining, cylinderId, order + [cylinderId],
+                                                     currentMass + cylinders.masses[cylinderId], config, 1)
+                remaining[cylinderId] = True
+                totalCosts.append((cost + (nextCandidates[0][0] if nextCandidates else 0), cylinderId))
+            leastCostCylinderId = min(totalCosts)[1]
+        else:
+            leastCostCylinderId = candidates[0][1]
+        remaining[leastCostCylinderId] = False
         order.append(leastCostCylinderId)
-        currentMass += cylinders[leastCostCylinderId].getMass()
-        currentPosition = cylinders[leastCostCylinderId].getPosition()
+        currentMass += cylinders.masses[leastCostCylinderId]
+        currentCylinderId = leastCostCylinderId
         
     return order
 
 
-def improveWith2Opt(cylinders, order):
+def _leastCostCylinders(distances, valueWeights, remaining, fromId, order, mass, config, count):
+    """
+    Returns the `count` remaining cylinders with the least cost of travel divided by their value weight, as sorted (cost, id).
+    The cylinders are evaluated by increasing lower bound (straight-line distance), until the bound of the next one is
+    above the `count`-th least cost found.
+    """
+    remainingId = np.flatnonzero(remaining)
+    fromPosition = distances.initialPosition if fromId is None else distances.cylinders.positions[fromId]
+    xs, ys = distances.coordinates
+    # The cost of each step is its distance times a factor that only depends on the mass
+    costByMeter = costOfTravel(1, mass, config)
+    bounds = np.hypot(xs[remainingId] - fromPosition[0], ys[remainingId] - fromPosition[1]) * costByMeter / valueWeights[remainingId]
+    best = []
+    for index in np.argsort(bounds, kind='stable').tolist():
+        # A small margin keeps the rounding of the bound from skipping an equal cost
+        if len(best) == count and bounds[index] * (1 - 1e-9) > best[-1][0]:
+            break
+        cylinderId = int(remainingId[index])
+        cost = costOfTravel(distances.length(fromId, cylinderId, order), mass, config) / valueWeights[cylinderId]
+        if instr.enabled:
+            instr.count('greedy.evaluated')
+        if len(best) < count or (cost, cylinderId) < best[-1]:
+            best.append((cost, cylinderId))
+            best.sort()
+            del best[count:]
+    return best
+
+
+def improveWith2Opt(cylinders, order, distances=None):
+    """
+    Improves an order of cylinders with the 2-opt heuristic.
+    Two edges of the path are swapped (by reversing the part of the order between them) as long as it shorten the path.
+
+    Parameters:
+    cylinders (list): A list of cylinder objects.
+    order (list): A list of indices representing the order in which to visit the cylinders.
+    distances (AvoidanceDistances, optional): The distance matrix of the map, built if not given.
+
+    Returns:
+    list: The improved order (the given list is modified in place).
+    """
+    distances = distances if distances is not None else AvoidanceDistances(cylinders)
     improve = True
     while improve:
         improve = False
         for numberI in range(1, len(order)-2):
+            if instr.enabled:
+                instr.count('2opt.tried', len(order) - 2 - numberI)
             for numberJ in range(numberI+1, len(order)-1):
-                a = distanceToCylindersWithAvoidance(cylinders, order[numberI], cylinders[order[numberI+1]].getPosition(), order[:numberI+2])
-                b = distanceToCylindersWithAvoidance(cylinders, order[numberJ], cylinders[order[numberJ+1]].getPosition(), order[:numberJ+2])
-                c = distanceToCylindersWithAvoidance(cylinders, order[numberI], cylinders[order[numberJ]].getPosition(), order[:numberI+1] + [order[numberJ]])
-                d = distanceToCylindersWithAvoidance(cylinders, order[numberI+1], cylinders[order[numberJ+1]].getPosition(), order[:numberJ+2])
+                a = distances.length(order[numberI+1], order[numberI], order[:numberI+2])
+                b = distances.length(order[numberJ+1], order[numberJ], order[:numberJ+2])
+                c = distances.length(order[numberJ], order[numberI], order[:numberI+1] + [order[numberJ]])
+                d = distances.length(order[numberJ+1], order[numberI+1], order[:numberJ+2])
                 if a + b > c + d:
                     order[numberI+1:numberJ+1] = order[numberI+1:numberJ+1][::-1]
                     improve = True
+                    if instr.enabled:
+                        instr.count('2opt.accepted')
     return order
 
 
             
             
-def pathFromCylindersOrder(cylinders, order, initialPosition):
+def pathFromCylindersOrder(cylinders, order, initialPosition, distances=None):
     """
     Generates a path based on the given order of cylinders and an initial position.
 
@@ -91,20 +203,186 @@ def pathFromCylindersOrder(cylinders, order, initialPosition):
         cylinders (list): A list of cylinder objects, each having a getPosition() method.
         order (list): A list of indices representing the order in which to visit the cylinders.
         initialPosition (tuple): The starting position as a tuple (x, y).
+        distances (AvoidanceDistances, optional): The distance matrix of the map, built if not given.
 
     Returns:
         list: A list of positions (tuples) representing the path from the initial position through the ordered cylinders.
     """
+    distances = distances if distances is not None else AvoidanceDistances(cylinders, initialPosition)
+    if not order:
+        return [initialPosition]
     # Deciding the first path and keep track of the visited cylinders
-    visitedCylinders = [0]
-    path = avoidCylinder(cylinders, initialPosition, cylinders[0].getPosition(), visitedCylinders)
+    visitedCylinders = [order[0]]
+    path = list(distances.path(None, order[0], visitedCylinders))
     # Adding the other paths
     for i in range(1, len(order)):
         visitedCylinders.append(order[i])
-        path += avoidCylinder(cylinders, cylinders[order[i-1]].getPosition(), cylinders[order[i]].getPosition(), visitedCylinders)[1:]
+        path += distances.path(order[i-1], order[i], visitedCylinders)[1:]
     # Return the decided path
     return path
 
+
+class AvoidanceDistances:
+    """
+    A memoized matrix of the avoidance paths between the cylinders of a map.
+    It is built once per map and shared by the greedy pass, the 2-opt and the path generation, so that
+    the same detour is never calculated twice.
+
+    In exact mode, the paths are stored by (from, to, excluded cylinders) so that they are the same as the
+    ones given by `avoidCylinder`. In approximate mode, they are only stored by (from, to) : every cylinder
+    that is not one of the two ends is avoided, whatever has already been collected.
+
+    The paths are the detours of `avoidCylinder` ('midpoint' router), or the shortest paths of a `VisibilityRouter`
+    ('visibility' router, which falls back to `avoidCylinder` if it finds no path).
+
+    Attributes:
+        cylinders (CylinderSet): The cylinders of the map.
+        initialPosition (tuple): The position used when the start of a path is `None`.
+        approximate (bool): Whether the paths are only stored by (from, to).
+        router (str): The way of finding the paths, one of `ROUTERS`.
+    """
+
+    def __init__(self, cylinders, initialPosition=(0, 0), approximate=False, maxPaths=None, router='midpoint'):
+        """
+        Initializes an empty distance matrix for a map.
+
+        Args:
+            cylinders (list): A list of cylinder objects.
+            initialPosition (tuple, optional): The starting position of the robot. Defaults to (0, 0).
+            approximate (bool, optional): Whether to use the approximate mode. Defaults to False.
+            maxPaths (int, optional): The number of stored paths of the exact mode (other than the legs between two cylinders, which
+                are the same for every excluded set and always kept) after which they are forgotten. Defaults to no limit.
+            router (str, optional): The way of finding the paths, 'midpoint' or 'visibility'. Defaults to 'midpoint'.
+
+        Raises:
+            ValueError: If the router is unknown.
+        """
+        if router not in ROUTERS:
+            raise ValueError(f"Unknown router '{router}', it must be one of {ROUTERS}")
+        self.router = router
+        self._visibilityRouter = None
+        self.cylinders = CylinderSet.of(cylinders)
+        self.initialPosition = initialPosition
+        self.approximate = approximate
+        self.maxPaths = maxPaths
+        # The paths that can be forgotten, and the ones that are always kept (see `maxPaths`)
+        self._paths = {}
+        self._legs = {}
+        self._grid = None
+        self.coordinates = (self.cylinders.x, self.cylinders.y)
+
+    @property
+    def grid(self):
+        """
+        The spatial index of the cylinders, built on first use (`None` on small maps, where looking at every cylinder is faster).
+        """
+        if self._grid is None and len(self.cylinders) >= GRID_MIN_CYLINDERS:
+            self._grid = CylinderGrid(self.cylinders, cellSize=2 * AVOID_DISTANCE)
+        return self._grid
+
+    @property
+    def visibilityRouter(self):
+        """
+        The visibility graph router of the map, built on first use.
+        """
+        if self._visibilityRouter is None:
+            self._visibilityRouter = VisibilityRouter(self.coordinates, TOO_CLOSE_CYLINDER, AVOID_DISTANCE, self.grid)
+        return self._visibilityRouter
+
+    def position(self, cylinderId):
+        """
+        Returns the position of a cylinder, or the initial position if the id is `None`.
+        """
+        return self.initialPosition if cylinderId is None else self.cylinders.positions[cylinderId]
+
+    def _get(self, fromId, toId, exludesCylindersId):
+        # We build the key of the path depending on the mode
+        if self.approximate:
+            key = (fromId, toId)
+            exludesCylindersId = [toId] if fromId is None else [fromId, toId]
+        else:
+            key = (fromId, toId, frozenset(exludesCylindersId).union((toId,)))
+            exludesCylindersId = key[2]
+        # The paths between two cylinders are the same for every excluded set, they are never forgotten
+        paths = self._legs if len(key) == 2 or key[2].issubset(key[:2]) else self._paths
+        # We calculate the path only if we never did it before
+        entry = paths.get(key)
+        if instr.enabled:
+            instr.count('distances.misses' if entry is None else 'distances.hits')
+        if entry is None:
+            # When there are too many paths, we forget the ones that can be forgotten
+            if paths is self._paths and self.maxPaths is not None and len(self._paths) >= self.maxPaths:
+                self._paths.clear()
+            path = None
+            if self.router == 'visibility':
+                path = self.visibilityRouter.route(self.position(fromId), self.position(toId), exludesCylindersId)
+                if path is None and instr.enabled:
+                    instr.count('visibility.fallbacks')
+            if path is None:
+                path = avoidCylinder(self.cylinders, self.position(fromId), self.position(toId), list(exludesCylindersId), self.grid, self.coordinates)
+            entry = paths[key] = (path, distanceOfPath(path))
+        return entry
+
+    def path(self, fromId, toId, exludesCylindersId=()):
+        """
+        Returns the avoidance path between two cylinders.
+
+        Args:
+            fromId (int): The id of the starting cylinder, or `None` for the initial position.
+            toId (int): The id of the goal cylinder.
+            exludesCylindersId (list, optional): The id of the cylinders that are not obstacles (ignored in approximate mode).
+
+        Returns:
+            list: A list of tuples representing the points of the path. It is shared, so it must not be modified.
+        """
+        return self._get(fromId, toId, exludesCylindersId)[0]
+
+    def length(self, fromId, toId, exludesCylindersId=()):
+        """
+        Returns the length of the avoidance path between two cylinders.
+
+        Args:
+            fromId (int): The id of the starting cylinder, or `None` for the initial position.
+            toId (int): The id of the goal cylinder.
+            exludesCylindersId (list, optional): The id of the cylinders that are not obstacles (ignored in approximate mode).
+
+        Returns:
+            float: The length of the path.
+        """
+        return self._get(fromId, toId, exludesCylindersId)[1]
+
+    def legLength(self, fromId, toId):
+        """
+        Returns the length of the path between two cylinders that avoids all the other cylinders.
+        This is the same in both modes, so it can be used by algorithms that don't know what has been collected.
+
+        Args:
+            fromId (int): The id of the starting cylinder, or `None` for the initial position.
+            toId (int): The id of the goal cylinder.
+
+        Returns:
+            float: The length of the path.
+        """
+        return self.length(fromId, toId, () if fromId is None else (fromId,))
+
+    def legMatrix(self):
+        """
+        Returns the lengths of all the legs (see `legLength`) as an array, for the algorithms that work on whole routes.
+
+        Returns:
+            numpy.ndarray: An array of shape (number of cylinders + 1, number of cylinders), the line i has the legs from
+            the cylinder i and the last line the legs from the initial position (`inf` from a cylinder to itself).
+        """
+        count = len(self.cylinders)
+        legs = np.full((count + 1, count), np.inf)
+        for toId in range(count):
+            legs[count, toId] = self.legLength(None, toId)
+            for fromId in range(count):
+                if fromId != toId:
+                    legs[fromId, toId] = self.legLength(fromId, toId)
+        return legs
+
+
 def distanceToCylindersWithAvoidance(cylinders, idCylinder, position, exludesCylindersId=[]):
     """
     Returns the distance between a position and cylinders.
@@ -120,7 +398,7 @@ def distanceToCylindersWithAvoidance(cylinders, idCylinder, position, exludesCyl
     return distanceOfPath(avoidCylinder(cylinders, position, cylinders[idCylinder].getPosition(), [idCylinder] + exludesCylindersId))
 
 
-def avoidCylinder(cylinders, beginPosition, endPosition, exludesCylindersId=[]):
+def avoidCylinder(cylinders, beginPosition, endPosition, exludesCylindersId=[], grid=None, coordinates=None):
     """
     Calculate a path that avoids cylinders between two points.
     This function takes a list of cylinders and two points (beginPosition and endPosition) and calculates a path that avoids any cylinders that may be in the way. If no cylinders are in the way, it returns a straight line between the two points. If a cylinder is in the way, it calculates an avoidance path around the cylinder.
@@ -130,6 +408,8 @@ def avoidCylinder(cylinders, beginPosition, endPosition, exludesCylindersId=[]):
     beginPosition (tuple): A tuple (x, y) representing the starting point of the path.
     endPosition (tuple): A tuple (x, y) representing the ending point of the path.
     exludesCylindersId (list): A list of the id of the cylinders to exclude from the avoidance path.
+    grid (CylinderGrid, optional): A spatial index of the cylinders. If not given, every cylinder is looked at.
+    coordinates (tuple, optional): The x and y arrays of the cylinder coordinates, to test many candidates in one numpy call (taken from the cylinders if they are a `CylinderSet`).
     
     Returns:
     list: A list of tuples representing the points of the calculated path, including the start and end points.
@@ -139,38 +419,52 @@ def avoidCylinder(cylinders, beginPosition, endPosition, exludesCylindersId=[]):
     # For that, we take the distance of the line between the two points and we check if the circle is within that distance from the end and begin point
 
     # We exclude cylinders that are in the exludesCylindersId list
-    notExcludedCylinders = [cylinderId for cylinderId in range(len(cylinders)) if cylinderId not in exludesCylindersId]
-    
-    # Calculate the regular distance between the two points and initalizing the list
-    birdFlightDistance = distance(beginPosition, endPosition)
-    cylinderIdMaybeInTheWay = []
+    # With a spatial index, we only look at the cylinders near the segment (a cylinder in the circle and close to the line is always within sqrt(2) times the too close distance of the segment)
+    if coordinates is None and isinstance(cylinders, CylinderSet):
+        coordinates = (cylinders.x, cylinders.y)
+    candidatesId = range(len(cylinders)) if grid is None else grid.nearSegment(beginPosition, endPosition, TOO_CLOSE_CYLINDER * math.sqrt(2))
+    notExcludedCylinders = [cylinderId for cylinderId in candidatesId if cylinderId not in exludesCylindersId]
+    if instr.enabled:
+        instr.count('avoidCylinder.calls')
+        instr.count('avoidCylinder.candidates', len(notExcludedCylinders))
     
-    # For each cylinder, we check if it is in the circle of the bird flight distance diameter and center the middle of the two points
-    middlePoint = (
-        (beginPosition[0] + endPosition[0]) / 2,
-        (beginPosition[1] + endPosition[1]) / 2
-    )
-    for cylinderId in notExcludedCylinders:
-        if distance(middlePoint, cylinders[cylinderId].getPosition()) <= birdFlightDistance/2 + TOO_CLOSE_CYLINDER:
-            cylinderIdMaybeInTheWay.append(cylinderId)
-
-    # For each cylinder in the list, we check if it is in the way by checking his distance from the line
+    # With many candidates, the cylinders are all tested at once on their coordinates arrays
     tooCloseCylinderId = None
-    for cylinderId in cylinderIdMaybeInTheWay:
-        cylinder = cylinders[cylinderId]
-        # Parameter of the line between the two points
-        a = endPosition[1] - beginPosition[1]
-        b = beginPosition[0] - endPosition[0]
-        c = endPosition[0]*beginPosition[1] - beginPosition[0]*endPosition[1]
-        # The point on the line the closest to the cylinder
-        x = (b*(b*cylinder.getPosition()[0] - a*cylinder.getPosition()[1]) - a*c)/(a**2 + b**2)
-        y = (a*(-b*cylinder.getPosition()[0] + a*cylinder.getPosition()[1]) - b*c)/(a**2 + b**2)
-        # Check if the distance between the point and the cylinder is smaller than the radius of the cylinder and the radius of the robot (to avoid collision)
-        distanceWithCylinder = distance(cylinder.getPosition(), (x, y))
-        # If we find one, we stop there
-        if distanceWithCylinder < TOO_CLOSE_CYLINDER :
-            tooCloseCylinderId = cylinderId
-            break
+    if coordinates is not None and len(notExcludedCylinders) >= VECTORIZE_MIN_CANDIDATES:
+        blockingCylinder = firstBlockingCylinder(coordinates[0], coordinates[1], notExcludedCylinders, beginPosition, endPosition, TOO_CLOSE_CYLINDER)
+        if blockingCylinder is not None:
+            tooCloseCylinderId, distanceWithCylinder, x, y = blockingCylinder
+            cylinder = cylinders[tooCloseCylinderId]
+    else:
+        # Calculate the regular distance between the two points and initalizing the list
+        birdFlightDistance = distance(beginPosition, endPosition)
+        cylinderIdMaybeInTheWay = []
+    
+        # For each cylinder, we check if it is in the circle of the bird flight distance diameter and center the middle of the two points
+        middlePoint = (
+            (beginPosition[0] + endPosition[0]) / 2,
+            (beginPosition[1] + endPosition[1]) / 2
+        )
+        for cylinderId in notExcludedCylinders:
+            if distance(middlePoint, cylinders[cylinderId].getPosition()) <= birdFlightDistance/2 + TOO_CLOSE_CYLINDER:
+                cylinderIdMaybeInTheWay.append(cylinderId)
+
+        # For each cylinder in the list, we check if it is in the way by checking his distance from the line
+        for cylinderId in cylinderIdMaybeInTheWay:
+            cylinder = cylinders[cylinderId]
+            # Parameter of the line between the two points
+            a = endPosition[1] - beginPosition[1]
+            b = beginPosition[0] - endPosition[0]
+            c = endPosition[0]*beginPosition[1] - beginPosition[0]*endPosition[1]
+            # The point on the line the closest to the cylinder
+            x = (b*(b*cylinder.getPosition()[0] - a*cylinder.getPosition()[1]) - a*c)/(a**2 + b**2)
+            y = (a*(-b*cylinder.getPosition()[0] + a*cylinder.getPosition()[1]) - b*c)/(a**2 + b**2)
+            # Check if the distance between the point and the cylinder is smaller than the radius of the cylinder and the radius of the robot (to avoid collision)
+            distanceWithCylinder = distance(cylinder.getPosition(), (x, y))
+            # If we find one, we stop there
+            if distanceWithCylinder < TOO_CLOSE_CYLINDER :
+                tooCloseCylinderId = cylinderId
+                break
     
     # If we didn't find any cylinder in the way, we return the classic way of going : a straight line between the two points
     if tooCloseCylinderId is None:
@@ -185,8 +479,16 @@ def avoidCylinder(cylinders, beginPosition, endPosition, exludesCylindersId=[]):
     #plt.plot([x, avoidanceX], [y, avoidanceY], color='pink', linewidth=2)
     
     # We recursively build the the avoidance path by calling the function on the two new segments
-    firstPartOfPath = avoidCylinder(cylinders, beginPosition, (avoidanceX, avoidanceY), exludesCylindersId + [tooCloseCylinderId])
-    secondPartOfPath = avoidCylinder(cylinders, (avoidanceX, avoidanceY), endPosition, exludesCylindersId + [tooCloseCylinderId])
+    # The level is left even if the recursion fails, and only if it was entered
+    measured = instr.enabled
+    if measured:
+        instr.descend('avoidCylinder.depth')
+    try:
+        firstPartOfPath = avoidCylinder(cylinders, beginPosition, (avoidanceX, avoidanceY), exludesCylindersId + [tooCloseCylinderId], grid, coordinates)
+        secondPartOfPath = avoidCylinder(cylinders, (avoidanceX, avoidanceY), endPosition, exludesCylindersId + [tooCloseCylinderId], grid, coordinates)
+    finally:
+        if measured:
+            instr.ascend('avoidCylinder.depth')
     
     # We return the concatenation of the two paths
     return firstPartOfPath + secondPartOfPath[1:]
@@ -235,9 +537,61 @@ def angleDiff(a1, a2):
     diff = (a2 - a1) % 360
     return diff - 360 if diff > 180 else diff
 
+def iterMovements(path, minTurn=MIN_TURN, minGo=MIN_GO, lineTolerance=LINE_TOLERANCE):
+    """
+    Yields the movement commands for a robot to follow a given path, one by one.
+    The points that stay on the straight line of the current `GO` (within `lineTolerance` of it) only make it longer :
+    its length is measured from the start of the line, so the rounding of the command is only done once.
+    The other points are aimed from where the robot really is (after the rounding of the previous commands), the
+    segments too short to be written are skipped and the turns too small to be written are not written.
+
+    Args:
+        path (list of tuple): A list of (x, y) coordinates representing the path.
+        minTurn (float, optional): The smallest rotation written, in degrees. Defaults to 0.01 (the precision of the commands).
+        minGo (float, optional): The smallest move written, in meters. Defaults to 0.01 (the precision of the commands).
+        lineTolerance (float, optional): The largest distance (m) between a point and the current line for it to be on the line.
+            Defaults to 0.005 (half the precision of the commands).
+
+    Yields:
+        str: A "TURN <angle>" command to rotate the robot by the specified angle in degrees, a "GO <distance>" command to
+             move the robot forward by the specified distance, and a "FINISH" command to indicate the end of the path.
+    """
+    if len(path) > 0:
+        x, y = path[0]
+        heading = Robot.initialOrientation
+        # The current straight line : where it starts and its length (0 when there is none)
+        lineX, lineY, lineLength = x, y, 0
+        for targetX, targetY in path[1:]:
+            if lineLength > 0:
+                # The position of the target along the line and its distance to the line
+                dx, dy = targetX - lineX, targetY - lineY
+                along = dx * math.cos(math.radians(heading)) + dy * math.sin(math.radians(heading))
+                across = -dx * math.sin(math.radians(heading)) + dy * math.cos(math.radians(heading))
+                if abs(across) <= lineTolerance and along >= lineLength:
+                    lineLength = math.hypot(dx, dy)
+                    continue
+                # The robot goes to the end of the line, by the rounded distance of the command
+                goDistance = round(lineLength, 2)
+                yield f"GO {goDistance:.2f}"
+                x = lineX + goDistance * math.cos(math.radians(heading))
+                y = lineY + goDistance * math.sin(math.radians(heading))
+                lineLength = 0
+            # The target is aimed from the current position
+            segmentDistance = math.hypot(targetX - x, targetY - y)
+            if segmentDistance < minGo:
+                continue
+            turnAngle = round(angleDiff(heading, math.degrees(math.atan2(targetY - y, targetX - x))), 2)
+            if abs(turnAngle) >= minTurn:
+                yield f"TURN {turnAngle:.2f}"
+                heading += turnAngle
+            lineX, lineY, lineLength = x, y, segmentDistance
+        if lineLength > 0:
+            yield f"GO {round(lineLength, 2):.2f}"
+    yield "FINISH"
+
 def generateMouvement(path):
     """
-    Generates a list of movement commands for a robot to follow a given path.
+    Generates a list of movement commands for a robot to follow a given path (see `iterMovements`).
 
     Args:
         path (list of tuple): A list of (x, y) coordinates representing the path.
@@ -249,25 +603,4 @@ def generateMouvement(path):
                      forward by the specified distance, or a "FINISH" command to 
                      indicate the end of the path.
     """
-    mouvement = []
-    # Initial direction
-    currentAngle = Robot.initialOrientation
-    # For each segment of the path, we take the pouint that define it
-    for i in range(len(path) - 1):
-        x1, y1 = path[i]
-        x2, y2 = path[i+1]
-        # Calcul of the target direction
-        targetAngle = math.degrees(math.atan2(y2 - y1, x2 - x1))
-        # Calcul of the rotation
-        turnAngle = angleDiff(currentAngle, targetAngle)
-        # If the rotation is not too small, we add it to the file
-        if abs(turnAngle) > 1e-6:
-            mouvement.append(f"TURN {turnAngle:.2f}")
-        # Distance between the points
-        dist = distance((x1, y1), (x2, y2))
-        mouvement.append(f"GO {dist:.2f}")
-        # Store the new current angle
-        currentAngle = targetAngle
-    # We add the finish line and return the list
-    mouvement.append("FINISH")
-    return mouvement
\ No newline at end of file
+    return list(iterMovements(path))
\ No newline at end of file
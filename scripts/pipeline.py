@@ -0,0 +1,91 @@
+"""The whole planning of a map, from the cylinders to the path of the robot."""
+import instrumentation as instr
+import pathsearch as ps
+import orienteering as ori
+import exactsolver
+import metaheuristic
+
+# The ways of choosing the order : the greedy order improved by local search, the exact solver on the small maps,
+# or the heuristic order improved by the ALNS
+SOLVERS = ('heuristic', 'exact', 'alns')
+
+
+def planMap(cylinders, initialPosition=(0, 0), withinBudget=False, distances=None, config=None, router='midpoint', solver='heuristic'):
+    """
+    Plans the order of the cylinders and the path of the robot for a map.
+
+    Args:
+        cylinders (list): A list of cylinder objects.
+        initialPosition (tuple, optional): The starting position as a tuple (x, y). Defaults to (0, 0).
+        withinBudget (bool, optional): Whether to only plan the cylinders that can be collected before running out of time or fuel. Defaults to False.
+        distances (AvoidanceDistances, optional): The distance matrix of the map, built if not given.
+        config (PlannerConfig, optional): The weights to use. Defaults to the module globals of `pathsearch`.
+        router (str, optional): The router of the avoidance paths, 'midpoint' or 'visibility' (see `AvoidanceDistances`). Defaults to 'midpoint'.
+        solver (str, optional): 'heuristic', or 'exact' for `exactsolver.planExact` on the maps of at most `EXACT_MAX_CYLINDERS`
+            cylinders (the bigger maps are planned with the heuristic), or 'alns' for `metaheuristic.searchOrder` from the
+            order of the heuristic. Defaults to 'heuristic'.
+
+    Returns:
+        tuple: The order of the cylinders and the path (list of (x, y) positions) of the robot.
+
+    Raises:
+        ValueError: If the solver is unknown.
+    """
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown solver '{solver}', it must be one of {SOLVERS}")
+    # The avoidance paths are shared by all the steps
+    distances = distances if distances is not None else ps.AvoidanceDistances(cylinders, initialPosition, router=router)
+    if solver == 'exact' and len(cylinders) <= exactsolver.EXACT_MAX_CYLINDERS:
+        # Find the best order of the model of the orienteering planner
+        with instr.stage('exact'):
+            order = exactsolver.planExact(cylinders, initialPosition, distances, withinBudget, config=config)
+    elif withinBudget:
+        # Choose the cylinders that can be collected and their order
+        order = ori.planWithinBudget(cylinders, initialPosition, distances, config)
+    else:
+        # Find a dumb of exploration of cylinders
+        with instr.stage('greedy'):
+            dumbOrder = ps.dumbOrderOfCylinders(cylinders, initialPosition, distances, config)
+        # Improve it wit 2-opt
+        with instr.stage('2opt'):
+            order = ps.improveWith2Opt(cylinders, dumbOrder, distances)
+    if solver == 'alns':
+        # Leave the local optimum of the heuristic
+        with instr.stage('alns'):
+            order = metaheuristic.searchOrder(cylinders, initialPosition, distances, withinBudget, initialOrder=order)
+    # Generate the path from the best order
+    with instr.stage('path'):
+        path = ps.pathFromCylindersOrder(cylinders, order, initialPosition, distances)
+    return order, path
+
+
+def planMovements(cylinders, initialPosition=(0, 0), withinBudget=False, distances=None, config=None, cache=None, router='midpoint', solver='heuristic'):
+    """
+    Plans a map like `planMap` and also returns the movements of the robot. If a cache is given and already has the plan
+    of this map with these options and weights, nothing is planned.
+
+    Args:
+        cylinders (list): A list of cylinder objects.
+        initialPosition (tuple, optional): The starting position as a tuple (x, y). Defaults to (0, 0).
+        withinBudget (bool, optional): Whether to only plan the cylinders that can be collected before running out of time or fuel. Defaults to False.
+        distances (AvoidanceDistances, optional): The distance matrix of the map, built if not given.
+        config (PlannerConfig, optional): The weights to use. Defaults to the module globals of `pathsearch`.
+        cache (PlanCache, optional): The cache of the plans. Defaults to no cache.
+        router (str, optional): The router of the avoidance paths, 'midpoint' or 'visibility' (see `AvoidanceDistances`). Defaults to 'midpoint'.
+        solver (str, optional): 'heuristic', 'exact' or 'alns', see `planMap`. Defaults to 'heuristic'.
+
+    Returns:
+        tuple: The order of the cylinders, the path (list of (x, y) positions) and the movements of the robot.
+    """
+    key = cache.key(cylinders, initialPosition, withinBudget, config, router, solver) if cache is not None else None
+    plan = cache.get(key) if cache is not None else None
+    if plan is not None:
+        if instr.enabled:
+            instr.count('cache.hits')
+        return plan
+    order, path = planMap(cylinders, initialPosition, withinBudget, distances, config, router, solver)
+    with instr.stage('movements'):
+        movements = ps.generateMouvement(path)
+    if cache is not None:
+        cache.put(key, order, path, movements)
+    return order, path, movements
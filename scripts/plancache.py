@@ -0,0 +1,122 @@
+"""On-disk cache of the planned maps, so that the same map is not planned again with the same weights."""
+import hashlib
+import os
+import tempfile
+import numpy as np
+import pathsearch as ps
+from simulation import CylinderSet, Robot
+
+# Version of the planner, to change when the planning changes so that the old plans are not used anymore
+PLANNER_VERSION = 4
+
+
+class PlanCache:
+    """
+    A directory of planned maps, one compressed `.npz` file by plan (order, path and movements).
+    When the directory is bigger than its size cap, the least recently used plans are removed.
+
+    Attributes:
+        directory (str): The directory of the cache.
+        maxBytes (int): The maximum size of the directory.
+    """
+
+    def __init__(self, directory, maxBytes=64 * 1024 * 1024):
+        """
+        Opens a cache directory, created if it doesn't exist.
+
+        Args:
+            directory (str): The directory of the cache.
+            maxBytes (int, optional): The maximum size of the directory. Defaults to 64 MiB.
+        """
+        self.directory = directory
+        self.maxBytes = maxBytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(cylinders, initialPosition=(0, 0), withinBudget=False, config=None, router='midpoint', solver='heuristic'):
+        """
+        Returns the key of a plan : a hash of the content of the map, the planning options, the weights, the parameters of the robot (`Robot.costModel`) and the planner version.
+
+        Args:
+            cylinders (list): A list of cylinder objects or a `CylinderSet`.
+            initialPosition (tuple, optional): The starting position as a tuple (x, y). Defaults to (0, 0).
+            withinBudget (bool, optional): Whether only the cylinders that can be collected are planned. Defaults to False.
+            config (PlannerConfig, optional): The weights. Defaults to the module globals of `pathsearch`.
+            router (str, optional): The router of the avoidance paths. Defaults to 'midpoint'.
+            solver (str, optional): The solver of the order. Defaults to 'heuristic'.
+
+        Returns:
+            str: The hexadecimal key.
+        """
+        cylinders = CylinderSet.of(cylinders)
+        config = config if config is not None else ps.PlannerConfig()
+        digest = hashlib.sha256()
+        for column in (cylinders.x, cylinders.y, cylinders.cat):
+            digest.update(np.ascontiguousarray(column, dtype=float).tobytes())
+        digest.update(repr((tuple(map(float, initialPosition)), bool(withinBudget), config.asTuple(), router, solver, PLANNER_VERSION,
+                             sorted(Robot.costModel.comsumptionParams.items()), sorted(Robot.costModel.speedParams.items()))).encode())
+        return digest.hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key):
+        """
+        Returns a plan of the cache, and marks it as recently used.
+
+        Args:
+            key (str): The key of the plan.
+
+        Returns:
+            tuple: The order of the cylinders, the path and the movements, or `None` if the plan is not in the cache.
+        """
+        filename = self._file(key)
+        try:
+            with np.load(filename) as plan:
+                order, path, movements = plan['order'].tolist(), plan['path'], plan['movements'].item()
+        except (OSError, KeyError, ValueError):
+            # Missing, removed meanwhile or partly written : it is planned again
+            return None
+        try:
+            os.utime(filename)
+        except FileNotFoundError:
+            pass
+        return order, [tuple(point) for point in path.tolist()], movements.split('\n') if movements else []
+
+    def put(self, key, order, path, movements):
+        """
+        Adds a plan to the cache, then removes the least recently used plans if the cache is too big.
+
+        Args:
+            key (str): The key of the plan.
+            order (list): The order of the cylinders.
+            path (list): The (x, y) points of the path.
+            movements (list): The movements of the robot.
+        """
+        # The plan is written in a temporary file first, so that a plan is never read while it is written
+        fileDescriptor, temporaryFilename = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        with os.fdopen(fileDescriptor, 'wb') as f:
+            np.savez_compressed(f, order=np.array(order, dtype=np.int32), path=np.array(path, dtype=float).reshape(-1, 2),
+                                movements=np.array('\n'.join(movements)))
+        os.replace(temporaryFilename, self._file(key))
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used plans until the cache is not bigger than its size cap.
+        """
+        entries = []
+        with os.scandir(self.directory) as files:
+            for entry in files:
+                if entry.name.endswith('.npz'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        totalBytes = sum(size for _, size, _ in entries)
+        for _, size, filename in sorted(entries):
+            if totalBytes <= self.maxBytes:
+                break
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            totalBytes -= size
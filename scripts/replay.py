@@ -0,0 +1,274 @@
+"""Replay of the movement scripts on their maps : what the robot really collects when it follows the written commands."""
+import argparse
+import concurrent.futures as cf
+import functools
+import json
+import os
+import re
+import sys
+import zipfile
+import numpy as np
+import inoutfilereader as io
+import pathsearch as ps
+import pipeline
+import scoring
+from plancache import PlanCache
+from simulation import Robot
+
+# The commands of a script
+COMMANDS = ('GO', 'TURN', 'FINISH')
+# The distance (m) between a replay and its planned path (or between their ends) above which the `--drift` check fails
+MAX_DRIFT = 0.1
+
+
+def parseMovements(movements):
+    """
+    Reads the commands of a script until its FINISH command.
+
+    Args:
+        movements (iterable of str): The lines of the script (a list, or the text split in lines).
+
+    Returns:
+        tuple: Two arrays, whether each command is a GO (otherwise a TURN), and its value (meters or degrees).
+
+    Raises:
+        ValueError: If a line isn't a command, or if there is no FINISH command.
+    """
+    isGo, values = [], []
+    for lineNumber, line in enumerate(movements, 1):
+        words = line.split()
+        if not words:
+            continue
+        if words[0] == 'FINISH' and len(words) == 1:
+            return np.array(isGo, dtype=bool), np.array(values, dtype=float)
+        if words[0] not in COMMANDS or len(words) != 2:
+            raise ValueError(f"Line {lineNumber}: '{line.strip()}' is not a command ({', '.join(COMMANDS)})")
+        try:
+            values.append(float(words[1]))
+        except ValueError:
+            raise ValueError(f"Line {lineNumber}: '{words[1]}' is not a number") from None
+        isGo.append(words[0] == 'GO')
+    raise ValueError("The script has no FINISH command")
+
+
+def scriptPath(movements, initialPosition=(0, 0), initialOrientation=Robot.initialOrientation):
+    """
+    Returns the path followed by the robot when it executes a script : the turns are summed into the heading of each GO,
+    and the moves into the positions, with array operations.
+
+    Args:
+        movements (iterable of str): The lines of the script.
+        initialPosition (tuple, optional): The starting position as a tuple (x, y). Defaults to (0, 0).
+        initialOrientation (float, optional): The starting heading, in degrees. Defaults to the one of the robot.
+
+    Returns:
+        list: The (x, y) positions of the robot, at the start and after each GO.
+    """
+    isGo, values = parseMovements(movements)
+    headings = np.radians(initialOrientation + np.cumsum(np.where(isGo, 0, values))[isGo])
+    distances = values[isGo]
+    xs = initialPosition[0] + np.concatenate([[0], np.cumsum(distances * np.cos(headings))])
+    ys = initialPosition[1] + np.concatenate([[0], np.cumsum(distances * np.sin(headings))])
+    return list(zip(xs.tolist(), ys.tolist()))
+
+
+def replayScript(movements, cylinders, initialPosition=(0, 0)):
+    """
+    Executes a script on a map with the time and fuel of the robot, the cylinders are collected when the robot comes
+    within `pathsearch.TOO_CLOSE_CYLINDER` of them (see `scoring.followPath`).
+
+    Args:
+        movements (iterable of str): The lines of the script.
+        cylinders (list): A list of cylinder objects or a `CylinderSet`.
+        initialPosition (tuple, optional): The starting position as a tuple (x, y). Defaults to (0, 0).
+
+    Returns:
+        PathScore: The points, time, fuel and collected cylinders, and where the robot ran out of time or fuel (if it did).
+    """
+    return scoring.scorePath(scriptPath(movements, initialPosition), cylinders)
+
+
+def pathDrift(movements, path):
+    """
+    Returns how far the robot gets from the path a script was made from, because of the rounding of the commands.
+
+    Args:
+        movements (iterable of str): The lines of the script.
+        path (list): The (x, y) points of the planned path.
+
+    Returns:
+        tuple: The largest distance between a position of the replay and the planned path, and the distance between their ends.
+    """
+    positions = np.array(scriptPath(movements, path[0]))
+    points = np.array(path, dtype=float)
+    begins, ends = points[:-1], points[1:]
+    # Distance from each position to each segment of the path
+    directions = ends - begins
+    squaredLengths = np.maximum((directions ** 2).sum(axis=1), 1e-12)
+    t = np.clip(((positions[:, np.newaxis] - begins) * directions).sum(axis=2) / squaredLengths, 0, 1)
+    closest = begins + t[..., np.newaxis] * directions
+    distances = np.sqrt(((positions[:, np.newaxis] - closest) ** 2).sum(axis=2)).min(axis=1) if len(begins) else np.zeros(len(positions))
+    return float(distances.max()), float(np.hypot(*(positions[-1] - points[-1])))
+
+
+def loadScripts(source):
+    """
+    Yields the scripts of a directory (its `script-*.txt` files), a zip archive or a JSON lines archive (see `inoutfilereader.ScriptArchive`).
+
+    Args:
+        source (str): The path of the directory or of the archive.
+
+    Yields:
+        tuple: The name of a script (its file name without the extension) and its lines.
+    """
+    if os.path.isdir(source):
+        for filename in sorted(os.listdir(source)):
+            if filename.startswith('script-') and filename.endswith('.txt'):
+                with open(os.path.join(source, filename)) as f:
+                    yield os.path.splitext(filename)[0], f.read().splitlines()
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for name in archive.namelist():
+                yield os.path.splitext(name)[0], archive.read(name).decode().splitlines()
+    else:
+        with open(source) as f:
+            for line in f:
+                script = json.loads(line)
+                yield os.path.splitext(script['name'])[0], script['movements']
+
+
+def mapsByName(mapPaths):
+    """
+    Returns the map files by the names their scripts can have : the name of the map file (`script-<map>`), or the number
+    it ends with (`script-3` is the script of `donnees-map-3.txt`, like the scripts of the evaluation maps).
+    """
+    byName = {}
+    for path in mapPaths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        number = re.search(r'(\d+)$', stem)
+        if number is not None:
+            byName.setdefault(str(int(number.group(1))), path)
+    # The names of the files come first
+    byName.update({os.path.splitext(os.path.basename(path))[0]: path for path in mapPaths})
+    return byName
+
+
+def mapOfScript(name, byName):
+    """
+    Returns the map file of a script from the maps given by `mapsByName`, or `None` if there is none.
+    """
+    return byName.get(name[len('script-'):] if name.startswith('script-') else name)
+
+
+@functools.lru_cache(maxsize=None)
+def _loadMap(mapPath):
+    # The maps are loaded once by each worker
+    return io.loadCylinders(mapPath)
+
+
+@functools.lru_cache(maxsize=None)
+def _plannedPath(mapPath, planOptions):
+    # The maps are planned once by each worker (or their plan is read from the cache)
+    withinBudget, router, solver, cacheDirectory = planOptions
+    cache = PlanCache(cacheDirectory) if cacheDirectory is not None else None
+    return pipeline.planMovements(_loadMap(mapPath), (0, 0), withinBudget, cache=cache, router=router, solver=solver)[1]
+
+
+def _replayTask(task):
+    """
+    Replays one script in a worker and returns its result.
+    """
+    name, movements, mapPath, planOptions = task
+    result = {'script': name, 'map': mapPath}
+    try:
+        score = replayScript(movements, _loadMap(mapPath))
+        if planOptions is not None:
+            result['maxDrift'], result['endDrift'] = pathDrift(movements, _plannedPath(mapPath, planOptions))
+    except ValueError as exc:
+        result['error'] = str(exc)
+        return result
+    result.update({'points': score.points, 'time': score.time, 'fuel': score.fuel, 'mass': score.mass, 'collected': score.collected,
+                   'ranOut': score.truncationIndex is not None, 'stopPosition': score.stopPosition})
+    return result
+
+
+def replayMany(scripts, mapPaths, workers=None, chunkSize=64, planOptions=None):
+    """
+    Replays many scripts on their maps in parallel, and yields their results : the scripts without a map first,
+    then the others in their order.
+
+    Args:
+        scripts (iterable): The (name, lines) of the scripts, like `loadScripts` gives them.
+        mapPaths (list): The paths of the map files, the map of each script is found with `mapsByName`.
+        workers (int, optional): The number of processes. Defaults to the number of cores.
+        chunkSize (int, optional): The number of scripts sent to a worker at once. Defaults to 64.
+        planOptions (tuple, optional): If given, the (withinBudget, router, solver, cache directory) the scripts were
+            planned with : each map is planned again (or read from the cache) to measure the `pathDrift` of its script.
+            Defaults to no drift.
+
+    Yields:
+        dict: The result of a script : its name, its map, and its points, time, fuel, mass, collected cylinders, whether the
+        robot ran out of time or fuel and where (`stopPosition`), its `maxDrift` and `endDrift` if they are measured,
+        or an 'error' if the script can't be replayed.
+    """
+    tasks, missing = [], []
+    byName = mapsByName(mapPaths)
+    for name, movements in scripts:
+        mapPath = mapOfScript(name, byName)
+        (tasks if mapPath is not None else missing).append((name, movements, mapPath, planOptions))
+    for name, _, _, _ in missing:
+        yield {'script': name, 'map': None, 'error': "No map found for this script"}
+    with cf.ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_replayTask, tasks, chunksize=chunkSize)
+
+
+def main(argv=None, prog=None):
+    """
+    Replays the scripts given on the command line (see `python scripts/replay.py --help`).
+    Exits with 1 if a script can't be replayed, or if it drifts more than the maximum drift from its planned path.
+
+    Args:
+        argv (list, optional): The arguments. Defaults to the arguments of the program.
+        prog (str, optional): The name of the program in the help. Defaults to the name of the script.
+    """
+    import batch
+    parser = argparse.ArgumentParser(prog=prog, description="Replay movement scripts on their maps and report what the robot collects.")
+    parser.add_argument('scripts', help="A directory of script-*.txt files, or a .zip or JSON lines archive of scripts.")
+    parser.add_argument('--maps', default=os.path.join('examples', 'maps-eval'), help="A glob pattern or a directory of map files. Defaults to the evaluation maps.")
+    parser.add_argument('--workers', type=int, default=None, help="The number of processes.")
+    parser.add_argument('--records', default=None, help="A JSON lines file where the result of each script is saved.")
+    parser.add_argument('--drift', action='store_true', help="Plan each map again (with the options below) and measure how far its script drifts from the path.")
+    parser.add_argument('--max-drift', type=float, default=MAX_DRIFT, help=f"The drift (m) above which a script fails the check. Defaults to {MAX_DRIFT}.")
+    parser.add_argument('--router', choices=ps.ROUTERS, default='midpoint', help="The router the scripts were planned with.")
+    parser.add_argument('--solver', choices=pipeline.SOLVERS, default='heuristic', help="The solver the scripts were planned with.")
+    parser.add_argument('--whole-tour', action='store_true', help="The scripts were planned with all the cylinders.")
+    parser.add_argument('--cache', default=None, help="The directory of the plan cache the scripts were planned with, to read their paths.")
+    arguments = parser.parse_args(argv)
+    planOptions = (not arguments.whole_tour, arguments.router, arguments.solver, arguments.cache) if arguments.drift else None
+    points, errors, drifting = [], 0, 0
+    recordsFile = open(arguments.records, 'w') if arguments.records is not None else None
+    try:
+        for result in replayMany(loadScripts(arguments.scripts), batch.findMaps(arguments.maps), arguments.workers, planOptions=planOptions):
+            if recordsFile is not None:
+                recordsFile.write(json.dumps(result) + '\n')
+            if 'error' in result:
+                errors += 1
+                print(f"{result['script']}: /!\\ {result['error']}")
+                continue
+            points.append(result['points'])
+            stop = f", ran out at ({result['stopPosition'][0]:.2f}, {result['stopPosition'][1]:.2f})" if result['ranOut'] else ''
+            drift = f", drift {result['maxDrift']:.3f} m (end {result['endDrift']:.3f} m)" if 'maxDrift' in result else ''
+            print(f"{result['script']}: {result['points']} points, {result['time']:.1f} s, {result['fuel']:.1f} l{stop}{drift}")
+            if max(result.get('maxDrift', 0), result.get('endDrift', 0)) > arguments.max_drift:
+                drifting += 1
+                print(f"{result['script']}: /!\\ drifts more than {arguments.max_drift} m from its planned path")
+    finally:
+        if recordsFile is not None:
+            recordsFile.close()
+    if points:
+        print(f"Average points: {sum(points) / len(points)}")
+    sys.exit(1 if errors or drifting else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Fast scoring of a path : the points collected before the robot runs out of time or fuel."""
+import math
+import numpy as np
+import instrumentation as instr
+import simulation as sim
+from simulation import Robot, CylinderSet
+from pathsearch import TOO_CLOSE_CYLINDER
+from spatialindex import CylinderGrid
+
+# Number of cylinders from which a spatial index is used to find the cylinders touched by a segment
+GRID_MIN_CYLINDERS = 64
+
+
+class PathScore:
+    """
+    The result of following a path.
+    Attributes:
+        points (float): The value of the collected cylinders.
+        time (float): The time used (s), until the end of the path or until the robot ran out of time or fuel.
+        fuel (float): The fuel used (l).
+        mass (float): The mass carried at the end.
+        collected (list): The id of the collected cylinders, in the order they were collected.
+        truncationIndex (int): The index of the point of the path from which the robot ran out of time or fuel (`None` if it never did).
+        stopPosition (tuple): The (x, y) position where the robot ran out of time or fuel (`None` if it never did).
+    """
+
+    def __init__(self, points, time, fuel, mass, collected, truncationIndex, stopPosition=None):
+        self.points = points
+        self.time = time
+        self.fuel = fuel
+        self.mass = mass
+        self.collected = collected
+        self.truncationIndex = truncationIndex
+        self.stopPosition = stopPosition
+
+    def __repr__(self):
+        return f"PathScore(points={self.points}, time={self.time:.2f}, fuel={self.fuel:.2f}, collected={len(self.collected)}, truncationIndex={self.truncationIndex})"
+
+
+def _contacts(xs, ys, candidatesId, beginPosition, endPosition, radius):
+    """
+    Returns the cylinders touched by a segment, with the distance along the segment at which they are first touched.
+    """
+    (bx, by), (ex, ey) = beginPosition, endPosition
+    length = math.hypot(ex - bx, ey - by)
+    cx, cy = xs[candidatesId] - bx, ys[candidatesId] - by
+    if length == 0:
+        touching = cx ** 2 + cy ** 2 < radius ** 2
+        return candidatesId[touching], np.zeros(int(touching.sum()))
+    ux, uy = (ex - bx) / length, (ey - by) / length
+    # Distance along the segment of the closest point of the line, and distance to the line
+    along = cx * ux + cy * uy
+    squaredAcross = cx ** 2 + cy ** 2 - along ** 2
+    halfChord = np.sqrt(np.maximum(radius ** 2 - squaredAcross, 0))
+    # The disk of the cylinder is entered at along - halfChord, and left at along + halfChord
+    touching = (squaredAcross < radius ** 2) & (along - halfChord < length) & (along + halfChord > 0)
+    return candidatesId[touching], np.maximum(along[touching] - halfChord[touching], 0)
+
+
+def followPath(path, cylinders, radius=TOO_CLOSE_CYLINDER, maxTime=sim.totalTime, maxFuel=Robot.initialFuelQuantity, grid=None):
+    """
+    Follows a path and collects the cylinders it touches, until the robot runs out of time or fuel.
+    Each segment is tested once against the cylinders near it, a cylinder is collected when the robot first comes within
+    its radius (even between two points of the path) and it is only collected once. Its mass is carried from that point on.
+
+    Args:
+        path (iterable): The (x, y) points of the path, it can be a generator.
+        cylinders (list): A list of cylinder objects or a `CylinderSet`.
+        radius (float, optional): The distance under which a cylinder is collected. Defaults to the distance at which the planner
+            considers a cylinder collected (`pathsearch.TOO_CLOSE_CYLINDER`).
+        maxTime (float, optional): The time budget (s). Defaults to the simulation time.
+        maxFuel (float, optional): The fuel budget (l). Defaults to the initial fuel of the robot.
+        grid (CylinderGrid, optional): A spatial index of the cylinders, built for big maps if not given.
+
+    Yields:
+        tuple: For each segment, its index, the id of the cylinders collected on it, and the time, fuel, mass and points after it,
+        whether the robot ran out of time or fuel on it (it is then the last one) and the (x, y) position of the robot after it.
+    """
+    cylinders = CylinderSet.of(cylinders)
+    if grid is None and len(cylinders) >= GRID_MIN_CYLINDERS:
+        grid = CylinderGrid(cylinders, cellSize=2 * radius)
+    allCylindersId = np.arange(len(cylinders))
+    isCollected = np.zeros(len(cylinders), dtype=bool)
+    points, time, fuel, mass = 0, 0, 0, 0
+    pathIterator = iter(path)
+    beginPosition = next(pathIterator, None)
+    for segmentIndex, endPosition in enumerate(pathIterator):
+        candidatesId = allCylindersId if grid is None else np.array(grid.nearSegment(beginPosition, endPosition, radius), dtype=np.intp)
+        candidatesId = candidatesId[~isCollected[candidatesId]]
+        touchedId, entries = _contacts(cylinders.x, cylinders.y, candidatesId, beginPosition, endPosition, radius)
+        # The segment is followed piece by piece, between the points where cylinders are collected
+        collectedOnSegment, travelled = [], 0
+        for entryIndex in np.argsort(entries, kind='stable').tolist() + [None]:
+            pieceEnd = math.hypot(endPosition[0] - beginPosition[0], endPosition[1] - beginPosition[1]) if entryIndex is None else float(entries[entryIndex])
+            pieceTime, pieceFuel = Robot.timeCost(pieceEnd - travelled, mass), Robot.fuelCost(pieceEnd - travelled, mass)
+            if time + pieceTime > maxTime or fuel + pieceFuel > maxFuel:
+                # We stop where the time or the fuel runs out
+                part = min((maxTime - time) / pieceTime if pieceTime > 0 else 1, (maxFuel - fuel) / pieceFuel if pieceFuel > 0 else 1)
+                segmentLength = math.hypot(endPosition[0] - beginPosition[0], endPosition[1] - beginPosition[1])
+                stop = (travelled + part * (pieceEnd - travelled)) / segmentLength if segmentLength > 0 else 0
+                stopPosition = (beginPosition[0] + stop * (endPosition[0] - beginPosition[0]), beginPosition[1] + stop * (endPosition[1] - beginPosition[1]))
+                yield segmentIndex, collectedOnSegment, time + part * pieceTime, fuel + part * pieceFuel, mass, points, True, stopPosition
+                return
+            time, fuel, travelled = time + pieceTime, fuel + pieceFuel, pieceEnd
+            if entryIndex is not None:
+                cylinderId = int(touchedId[entryIndex])
+                isCollected[cylinderId] = True
+                collectedOnSegment.append(cylinderId)
+                points += cylinders.values[cylinderId]
+                mass += cylinders.masses[cylinderId]
+        yield segmentIndex, collectedOnSegment, time, fuel, mass, points, False, endPosition
+        beginPosition = endPosition
+
+
+def scorePath(path, cylinders, radius=TOO_CLOSE_CYLINDER, maxTime=sim.totalTime, maxFuel=Robot.initialFuelQuantity, grid=None):
+    """
+    Returns the points collected by following a path, until the robot runs out of time or fuel (see `followPath`).
+
+    Args:
+        path (iterable): The (x, y) points of the path, it can be a generator.
+        cylinders (list): A list of cylinder objects or a `CylinderSet`.
+        radius (float, optional): The distance under which a cylinder is collected. Defaults to the distance at which the planner
+            considers a cylinder collected (`pathsearch.TOO_CLOSE_CYLINDER`).
+        maxTime (float, optional): The time budget (s). Defaults to the simulation time.
+        maxFuel (float, optional): The fuel budget (l). Defaults to the initial fuel of the robot.
+        grid (CylinderGrid, optional): A spatial index of the cylinders, built for big maps if not given.
+
+    Returns:
+        PathScore: The points, time, fuel, collected cylinders, truncation index and stop position.
+    """
+    points, time, fuel, mass, collected, truncationIndex, stopPosition = 0, 0, 0, 0, [], None, None
+    with instr.stage('scoring'):
+        for segmentIndex, collectedOnSegment, time, fuel, mass, points, ranOut, position in followPath(path, cylinders, radius, maxTime, maxFuel, grid):
+            collected += collectedOnSegment
+            if ranOut:
+                truncationIndex, stopPosition = segmentIndex, position
+                break
+    return PathScore(points, time, fuel, mass, collected, truncationIndex, stopPosition)
@@ -1,5 +1,7 @@
 """File that contains the simulation parameters and some helpful functions to calculate some states during simulation."""
+import contextlib
 import math
+import numpy as np
 
 
 totalTime = 600# s
@@ -30,7 +32,7 @@ class Robot:
 
         This function uses an exponential decay formula to determine the speed of the robot
         given its mass. The speed is calculated using the initial speed (V0) and a decay 
-        constant (alpha) from the Robot's speed parameters.
+        constant (alpha) from the Robot's speed parameters (the ones of `Robot.costModel`, that caches it).
 
         Args:
             mass (float): The mass of the robot.
@@ -38,13 +40,14 @@ class Robot:
         Returns:
             float: The calculated speed of the robot.
         """
-        return Robot.speedParams['V0'] * math.exp(-Robot.speedParams['alpha'] * mass)
+        return Robot.costModel.speed(mass)
 
     def consumption(mass):
         """
         Calculate the consumption based on the given mass.
         
-        This function calculates the consumption based on the mass of the robot using a linear formula.
+        This function calculates the consumption based on the mass of the robot using a linear formula
+        (with the parameters of `Robot.costModel`, that caches it).
 
         Args:
             mass (float): The mass for which to calculate the consumption.
@@ -52,7 +55,7 @@ class Robot:
         Returns:
             float: The calculated consumption based on the mass.
         """
-        return Robot.comsumptionParams['b'] * mass + Robot.comsumptionParams['b0']
+        return Robot.costModel.consumption(mass)
 
 
     def fuelCost(distance, mass):
@@ -66,7 +69,7 @@ class Robot:
         Returns:
             float: The fuel required for the robot to travel the given distance.
         """
-        return Robot.consumption(mass) * distance
+        return Robot.costModel.fuelCost(distance, mass)
 
     def timeCost(distance, mass):
         """
@@ -79,7 +82,136 @@ class Robot:
         Returns:
             float: The time required for the robot to travel the given distance.
         """
-        return distance / Robot.speed(mass)
+        return Robot.costModel.timeCost(distance, mass)
+
+
+
+class CostModel:
+    """
+    The speed and the consumption of the robot for a set of parameters, cached for each mass : the mass of the robot
+    only takes a few values (the sums of the masses of the categories), so `math.exp` is only called once for each.
+    The functions accept numbers, or numpy arrays of distances and masses to cost whole routes or many candidates in one call.
+
+    `Robot.costModel` is the model used by the planner, another one can be used for a while to see what changes with
+    other parameters :
+
+        with Robot.costModel.replace(b0=80).use():
+            pipeline.planMap(cylinders)
+
+    Attributes:
+        comsumptionParams (dict): The parameters 'b' (l/m.kg) and 'b0' (l/m) of the consumption.
+        speedParams (dict): The parameters 'alpha' and 'V0' (m/s) of the speed.
+    """
+
+    def __init__(self, comsumptionParams, speedParams):
+        """
+        Initializes a model with its parameters.
+
+        Args:
+            comsumptionParams (dict): The parameters 'b' and 'b0' of the consumption.
+            speedParams (dict): The parameters 'alpha' and 'V0' of the speed.
+        """
+        self.comsumptionParams = dict(comsumptionParams)
+        self.speedParams = dict(speedParams)
+        self._speeds = {}
+        self._consumptions = {}
+
+    def replace(self, **params):
+        """
+        Returns a model with some parameters changed (any of 'b', 'b0', 'alpha' and 'V0').
+
+        Raises:
+            ValueError: If a parameter is unknown.
+        """
+        comsumptionParams, speedParams = dict(self.comsumptionParams), dict(self.speedParams)
+        for name, value in params.items():
+            if name in comsumptionParams:
+                comsumptionParams[name] = value
+            elif name in speedParams:
+                speedParams[name] = value
+            else:
+                raise ValueError(f"Unknown parameter '{name}', it must be one of {list(comsumptionParams) + list(speedParams)}")
+        return CostModel(comsumptionParams, speedParams)
+
+    @contextlib.contextmanager
+    def use(self):
+        """
+        Makes this model the one of `Robot` in a with statement, the previous one is given back at the end.
+        """
+        previousModel = Robot.costModel
+        Robot.costModel = self
+        try:
+            yield self
+        finally:
+            Robot.costModel = previousModel
+
+    def _elementWise(self, function, mass):
+        """
+        Applies a function of the mass to each element of an array, calling it only once for each different mass.
+        """
+        masses, inverse = np.unique(np.asarray(mass, dtype=float), return_inverse=True)
+        return np.array([function(m) for m in masses.tolist()])[inverse].reshape(np.shape(mass))
+
+    def speed(self, mass):
+        """
+        Returns the speed (m/s) of the robot with a mass (a number or an array).
+        """
+        # An array can't be a key of the table
+        try:
+            return self._speeds[mass]
+        except KeyError:
+            speed = self._speeds[mass] = self.speedParams['V0'] * math.exp(-self.speedParams['alpha'] * mass)
+            return speed
+        except TypeError:
+            return self._elementWise(self.speed, mass)
+
+    def consumption(self, mass):
+        """
+        Returns the consumption (l/m) of the robot with a mass (a number or an array).
+        """
+        try:
+            return self._consumptions[mass]
+        except KeyError:
+            consumption = self._consumptions[mass] = self.comsumptionParams['b'] * mass + self.comsumptionParams['b0']
+            return consumption
+        except TypeError:
+            return self._elementWise(self.consumption, mass)
+
+    def fuelCost(self, distance, mass):
+        """
+        Returns the fuel (l) used to travel a distance with a mass (numbers or arrays that can be broadcast together).
+        """
+        try:
+            return self._consumptions[mass] * distance
+        except (KeyError, TypeError):
+            return self.consumption(mass) * distance
+
+    def timeCost(self, distance, mass):
+        """
+        Returns the time (s) taken to travel a distance with a mass (numbers or arrays that can be broadcast together).
+        """
+        try:
+            return distance / self._speeds[mass]
+        except (KeyError, TypeError):
+            return distance / self.speed(mass)
+
+    def routeUsage(self, lengths, masses):
+        """
+        Returns the time and the fuel used by a route.
+
+        Args:
+            lengths (array-like): The length of each leg of the route.
+            masses (array-like): The mass carried on each leg.
+
+        Returns:
+            tuple: The time (s) and the fuel (l) used.
+        """
+        lengths, masses = np.asarray(lengths, dtype=float), np.asarray(masses, dtype=float)
+        return float(self.timeCost(lengths, masses).sum()), float(self.fuelCost(lengths, masses).sum())
+
+
+# The model of the robot, with its parameters
+Robot.costModel = CostModel(Robot.comsumptionParams, Robot.speedParams)
 
 
 
@@ -158,3 +290,127 @@ class Cylinder:
             float: The value of the cylinder.
         """
         return Cylinder.categories[self.cat]['value']
+
+
+
+class CylinderSet:
+    """
+    A map of cylinders stored as contiguous arrays instead of a list of objects.
+    It can be used like a list of `Cylinder` : indexing it gives a lightweight view of a cylinder.
+    Attributes:
+        x (numpy.ndarray): The x coordinates of the cylinders.
+        y (numpy.ndarray): The y coordinates of the cylinders.
+        cat (numpy.ndarray): The categories of the cylinders.
+        mass (numpy.ndarray): The masses of the cylinders.
+        value (numpy.ndarray): The values of the cylinders.
+        positions (list): The (x, y) tuples of the cylinders, to be used in python loops.
+        masses (list): The masses of the cylinders, to be used in python loops.
+        values (list): The values of the cylinders, to be used in python loops.
+    Methods:
+        fromArray(array):
+            Creates a set from an array with one (x, y, cat) row per cylinder.
+        of(cylinders):
+            Returns the given cylinders as a set.
+    """
+
+    def __init__(self, x, y, cat):
+        """
+        Initializes a new set of cylinders.
+
+        Args:
+            x (array-like): The x coordinates.
+            y (array-like): The y coordinates.
+            cat (array-like): The categories.
+        """
+        self.x = np.ascontiguousarray(x, dtype=float)
+        self.y = np.ascontiguousarray(y, dtype=float)
+        self.cat = np.ascontiguousarray(cat, dtype=int)
+        # The mass and value of each cylinder are taken once from its category
+        massOfCategory = {cat: category['mass'] for cat, category in Cylinder.categories.items()}
+        valueOfCategory = {cat: category['value'] for cat, category in Cylinder.categories.items()}
+        self.masses = [massOfCategory[cat] for cat in self.cat.tolist()]
+        self.values = [valueOfCategory[cat] for cat in self.cat.tolist()]
+        self.mass = np.array(self.masses, dtype=float)
+        self.value = np.array(self.values, dtype=float)
+        self.positions = list(zip(self.x.tolist(), self.y.tolist()))
+        self._views = [CylinderView(self, cylinderId) for cylinderId in range(len(self.positions))]
+
+    @classmethod
+    def fromArray(cls, array):
+        """
+        Creates a set from an array with one (x, y, cat) row per cylinder.
+        """
+        array = np.asarray(array).reshape(-1, 3)
+        return cls(array[:, 0], array[:, 1], array[:, 2])
+
+    @classmethod
+    def of(cls, cylinders):
+        """
+        Returns the given cylinders as a set (the same object if it already is one).
+
+        Args:
+            cylinders (list): A list of cylinder objects or a cylinder set.
+
+        Returns:
+            CylinderSet: The cylinders as a set.
+        """
+        if isinstance(cylinders, cls):
+            return cylinders
+        return cls([cylinder.x for cylinder in cylinders], [cylinder.y for cylinder in cylinders], [cylinder.cat for cylinder in cylinders])
+
+    def __len__(self):
+        return len(self._views)
+
+    def __getitem__(self, cylinderId):
+        return self._views[cylinderId]
+
+    def __iter__(self):
+        return iter(self._views)
+
+    def __getstate__(self):
+        # Only the arrays are sent when pickled, the rest is rebuilt
+        return {'x': self.x, 'y': self.y, 'cat': self.cat}
+
+    def __setstate__(self, state):
+        self.__init__(state['x'], state['y'], state['cat'])
+
+
+class CylinderView:
+    """
+    A lightweight view of one cylinder of a `CylinderSet`, with the same methods as `Cylinder`.
+    """
+    __slots__ = ('cylinderSet', 'id')
+
+    def __init__(self, cylinderSet, cylinderId):
+        self.cylinderSet = cylinderSet
+        self.id = cylinderId
+
+    @property
+    def x(self):
+        return self.cylinderSet.positions[self.id][0]
+
+    @property
+    def y(self):
+        return self.cylinderSet.positions[self.id][1]
+
+    @property
+    def cat(self):
+        return int(self.cylinderSet.cat[self.id])
+
+    def getPosition(self):
+        """
+        Get the current position of the cylinder (without creating a new tuple).
+        """
+        return self.cylinderSet.positions[self.id]
+
+    def getMass(self):
+        """
+        Retrieve the mass of the cylinder.
+        """
+        return self.cylinderSet.masses[self.id]
+
+    def getValue(self):
+        """
+        Retrieves the value of the cylinder.
+        """
+        return self.cylinderSet.values[self.id]
@@ -0,0 +1,81 @@
+"""Spatial index over the cylinders of a map, to only look at the cylinders that are near a segment."""
+import math
+
+
+class CylinderGrid:
+    """
+    A uniform grid over the positions of the cylinders.
+    Each cell of the grid keeps the id of the cylinders whose center is inside it, so that the cylinders
+    near a point or a segment can be found without looking at every cylinder of the map.
+
+    Attributes:
+        cellSize (float): The size of the side of a cell.
+        cells (dict): A dictionary that gives the list of cylinder ids for each (column, row) of the grid.
+    """
+
+    def __init__(self, cylinders, cellSize=3.5):
+        """
+        Builds the grid for a list of cylinders.
+
+        Args:
+            cylinders (list): A list of cylinder objects.
+            cellSize (float, optional): The size of the side of a cell. Defaults to 3.5.
+        """
+        self.cellSize = cellSize
+        self.cells = {}
+        for cylinderId in range(len(cylinders)):
+            x, y = cylinders[cylinderId].getPosition()
+            self.cells.setdefault(self.cellOf(x, y), []).append(cylinderId)
+
+    def cellOf(self, x, y):
+        """
+        Returns the (column, row) of the cell that contains a point.
+        """
+        return (math.floor(x / self.cellSize), math.floor(y / self.cellSize))
+
+    def nearPoint(self, position, radius):
+        """
+        Returns the id of the cylinders that may be within a distance of a point.
+        The result may contain cylinders a bit further, but never misses one that is within the distance.
+
+        Args:
+            position (tuple): The (x, y) point.
+            radius (float): The distance from the point.
+
+        Returns:
+            list: The sorted id of the cylinders.
+        """
+        return self.nearSegment(position, position, radius)
+
+    def nearSegment(self, beginPosition, endPosition, radius):
+        """
+        Returns the id of the cylinders that may be within a distance of a segment (its swept capsule).
+        The result may contain cylinders a bit further, but never misses one that is within the distance.
+
+        Args:
+            beginPosition (tuple): The (x, y) start of the segment.
+            endPosition (tuple): The (x, y) end of the segment.
+            radius (float): The distance from the segment.
+
+        Returns:
+            list: The sorted id of the cylinders, so that they come in the same order as in the map.
+        """
+        # For each row of the grid around the segment, we take the part of the segment that is near the row
+        # and the columns that are near this part (this covers a box around the capsule)
+        (bx, by), (ex, ey) = beginPosition, endPosition
+        cylindersId = []
+        firstRow, lastRow = math.floor((min(by, ey) - radius) / self.cellSize), math.floor((max(by, ey) + radius) / self.cellSize)
+        for row in range(firstRow, lastRow + 1):
+            lowY, highY = row * self.cellSize - radius, (row + 1) * self.cellSize + radius
+            # Parameters of the segment (between 0 and 1) that are within the row
+            if ey == by:
+                t0, t1 = 0, 1
+            else:
+                t0, t1 = sorted(((lowY - by) / (ey - by), (highY - by) / (ey - by)))
+                t0, t1 = max(t0, 0), min(t1, 1)
+                if t0 > t1:
+                    continue
+            x0, x1 = sorted((bx + (ex - bx) * t0, bx + (ex - bx) * t1))
+            for column in range(math.floor((x0 - radius) / self.cellSize), math.floor((x1 + radius) / self.cellSize) + 1):
+                cylindersId += self.cells.get((column, row), [])
+        return sorted(cylindersId)
@@ -0,0 +1,106 @@
+"""Evaluation of many sets of planner weights on the same maps, in parallel."""
+import concurrent.futures as cf
+import contextlib
+import random
+import instrumentation as instr
+import pathsearch as ps
+import pipeline
+import scoring
+
+
+def averagePoints(maps, config=None, distancesOfMaps=None, withinBudget=False):
+    """
+    Plans every map with some weights and returns the average points.
+
+    Args:
+        maps (list): The cylinders of each map.
+        config (PlannerConfig, optional): The weights to use. Defaults to the module globals of `pathsearch`.
+        distancesOfMaps (list, optional): The distance matrix of each map, to reuse the avoidance paths between calls.
+        withinBudget (bool, optional): Whether to only plan the cylinders that can be collected. Defaults to False.
+
+    Returns:
+        float: The average points estimated for the given maps.
+    """
+    points = []
+    for mapIndex, cylinders in enumerate(maps):
+        distances = distancesOfMaps[mapIndex] if distancesOfMaps is not None else None
+        _, path = pipeline.planMap(cylinders, (0, 0), withinBudget, distances, config)
+        points.append(scoring.scorePath(path, cylinders).points)
+    return sum(points) / len(points)
+
+
+def randomConfigs(count, minMaxTime=(0, 1), minMaxValue=(0, 1), seed=None):
+    """
+    Returns random weights, the fuel importance being what is left of the time importance.
+
+    Args:
+        count (int): The number of configurations.
+        minMaxTime (tuple, optional): The minimum and maximum time importance. Defaults to (0, 1).
+        minMaxValue (tuple, optional): The minimum and maximum value importance. Defaults to (0, 1).
+        seed (int, optional): The seed of the random generator. Defaults to a random seed.
+
+    Returns:
+        list: The `PlannerConfig` objects.
+    """
+    generator = random.Random(seed)
+    configs = []
+    for _ in range(count):
+        timeImportance = generator.uniform(minMaxTime[0], minMaxTime[1])
+        configs.append(ps.PlannerConfig(1 - timeImportance, timeImportance, generator.uniform(minMaxValue[0], minMaxValue[1])))
+    return configs
+
+
+# The maps of a worker and their distance matrices, set once by `_initWorker`
+_worker = {}
+
+
+def _initWorker(maps, withinBudget, maxPaths, instrument=False):
+    """
+    Gives the maps to a worker once, and builds their distance matrices that are kept for all the weights it evaluates.
+    """
+    _worker['maps'] = maps
+    _worker['distances'] = [ps.AvoidanceDistances(cylinders, (0, 0), maxPaths=maxPaths) for cylinders in maps]
+    _worker['withinBudget'] = withinBudget
+    _worker['instrument'] = instrument
+
+
+def _evaluateBatch(configs):
+    """
+    Evaluates a batch of weights on the maps of the worker. An exception is returned instead of the average if one is raised.
+    With the instrumentation, the measures of each set of weights are added to its result.
+    """
+    results = []
+    for config in configs:
+        with instr.recording() if _worker['instrument'] else contextlib.nullcontext() as measures:
+            try:
+                result = averagePoints(_worker['maps'], config, _worker['distances'], _worker['withinBudget'])
+            except Exception as exc:
+                result = exc
+        results.append((config, result, measures) if _worker['instrument'] else (config, result))
+    return results
+
+
+def sweep(maps, configs, batchSize=25, workers=None, withinBudget=False, maxPaths=200000, instrument=False):
+    """
+    Evaluates many sets of weights on the same maps and yields the results as soon as they are finished.
+    The maps are sent once to each worker, which keeps their avoidance paths (they don't depend on the weights)
+    from one set of weights to the next. Each task is a batch of sets of weights.
+
+    Args:
+        maps (list): The cylinders of each map.
+        configs (list): The `PlannerConfig` objects to evaluate.
+        batchSize (int, optional): The number of sets of weights in a task. Defaults to 25.
+        workers (int, optional): The number of processes. Defaults to the number of cores.
+        withinBudget (bool, optional): Whether to only plan the cylinders that can be collected. Defaults to False.
+        maxPaths (int, optional): The number of avoidance paths kept for each map in a worker. Defaults to 200000.
+        instrument (bool, optional): Whether to measure the counters and timers of each set of weights. Defaults to False.
+
+    Yields:
+        tuple: A `PlannerConfig` and the average points on the maps (or the exception raised while evaluating it),
+        and the measures (see `instrumentation.record`) if they are asked.
+    """
+    configs = list(configs)
+    with cf.ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(maps, withinBudget, maxPaths, instrument)) as executor:
+        futures = [executor.submit(_evaluateBatch, configs[first:first + batchSize]) for first in range(0, len(configs), batchSize)]
+        for completedFuture in cf.as_completed(futures):
+            yield from completedFuture.result()
@@ -0,0 +1,211 @@
+"""Adaptive search of the best planner weights (CMA-ES with successive halving on the maps), instead of pure random search."""
+import argparse
+import json
+import math
+import os
+import numpy as np
+import pathsearch as ps
+from __opti__ import getAverageOnMaps, loadEvalMaps
+
+
+class CMAES:
+    """
+    A small CMA-ES (covariance matrix adaptation evolution strategy) that maximizes a function.
+    Only the ranks of the candidates are used, so the fitness can be anything that can be sorted.
+
+    Attributes:
+        mean (numpy.ndarray): The center of the search distribution.
+        sigma (float): The step size.
+        covariance (numpy.ndarray): The covariance matrix of the search distribution.
+        populationSize (int): The number of candidates of each generation.
+    """
+
+    def __init__(self, mean, sigma, populationSize=None, seed=None):
+        """
+        Initializes the search around a point.
+
+        Args:
+            mean (list): The starting point.
+            sigma (float): The starting step size.
+            populationSize (int, optional): The number of candidates of each generation. Defaults to 4 + 3 ln(n).
+            seed (int, optional): The seed of the random generator.
+        """
+        self.mean = np.array(mean, dtype=float)
+        dimension = len(self.mean)
+        self.sigma = sigma
+        self.covariance = np.eye(dimension)
+        self.pathSigma = np.zeros(dimension)
+        self.pathCovariance = np.zeros(dimension)
+        self.populationSize = populationSize or 4 + int(3 * math.log(dimension))
+        self.generator = np.random.default_rng(seed)
+        # Weights of the best half of the candidates and learning rates
+        parentCount = self.populationSize // 2
+        weights = np.log(parentCount + 0.5) - np.log(np.arange(1, parentCount + 1))
+        self.weights = weights / weights.sum()
+        self.effectiveCount = 1 / (self.weights ** 2).sum()
+        n, mu = dimension, self.effectiveCount
+        self.cc = (4 + mu / n) / (n + 4 + 2 * mu / n)
+        self.cs = (mu + 2) / (n + mu + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + mu)
+        self.cmu = min(1 - self.c1, 2 * (mu - 2 + 1 / mu) / ((n + 2) ** 2 + mu))
+        self.damps = 1 + 2 * max(0, math.sqrt((mu - 1) / (n + 1)) - 1) + self.cs
+        self.chiN = math.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+        self.generation = 0
+
+    def ask(self):
+        """
+        Returns the candidates of the next generation.
+
+        Returns:
+            numpy.ndarray: An array with one candidate per row.
+        """
+        eigenValues, eigenVectors = np.linalg.eigh(self.covariance)
+        self._invSqrt = eigenVectors @ np.diag(1 / np.sqrt(np.maximum(eigenValues, 1e-20))) @ eigenVectors.T
+        steps = self.generator.standard_normal((self.populationSize, len(self.mean))) * np.sqrt(np.maximum(eigenValues, 0)) @ eigenVectors.T
+        return self.mean + self.sigma * steps
+
+    def tell(self, candidates, fitnesses):
+        """
+        Moves the search distribution towards the best candidates.
+
+        Args:
+            candidates (numpy.ndarray): The candidates given by `ask`.
+            fitnesses (list): The fitness of each candidate (the bigger the better).
+        """
+        n = len(self.mean)
+        ranking = sorted(range(len(candidates)), key=lambda index: fitnesses[index], reverse=True)[:len(self.weights)]
+        steps = (np.asarray(candidates)[ranking] - self.mean) / self.sigma
+        meanStep = self.weights @ steps
+        self.mean = self.mean + self.sigma * meanStep
+        # Evolution paths of the step size and of the covariance
+        self.pathSigma = (1 - self.cs) * self.pathSigma + math.sqrt(self.cs * (2 - self.cs) * self.effectiveCount) * self._invSqrt @ meanStep
+        self.generation += 1
+        hSigma = np.linalg.norm(self.pathSigma) / math.sqrt(1 - (1 - self.cs) ** (2 * self.generation)) / self.chiN < 1.4 + 2 / (n + 1)
+        self.pathCovariance = (1 - self.cc) * self.pathCovariance + hSigma * math.sqrt(self.cc * (2 - self.cc) * self.effectiveCount) * meanStep
+        rankMu = (steps.T * self.weights) @ steps
+        self.covariance = ((1 - self.c1 - self.cmu) * self.covariance
+                           + self.c1 * (np.outer(self.pathCovariance, self.pathCovariance) + (1 - hSigma) * self.cc * (2 - self.cc) * self.covariance)
+                           + self.cmu * rankMu)
+        self.sigma *= math.exp((self.cs / self.damps) * (np.linalg.norm(self.pathSigma) / self.chiN - 1))
+
+    def getState(self):
+        """
+        Returns the state of the search as a dictionary that can be saved in JSON.
+        """
+        return {
+            'mean': self.mean.tolist(),
+            'sigma': self.sigma,
+            'covariance': self.covariance.tolist(),
+            'pathSigma': self.pathSigma.tolist(),
+            'pathCovariance': self.pathCovariance.tolist(),
+            'generation': self.generation,
+            'generator': self.generator.bit_generator.state,
+        }
+
+    def setState(self, state):
+        """
+        Sets back a state given by `getState`.
+        """
+        self.mean = np.array(state['mean'])
+        self.sigma = state['sigma']
+        self.covariance = np.array(state['covariance'])
+        self.pathSigma = np.array(state['pathSigma'])
+        self.pathCovariance = np.array(state['pathCovariance'])
+        self.generation = state['generation']
+        self.generator.bit_generator.state = state['generator']
+
+
+def configOfCandidate(candidate):
+    """
+    Returns the planner weights of a candidate (time importance, value importance), clipped between 0 and 1.
+    The fuel importance is what is left of the time importance.
+    """
+    timeImportance, valueImportance = np.clip(candidate, 0, 1).tolist()
+    return ps.PlannerConfig(1 - timeImportance, timeImportance, valueImportance)
+
+
+def tune(maps, generations=30, populationSize=8, sigma=0.2, seed=None, rungs=(2, 5), keepFraction=0.5, patience=6,
+         checkpoint=None, log=False, objective=getAverageOnMaps):
+    """
+    Searches the best planner weights with CMA-ES. In each generation, the candidates are first evaluated on a few maps
+    (successive halving) and only the best ones are promoted to more maps, up to all of them.
+
+    Args:
+        maps (list): The cylinders of each map.
+        generations (int, optional): The maximum number of generations. Defaults to 30.
+        populationSize (int, optional): The number of candidates of each generation. Defaults to 8.
+        sigma (float, optional): The starting step size. Defaults to 0.2.
+        seed (int, optional): The seed of the random generator.
+        rungs (tuple, optional): The number of maps of each evaluation before the one on all the maps. Defaults to (2, 5).
+        keepFraction (float, optional): The part of the candidates promoted to the next rung. Defaults to 0.5.
+        patience (int, optional): The number of generations without a better result after which it stops. Defaults to 6.
+        checkpoint (str, optional): A JSON file where the search is saved after each generation, and resumed from if it exists.
+        log (bool, optional): Whether to print the progress. Defaults to False.
+        objective (function, optional): The function that gives the average points of weights on maps. Defaults to `getAverageOnMaps`.
+
+    Returns:
+        tuple: The best `PlannerConfig` (the starting one if no generation was done), its average points on all the maps
+        and the number of map plannings done.
+    """
+    startingConfig = ps.PlannerConfig()
+    search = CMAES([startingConfig.timeImportance, startingConfig.valueImportance], sigma, populationSize, seed)
+    best, bestAverage, evaluations, stalledGenerations = None, -math.inf, 0, 0
+    # We resume the search if it was saved
+    if checkpoint is not None and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            saved = json.load(f)
+        search.setState(saved['search'])
+        best, bestAverage = tuple(saved['best']) if saved['best'] is not None else None, saved['bestAverage']
+        evaluations, stalledGenerations = saved['evaluations'], saved['stalledGenerations']
+    # The distance matrices are reused by all the evaluations
+    distancesOfMaps = [ps.AvoidanceDistances(cylinders, (0, 0), maxPaths=200000) for cylinders in maps]
+    rungSizes = [size for size in rungs if size < len(maps)] + [len(maps)]
+    while search.generation < generations and stalledGenerations < patience:
+        candidates = search.ask()
+        # The fitness is the last rung reached, then the average points on it
+        fitnesses = [(0, -math.inf)] * len(candidates)
+        promoted = list(range(len(candidates)))
+        for rung, size in enumerate(rungSizes):
+            for index in promoted:
+                fitnesses[index] = (rung, objective(maps[:size], configOfCandidate(candidates[index]), distancesOfMaps[:size]))
+                evaluations += size
+            if rung < len(rungSizes) - 1:
+                promoted = sorted(promoted, key=lambda index: fitnesses[index], reverse=True)[:max(1, math.ceil(len(promoted) * keepFraction))]
+        search.tell(candidates, fitnesses)
+        # We keep the best candidate evaluated on all the maps
+        stalledGenerations += 1
+        for index in promoted:
+            if fitnesses[index][1] > bestAverage:
+                best, bestAverage, stalledGenerations = configOfCandidate(candidates[index]).asTuple(), fitnesses[index][1], 0
+        if log:
+            print(f"[{search.generation}/{generations}] Best parameters: {best}, Best average points: {bestAverage}, Map plannings: {evaluations}")
+        if checkpoint is not None:
+            with open(checkpoint, 'w') as f:
+                json.dump({'search': search.getState(), 'best': best, 'bestAverage': bestAverage,
+                           'evaluations': evaluations, 'stalledGenerations': stalledGenerations}, f)
+    # Without any generation, the weights stay the starting ones
+    if best is None:
+        best, bestAverage = startingConfig.asTuple(), objective(maps, startingConfig, distancesOfMaps)
+        evaluations += len(maps)
+    return ps.PlannerConfig(*best), bestAverage, evaluations
+
+
+def main(argv=None, prog=None):
+    """
+    Tunes the weights on the evaluation maps with the options given on the command line (see `python scripts/tuner.py --help`).
+
+    Args:
+        argv (list, optional): The arguments. Defaults to the arguments of the program.
+        prog (str, optional): The name of the program in the help. Defaults to the name of the script.
+    """
+    parser = argparse.ArgumentParser(prog=prog, description="Search the best planner weights with CMA-ES.")
+    parser.add_argument('--generations', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--checkpoint', default=None, help="A JSON file to save and resume the search.")
+    arguments = parser.parse_args(argv)
+    config, average, evaluations = tune(loadEvalMaps(), arguments.generations, seed=arguments.seed, checkpoint=arguments.checkpoint, log=True)
+    print(f"Best parameters: {config}, Best average points: {average} ({evaluations} map plannings)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Shortest paths around the cylinders, on a visibility graph of the corners of polygons drawn around them, searched with A*."""
+import heapq
+import math
+import numpy as np
+from collision import segmentBlockers
+
+# Number of sides of the polygon drawn around each cylinder
+POLYGON_SIDES = 8
+# Number of cylinders whose corners are added to a search, after which it gives up (the goal is likely walled in)
+MAX_OBSTACLES = 32
+
+
+class VisibilityRouter:
+    """
+    Finds the shortest path between two points that never comes too close to a cylinder.
+    Each cylinder is replaced by a regular polygon whose sides stay at the clearance distance from it, and A* searches
+    the graph of the polygon corners (the straight lines between the corners that see each other).
+
+    The roadmap is lazy : A* first assumes that every edge is free, then the edges of the path found are checked and
+    the corners of a cylinder are only added when it blocks one of them. The cylinders that block an edge or that cover
+    a corner are stored for the whole map, so that any set of excluded cylinders can be answered without testing them again.
+
+    Attributes:
+        coordinates (tuple): The x and y arrays of the cylinder coordinates.
+        tooCloseDistance (float): The distance under which a cylinder is in the way.
+        grid (CylinderGrid): A spatial index of the cylinders, or `None` to look at every cylinder.
+        corners (numpy.ndarray): The (x, y) corners of the polygon of each cylinder, of shape (n, sides, 2).
+    """
+
+    def __init__(self, coordinates, tooCloseDistance, clearance, grid=None, sides=POLYGON_SIDES, maxObstacles=MAX_OBSTACLES):
+        """
+        Builds the polygons around the cylinders.
+
+        Args:
+            coordinates (tuple): The x and y arrays of the cylinder coordinates.
+            tooCloseDistance (float): The distance under which a cylinder is in the way.
+            clearance (float): The distance between a cylinder and the sides of its polygon (bigger than the too close distance).
+            grid (CylinderGrid, optional): A spatial index of the cylinders. Defaults to looking at every cylinder.
+            sides (int, optional): The number of sides of the polygons. Defaults to 8.
+            maxObstacles (int, optional): The number of cylinders added to a search after which no path is returned. Defaults to 32.
+        """
+        self.coordinates = coordinates
+        self.tooCloseDistance = tooCloseDistance
+        self.grid = grid
+        self.maxObstacles = maxObstacles
+        # The corners are farther than the clearance so that the middle of the sides is at the clearance
+        cornerRadius = clearance / math.cos(math.pi / sides)
+        angles = 2 * math.pi * np.arange(sides) / sides
+        xs, ys = coordinates
+        self.corners = np.stack([xs[:, np.newaxis] + cornerRadius * np.cos(angles), ys[:, np.newaxis] + cornerRadius * np.sin(angles)], axis=-1)
+        self._allId = np.arange(len(xs))
+        self._edgeBlockers = {}
+        self._pointBlockers = {}
+
+    def _near(self, position, radius):
+        """
+        Returns the id of the cylinders that may be within a distance of a point.
+        """
+        return self._allId if self.grid is None else self.grid.nearPoint(position, radius)
+
+    def _blockersOfPoint(self, key, position):
+        """
+        Returns the cylinders that are too close to a point (cached by the key of the point : ('point', x, y) or ('corner', cylinder, index)).
+        """
+        blockers = self._pointBlockers.get(key)
+        if blockers is None:
+            blockers = self._pointBlockers[key] = frozenset(segmentBlockers(*self.coordinates, self._near(position, self.tooCloseDistance), position, position, self.tooCloseDistance))
+        return blockers
+
+    def _blockersOfEdge(self, keys, positions):
+        """
+        Returns the cylinders that are too close to a segment between two points (cached by the keys of the points).
+        """
+        edgeKey = keys if keys[0] <= keys[1] else (keys[1], keys[0])
+        blockers = self._edgeBlockers.get(edgeKey)
+        if blockers is None:
+            candidatesId = self._allId if self.grid is None else self.grid.nearSegment(positions[0], positions[1], self.tooCloseDistance)
+            blockers = self._edgeBlockers[edgeKey] = segmentBlockers(*self.coordinates, candidatesId, positions[0], positions[1], self.tooCloseDistance)
+        return blockers
+
+    def route(self, beginPosition, endPosition, excludedId=()):
+        """
+        Returns the shortest path between two points that stays away from the cylinders that are not excluded.
+        The cylinders that are already too close to one of the two points are not obstacles (they can't be avoided).
+
+        Args:
+            beginPosition (tuple): A tuple (x, y) representing the starting point of the path.
+            endPosition (tuple): A tuple (x, y) representing the ending point of the path.
+            excludedId (iterable, optional): The id of the cylinders that are not obstacles.
+
+        Returns:
+            list: The points (tuples) of the path, including the two given points, or `None` if no path was found
+            (there is none, or more than `maxObstacles` cylinders were in the way).
+        """
+        beginPosition, endPosition = (float(beginPosition[0]), float(beginPosition[1])), (float(endPosition[0]), float(endPosition[1]))
+        # The nodes are the two points, then the corners of the cylinders that block an edge
+        keys = [('point',) + beginPosition, ('point',) + endPosition]
+        positions = [beginPosition, endPosition]
+        excluded = set(excludedId) | self._blockersOfPoint(keys[0], beginPosition) | self._blockersOfPoint(keys[1], endPosition)
+        addedCylinders, costs, previous = set(), {}, {}
+        # A* where an edge is only checked when the node at its end is taken out of the queue
+        queue = [(math.dist(beginPosition, endPosition), 0, 0, None)]
+        while queue:
+            _, cost, node, fromNode = heapq.heappop(queue)
+            if node in costs:
+                continue
+            if fromNode is not None:
+                blockers = [cylinderId for cylinderId in self._blockersOfEdge((keys[fromNode], keys[node]), (positions[fromNode], positions[node]))
+                            if cylinderId not in excluded]
+                if blockers:
+                    if len(addedCylinders) >= self.maxObstacles:
+                        return None
+                    # The corners of the blocking cylinders become nodes (if no other cylinder is too close to them),
+                    # that can be reached from every node already taken out of the queue
+                    for newNode in self._addCorners(blockers, excluded, addedCylinders, keys, positions):
+                        for doneNode, doneCost in costs.items():
+                            newCost = doneCost + math.dist(positions[doneNode], positions[newNode])
+                            heapq.heappush(queue, (newCost + math.dist(positions[newNode], endPosition), newCost, newNode, doneNode))
+                    continue
+            costs[node], previous[node] = cost, fromNode
+            if node == 1:
+                path = []
+                while node is not None:
+                    path.append(positions[node])
+                    node = previous[node]
+                return path[::-1]
+            for neighbour, position in enumerate(positions):
+                if neighbour not in costs:
+                    newCost = cost + math.dist(positions[node], position)
+                    heapq.heappush(queue, (newCost + math.dist(position, endPosition), newCost, neighbour, node))
+        return None
+
+    def _addCorners(self, cylindersId, excluded, addedCylinders, keys, positions):
+        """
+        Adds the corners of cylinders to the nodes of a search (once for each cylinder), and returns the indices of the new nodes.
+        """
+        newNodes = []
+        for cylinderId in cylindersId:
+            if cylinderId in addedCylinders:
+                continue
+            addedCylinders.add(cylinderId)
+            for cornerIndex, corner in enumerate(self.corners[cylinderId].tolist()):
+                cornerKey = ('corner', cylinderId, cornerIndex)
+                if self._blockersOfPoint(cornerKey, corner).issubset(excluded):
+                    newNodes.append(len(positions))
+                    keys.append(cornerKey)
+                    positions.append(tuple(corner))
+        return newNodes
@@ -1,74 +1,96 @@
 """Script to handle the visualisation of the cylinder decision and dicided path with Matplotlib."""
+import numpy as np
+import matplotlib.colors as mcolors
 import matplotlib.pyplot as plt
-from pathsearch import distance, TOO_CLOSE_CYLINDER
+from matplotlib.animation import FFMpegWriter, FuncAnimation, PillowWriter
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import EllipseCollection
+from matplotlib.figure import Figure
 import simulation as sim
+import scoring
 
 
-def traceMap(ax, cylinders, initialPosition, visitedCylindersId = []):
+def _simulationFrames(cylinders, chosenPath):
     """
-    Plots a scatter plot of cylinders on a map using matplotlib.
-    Use the `show()` function to display the plot.
-
-    Args:
-        ax (matplotlib.axes.Axes): The axes on which to plot the cylinders.
-        cylinders (list): List of cylinder objects.
-        initialPosition (tuple): The initial position to be marked on the plot, given as (x, y).
-        visitedCylindersId (list, optional): List of cylinder IDs that have been visited. Defaults to an empty list.
-    """
-    # We plot all the cylinders
-    for cylinderId in range(len(cylinders)):
-        cylinder = cylinders[cylinderId]
-        color = 'red' if cylinder.cat == 1 else 'green' if cylinder.cat == 2 else 'blue'
-        ax.add_patch(plt.Circle((cylinder.x, cylinder.y), radius=sim.Cylinder.touchingRadius, color='gray', alpha=0.05 if cylinderId in visitedCylindersId else 0.2))
-        ax.add_patch(plt.Circle((cylinder.x, cylinder.y), radius=sim.Cylinder.radius, color=color, alpha=0.3 if cylinderId in visitedCylindersId else 1))
-    # We plot the initial position
-    plt.plot(initialPosition[0], initialPosition[1], marker='x', color='black', markersize=10)
-
-def tracePath(path, noMoreFuelPointId = None, noMoreTimePointId = None):
-    """
-    Plots the given path on a graph with a black dotted line and pauses briefly to visualize the drawing process.
-    Use the `show()` function to display the plot.
-
-    Parameters:
-    path (list of tuples): A list of (x, y) coordinates representing the path to be plotted.
+    Follows the path once and returns the state shown on each frame of the animation (frame `k` shows the path up to its point `k`).
+    A state is the number of collected cylinders, the remaining time and fuel, the mass and the points.
+    The cylinders collected are in the order they were collected, and the last index is the point from which the robot ran out of time or fuel.
     """
-    # We set a finish point when there are no more fuel or time
-    noMoreFuelPointId = noMoreFuelPointId if noMoreFuelPointId is not None else len(path)
-    noMoreTimePointId = noMoreTimePointId if noMoreTimePointId is not None else len(path)
-    finishPointId = min(noMoreFuelPointId, noMoreTimePointId)
-    # We plot the path in dark before the finish point and in gray after
-    plt.plot([p[0] for p in path[:finishPointId+1]], [p[1] for p in path[:finishPointId+1]], color='black', linestyle=':', linewidth=2)
-    plt.plot([p[0] for p in path[finishPointId:]], [p[1] for p in path[finishPointId:]], color='gray', linestyle=':', linewidth=2)
+    frames, collected, lastPointId = [(0, sim.totalTime, sim.Robot.initialFuelQuantity, 0, 0)], [], len(chosenPath)
+    for segmentIndex, collectedOnSegment, time, fuel, mass, points, ranOut, _ in scoring.followPath(chosenPath, cylinders):
+        collected += collectedOnSegment
+        frames.append((len(collected), sim.totalTime - time, sim.Robot.initialFuelQuantity - fuel, mass, points))
+        if ranOut:
+            lastPointId = segmentIndex
+    # After the robot ran out of time or fuel, nothing changes anymore
+    frames += [frames[-1]] * (len(chosenPath) - len(frames))
+    return frames, collected, lastPointId
 
 
-def displayStats(ax, remainingTime, remainingFuel, mass, points, massWithoutLimits, pointsWithoutLimits):
+def animateSimulation(fig, ax, cylinders, initialPosition, chosenPath, interval=300, blit=True):
     """
-    Display the remaining time, fuel, mass and points on the plot.
+    Animates the path being drawn and the cylinders being collected on the given figure.
+    The map is drawn once, and then only the path, the colors of the cylinders and the stats are updated on each frame.
 
     Args:
-        ax (matplotlib.axes.Axes): The axes on which to plot the text.
-        remainingTime (float): The remaining time.
-        remainingFuel (float): The remaining fuel.
-        mass (float): The mass of the robot.
-        points (float): The points collected.
+        fig (matplotlib.figure.Figure): The figure of the animation.
+        ax (matplotlib.axes.Axes): The axes on which to draw.
+        cylinders (list): A list of cylinder objects.
+        initialPosition (tuple): The initial position (x, y) of the starting point.
+        chosenPath (list): A list of points (tuples) representing the path to be visualized.
+        interval (int, optional): The delay between two frames (ms). Defaults to 300.
+        blit (bool, optional): Whether to only redraw the changed artists. Defaults to True.
+
+    Returns:
+        tuple: The `FuncAnimation` and the number of points collected at the end.
     """
-    ax.text(1.02, 0.95, f"Mass: {mass:.2f} kg", transform=ax.transAxes)
-    ax.text(1.02, 0.9, f"Points: {points}", transform=ax.transAxes)
-    ax.text(1.02, 0.85, f"Time: {remainingTime:.2f} s", transform=ax.transAxes, color='gray' if remainingTime < 0 else 'black')
-    ax.text(1.02, 0.8, f"Fuel: {remainingFuel:.2f} L", transform=ax.transAxes, color='gray' if remainingFuel < 0 else 'black')
-    if remainingTime < 0 or remainingFuel < 0:
-        ax.text(1.02, 0.75, f"Mass: {massWithoutLimits:.2f} kg", transform=ax.transAxes, color='gray')
-        ax.text(1.02, 0.7, f"Points: {pointsWithoutLimits}", transform=ax.transAxes, color='gray')
-    
-    
+    cylinders = sim.CylinderSet.of(cylinders)
+    frames, collected, lastPointId = _simulationFrames(cylinders, chosenPath)
+    pathX, pathY = np.array([p[0] for p in chosenPath]), np.array([p[1] for p in chosenPath])
+    # The static map : the limits and the initial position
+    ax.set_aspect('equal', adjustable='box')
+    allX, allY = np.concatenate([cylinders.x, pathX, [initialPosition[0]]]), np.concatenate([cylinders.y, pathY, [initialPosition[1]]])
+    margin = 2 * sim.Cylinder.touchingRadius
+    ax.set_xlim(allX.min() - margin, allX.max() + margin)
+    ax.set_ylim(allY.min() - margin, allY.max() + margin)
+    ax.plot(initialPosition[0], initialPosition[1], marker='x', color='black', markersize=10)
+    # The cylinders are two collections, only their colors change
+    offsets = np.column_stack([cylinders.x, cylinders.y])
+    touchingColors = np.tile(mcolors.to_rgba('gray', 0.2), (len(cylinders), 1))
+    bodyColors = np.array([mcolors.to_rgba('red' if cat == 1 else 'green' if cat == 2 else 'blue') for cat in cylinders.cat.tolist()]).reshape(-1, 4)
+    touchingCircles = EllipseCollection(2 * sim.Cylinder.touchingRadius, 2 * sim.Cylinder.touchingRadius, 0, units='xy', offsets=offsets, offset_transform=ax.transData, facecolors=touchingColors)
+    bodyCircles = EllipseCollection(2 * sim.Cylinder.radius, 2 * sim.Cylinder.radius, 0, units='xy', offsets=offsets, offset_transform=ax.transData, facecolors=bodyColors)
+    ax.add_collection(touchingCircles)
+    ax.add_collection(bodyCircles)
+    # The path in dark before the robot ran out of time or fuel and in gray after
+    donePath, = ax.plot([], [], color='black', linestyle=':', linewidth=2)
+    undonePath, = ax.plot([], [], color='gray', linestyle=':', linewidth=2)
+    stats = ax.text(0.02, 0.98, '', transform=ax.transAxes, verticalalignment='top', bbox=dict(facecolor='white', alpha=0.8))
+    collectedCylindersId = np.array(collected, dtype=np.intp)
+
+    def update(frame):
+        collectedCount, remainingTime, remainingFuel, mass, points = frames[frame]
+        visited = collectedCylindersId[:collectedCount]
+        touchingColors[:, 3], bodyColors[:, 3] = 0.2, 1
+        touchingColors[visited, 3], bodyColors[visited, 3] = 0.05, 0.3
+        touchingCircles.set_facecolor(touchingColors)
+        bodyCircles.set_facecolor(bodyColors)
+        finishPointId = min(frame, lastPointId)
+        donePath.set_data(pathX[:finishPointId + 1], pathY[:finishPointId + 1])
+        undonePath.set_data(pathX[finishPointId:frame + 1], pathY[finishPointId:frame + 1])
+        stats.set_text(f"Mass: {mass:.2f} kg\nPoints: {points}\nTime: {remainingTime:.2f} s\nFuel: {remainingFuel:.2f} L")
+        stats.set_color('gray' if frame > lastPointId else 'black')
+        return touchingCircles, bodyCircles, donePath, undonePath, stats
+
+    animation = FuncAnimation(fig, update, frames=len(chosenPath), interval=interval, blit=blit, repeat=False)
+    return animation, frames[-1][4]
 
 
 def showSimulation(cylinders, initialPosition, chosenPath):
     """
     Visualizes the simulation by seeing the path being drawn and the cylinder get recolted.
     The function animates the path being drawn step-by-step, showing the progression
-    and marking the cylinders that have been visited. The plot is updated in real-time
-    with a pause between each step to visualize the drawing process.
+    and marking the cylinders that have been visited.
     This also keep track of the fuel and time remaining and the mass of the robot, and show the path in different colors if the robot run out of fuel or time.
 
     Parameters:
@@ -76,55 +98,38 @@ def showSimulation(cylinders, initialPosition, chosenPath):
     initialPosition (tuple): The initial position (x, y) of the starting point.
     chosenPath (list): A list of points (tuples) representing the path to be visualized.
     """
-    # New figure
-    _, ax = plt.subplots()
-    ax.set_aspect('equal', adjustable='box')
-    # The already visited cylinders will be put in a list
-    alreadyVisitedCylinders = []
-    cylinderPosition = [cylinder.getPosition() for cylinder in cylinders]
-    # Keep track of mass, remaining time and remaining fuel
-    lastTimePointId = None
-    remainingTime = sim.totalTime
-    lastFuelPointId = None
-    remainingFuel = sim.Robot.initialFuelQuantity
-    currentMass = 0
-    currentPoints = 0
-    currentMassWithNoLimits = 0
-    currentPointsWithNoLimits = 0
-    # We plot the path by slowinglely adding the line one by one
-    for point in range(1, len(chosenPath)+1):
-        # We clear the plot to avoid superposition
-        plt.cla()
-        # If the cylinder is in the path, and the robot have fuel and time, we add it to the list of visited cylinders
-        # This just check if the final point is close to a cylinder, not if the line goes trough it (can be improved)
-        distanceFromCylinders = [distance(chosenPath[point-1], cylinder) for cylinder in cylinderPosition]
-        currentlyVisitedCylinder = [cylinderId for cylinderId in range(len(cylinderPosition)) if distanceFromCylinders[cylinderId] < TOO_CLOSE_CYLINDER]
-        if lastFuelPointId is None and lastTimePointId is None:
-            alreadyVisitedCylinders += currentlyVisitedCylinder
-        # We update the remaining time and fuel
-        distanceOfSegment = distance(chosenPath[point-1], chosenPath[point]) if point < len(chosenPath) else 0
-        remainingTime -= sim.Robot.timeCost(distanceOfSegment, currentMass)
-        remainingFuel -= sim.Robot.fuelCost(distanceOfSegment, currentMass)
-        # If we don't have enough fuel or time, we store the point where it happened
-        lastTimePointId = lastTimePointId if lastTimePointId is not None else point-1 if remainingTime < 0 else None
-        lastFuelPointId = lastFuelPointId if lastFuelPointId is not None else point-1 if remainingFuel < 0 else None
-        # We update the mass and points
-        currentMassWithNoLimits += sum([cylinders[cylinderId].getMass() for cylinderId in currentlyVisitedCylinder])
-        currentPointsWithNoLimits += sum([cylinders[cylinderId].getValue() for cylinderId in currentlyVisitedCylinder])
-        currentMass = sum([cylinders[cylinderId].getMass() for cylinderId in alreadyVisitedCylinders])
-        currentPoints = sum([cylinders[cylinderId].getValue() for cylinderId in alreadyVisitedCylinders])
-        # Plot the cylinders and exclude already visited ones
-        traceMap(ax, cylinders, initialPosition, alreadyVisitedCylinders)
-        # Plot the path
-        tracePath(chosenPath[:point], lastFuelPointId, lastTimePointId)
-        # Display stats
-        displayStats(ax, remainingTime, remainingFuel, currentMass, currentPoints, currentPointsWithNoLimits, currentMassWithNoLimits)
-        # We set a pause between each plot so that we can see the path being drawn
-        plt.pause(0.3)
-    # We show the final plot
+    fig, ax = plt.subplots()
+    # The animation must be kept until the window is closed
+    animation, points = animateSimulation(fig, ax, cylinders, initialPosition, chosenPath)
     plt.show()
     # Return the number of points
-    return currentPoints
+    return points
+
+
+def saveSimulation(cylinders, initialPosition, chosenPath, outFilename, fps=4, dpi=100):
+    """
+    Renders the animation of the simulation to a video file, without any display (Agg canvas).
+    A `.gif` file is written with Pillow, any other extension (like `.mp4`) with FFmpeg.
+
+    Args:
+        cylinders (list): A list of cylinder objects.
+        initialPosition (tuple): The initial position (x, y) of the starting point.
+        chosenPath (list): A list of points (tuples) representing the path to be visualized.
+        outFilename (str): The path of the video file.
+        fps (int, optional): The number of frames per second. Defaults to 4.
+        dpi (int, optional): The resolution of the video. Defaults to 100.
+
+    Returns:
+        float: The number of points collected at the end.
+    """
+    # The figure is not managed by pyplot, so no window is ever opened
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    animation, points = animateSimulation(fig, ax, cylinders, initialPosition, chosenPath, interval=1000 / fps)
+    writer = PillowWriter(fps=fps) if outFilename.lower().endswith('.gif') else FFMpegWriter(fps=fps)
+    animation.save(outFilename, writer=writer, dpi=dpi)
+    return points
 
 
 def justEstimatePoints(path, cylinders):
@@ -138,17 +143,5 @@ def justEstimatePoints(path, cylinders):
     Returns:
         float: The estimated number of points that will be collected by the robot.
     """
-    points = 0
-    mass = 0
-    remainingTime, remainingFuel = sim.totalTime, sim.Robot.initialFuelQuantity
-    for point in range(1, len(path)):
-        distanceOfSegment = distance(path[point-1], path[point])
-        for cylinder in cylinders:
-            if distance(path[point], cylinder.getPosition()) < TOO_CLOSE_CYLINDER:
-                points += cylinder.getValue()
-                mass += cylinder.getMass()
-        remainingTime -= sim.Robot.timeCost(distanceOfSegment, mass)
-        remainingFuel -= sim.Robot.fuelCost(distanceOfSegment, mass)
-        if remainingTime < 0 or remainingFuel < 0:
-            break
-    return points
\ No newline at end of file
+    # The robot collects a cylinder as soon as it touches it, and only once
+    return scoring.scorePath(path, cylinders).points
\ No newline at end of file
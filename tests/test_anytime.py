@@ -0,0 +1,32 @@
+import time
+import anytime
+import mapgen
+import pathsearch as ps
+from simulation import CylinderSet
+
+
+def _planner(count, seed):
+    cylinderArray = mapgen.generateMap(count, seed=seed)
+    cylinders = CylinderSet(cylinderArray[:, 0], cylinderArray[:, 1], cylinderArray[:, 2].astype(int))
+    return anytime.AnytimePlanner(cylinders, distances=ps.AvoidanceDistances(cylinders, (0, 0)))
+
+
+def test_stop_interrupts_the_2opt():
+    planner = _planner(150, seed=0)
+    greedyOrder = list(planner.greedyOrder)
+    planner.start()
+    time.sleep(0.5)
+    stopTime = time.perf_counter()
+    planner.stop(wait=True)
+    assert time.perf_counter() - stopTime < 2
+    assert not planner.isRunning()
+    assert planner.greedyOrder == greedyOrder
+
+
+def test_deadline_waits_for_the_thread():
+    cylinderArray = mapgen.generateMap(150, seed=1)
+    cylinders = CylinderSet(cylinderArray[:, 0], cylinderArray[:, 1], cylinderArray[:, 2].astype(int))
+    startTime = time.perf_counter()
+    order, path, score = anytime.planWithDeadline(cylinders, 1)
+    assert time.perf_counter() - startTime < 3
+    assert order and path and score.points > 0
@@ -0,0 +1,50 @@
+import itertools
+import math
+import exactsolver
+import localsearch
+import mapgen
+import orienteering as ori
+import pathsearch as ps
+from simulation import CylinderSet
+
+
+def _distances(count, seed):
+    cylinderArray = mapgen.generateMap(count, seed=seed)
+    cylinders = CylinderSet(cylinderArray[:, 0], cylinderArray[:, 1], cylinderArray[:, 2].astype(int))
+    return ps.AvoidanceDistances(cylinders, (0, 0))
+
+
+def _routes(count):
+    for size in range(1, count + 1):
+        yield from itertools.permutations(range(count), size)
+
+
+def test_whole_tour_is_the_cheapest_order():
+    # On this map the order with the least fuel isn't the one with the least time
+    distances = _distances(8, seed=3)
+    config = ps.PlannerConfig(fuelImportance=0, timeImportance=1)
+    order = exactsolver.planExact(distances.cylinders, distances=distances, withinBudget=False, config=config)
+    assert sorted(order) == list(range(8))
+    best = min(localsearch.routeCost(distances, route, config) for route in itertools.permutations(range(8)))
+    assert math.isclose(localsearch.routeCost(distances, order, config), best, rel_tol=1e-9)
+
+
+def test_within_budget_is_the_best_route():
+    distances = _distances(7, seed=2)
+    values = distances.cylinders.values
+    maxFuel = 0.4 * ori.routeUsage(distances, range(7))[1]
+    order = exactsolver.planExact(distances.cylinders, distances=distances, maxTime=math.inf, maxFuel=maxFuel)
+    time, fuel = ori.routeUsage(distances, order)
+    assert fuel <= maxFuel
+    best = max((sum(values[i] for i in route), -ori.routeUsage(distances, route)[1]) for route in _routes(7)
+               if ori.routeUsage(distances, route)[1] <= maxFuel)
+    assert math.isclose(sum(values[i] for i in order), best[0])
+    assert math.isclose(fuel, -best[1], rel_tol=1e-9)
+
+
+def test_time_is_followed_when_it_runs_out_first():
+    distances = _distances(7, seed=3)
+    maxTime = 0.3 * ori.routeUsage(distances, range(7))[0]
+    order = exactsolver.planExact(distances.cylinders, distances=distances, maxTime=maxTime, maxFuel=math.inf)
+    assert order
+    assert ori.routeUsage(distances, order)[0] <= maxTime
@@ -0,0 +1,54 @@
+import math
+import localsearch as ls
+import mapgen
+import pathsearch as ps
+from simulation import CylinderSet
+
+
+def _state(count, seed, config=None):
+    cylinderArray = mapgen.generateMap(count, seed=seed)
+    cylinders = CylinderSet(cylinderArray[:, 0], cylinderArray[:, 1], cylinderArray[:, 2].astype(int))
+    distances = ps.AvoidanceDistances(cylinders, (0, 0))
+    return ls._RouteState(distances, [4, 1, 8, 0, 6, 3, 9, 2, 7, 5], config)
+
+
+def test_reversal_deltas_match_the_route_cost():
+    state = _state(10, seed=5, config=ps.PlannerConfig(fuelImportance=0.5, timeImportance=0.5))
+    order = state.route[1:]
+    cost = ls.routeCost(state.distances, order, state.config)
+    n = len(order)
+    for i in range(n - 1):
+        for j in range(i + 2, n + 1):
+            delta, bestJ = ls._bestReversal(state, i, {j}, j, threshold=math.inf)
+            reversedOrder = order[:i] + order[i:j][::-1] + order[j:]
+            assert bestJ == j
+            assert math.isclose(delta, ls.routeCost(state.distances, reversedOrder, state.config) - cost, abs_tol=1e-9)
+
+
+def test_or_opt_deltas_match_the_route_cost():
+    state = _state(10, seed=6)
+    route = state.route
+    cost = ls.routeCost(state.distances, route[1:])
+    n = len(route) - 1
+    for segmentLength in (1, 2, 3):
+        for start in range(1, n - segmentLength + 2):
+            segment = route[start:start + segmentLength]
+            for p in range(0, n + 1):
+                if start - 1 <= p <= start + segmentLength - 1:
+                    continue
+                for movedSegment in (segment, segment[::-1]):
+                    if p < start:
+                        first, newPoints = p + 1, movedSegment + route[p + 1:start]
+                    else:
+                        first, newPoints = start, route[start + segmentLength:p + 1] + movedSegment
+                    newRoute = route[:first] + newPoints + route[first + len(newPoints):]
+                    expected = ls.routeCost(state.distances, newRoute[1:]) - cost
+                    assert math.isclose(state.replacementDelta(first, newPoints), expected, abs_tol=1e-9)
+
+
+def test_improve_never_makes_the_route_worse():
+    state = _state(10, seed=7)
+    order = state.route[1:]
+    improved = ls.improve(state.distances, order)
+    assert sorted(improved) == sorted(order)
+    assert ls.routeCost(state.distances, improved) <= ls.routeCost(state.distances, order) + 1e-9
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+import mapgen
+from simulation import Cylinder
+
+
+@pytest.mark.parametrize('layout', mapgen.LAYOUTS)
+def test_same_seed_gives_the_same_map(layout):
+    cylinderArray = mapgen.generateMap(50, layout, seed=8)
+    assert cylinderArray.shape == (50, 3)
+    assert np.array_equal(cylinderArray, mapgen.generateMap(50, layout, seed=8))
+    assert not np.array_equal(cylinderArray, mapgen.generateMap(50, layout, seed=9))
+
+
+@pytest.mark.parametrize('layout', mapgen.LAYOUTS)
+def test_cylinders_never_overlap(layout):
+    positions = mapgen.generateMap(200, layout, seed=10)[:, :2]
+    gaps = np.hypot(*(positions[:, np.newaxis] - positions[np.newaxis]).transpose(2, 0, 1))
+    np.fill_diagonal(gaps, np.inf)
+    assert gaps.min() >= 2 * Cylinder.radius
+
+
+def test_unknown_layout_is_refused():
+    with pytest.raises(ValueError):
+        mapgen.generateMap(10, 'spiral')
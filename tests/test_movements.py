@@ -0,0 +1,21 @@
+import pathsearch as ps
+import replay
+
+
+def test_collinear_points_are_one_go():
+    path = [(0, 0), (1, 0.003), (2, 0.006), (3, 0.009), (4, 0.012)]
+    assert ps.generateMouvement(path) == ['TURN 0.17', 'GO 4.00', 'FINISH']
+
+
+def test_merged_go_is_rounded_once():
+    path = [(0, 0), (1, 1), (2, 2), (3, 3), (7, 7.0001)]
+    movements = ps.generateMouvement(path)
+    assert movements == ['TURN 45.00', 'GO 9.90', 'FINISH']
+    assert replay.pathDrift(movements, path)[1] < 0.001
+
+
+def test_turns_follow_the_path():
+    path = [(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)]
+    movements = ps.generateMouvement(path)
+    assert movements == ['GO 1.00', 'TURN 90.00', 'GO 1.00', 'TURN 90.00', 'GO 1.00', 'TURN 90.00', 'GO 1.00', 'FINISH']
+    assert max(replay.pathDrift(movements, path)) < 1e-6
@@ -0,0 +1,37 @@
+import math
+import os
+import inoutfilereader as io
+import mapgen
+import orienteering as ori
+import pathsearch as ps
+import scoring
+from simulation import CylinderSet
+
+EVAL_MAP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples', 'maps-eval', 'donnees-map-7.txt')
+
+
+def test_insertion_and_removal_usage_match_the_rebuilt_route():
+    cylinderArray = mapgen.generateMap(10, seed=4)
+    cylinders = CylinderSet(cylinderArray[:, 0], cylinderArray[:, 1], cylinderArray[:, 2].astype(int))
+    distances = ps.AvoidanceDistances(cylinders, (0, 0))
+    order = [3, 0, 7, 5, 9]
+    route = ori._BudgetedRoute(distances, order)
+    for p in range(len(route.route)):
+        usage = route.insertionUsage(8, p)
+        expected = ori.routeUsage(distances, order[:p] + [8] + order[p:])
+        assert all(math.isclose(a, b) for a, b in zip(usage, expected))
+    for p in range(1, len(route.route)):
+        usage = route.removalUsage(p)
+        expected = ori.routeUsage(distances, order[:p - 1] + order[p:])
+        assert all(math.isclose(a, b) for a, b in zip(usage, expected))
+
+
+def test_route_usage_is_the_scored_usage():
+    cylinders = io.loadCylinders(EVAL_MAP)
+    distances = ps.AvoidanceDistances(cylinders, (0, 0))
+    order = ori.planWithinBudget(cylinders, (0, 0), distances)
+    time, fuel = ori.routeUsage(distances, order)
+    score = scoring.scorePath(ps.pathFromCylindersOrder(cylinders, order, (0, 0), distances), cylinders)
+    assert score.truncationIndex is None
+    assert score.collected == order
+    assert math.isclose(score.time, time) and math.isclose(score.fuel, fuel)
@@ -0,0 +1,37 @@
+import os
+import pathsearch as ps
+from plancache import PlanCache
+from simulation import CylinderSet
+
+CYLINDERS = CylinderSet([1.0, 5.0, 9.0], [2.0, 6.0, 3.0], [1, 2, 3])
+
+
+def test_key_depends_on_the_map_and_the_options():
+    key = PlanCache.key(CYLINDERS, (0, 0), True)
+    assert key == PlanCache.key(CylinderSet([1.0, 5.0, 9.0], [2.0, 6.0, 3.0], [1, 2, 3]), (0, 0), True)
+    assert key == PlanCache.key(CYLINDERS, (0, 0), True, ps.PlannerConfig())
+    otherKeys = [PlanCache.key(CylinderSet([1.0, 5.0, 9.0], [2.0, 6.0, 3.0], [1, 2, 2]), (0, 0), True),
+                 PlanCache.key(CYLINDERS, (1, 0), True),
+                 PlanCache.key(CYLINDERS, (0, 0), False),
+                 PlanCache.key(CYLINDERS, (0, 0), True, ps.PlannerConfig(fuelImportance=0.5)),
+                 PlanCache.key(CYLINDERS, (0, 0), True, router='visibility'),
+                 PlanCache.key(CYLINDERS, (0, 0), True, solver='exact')]
+    assert len(set(otherKeys + [key])) == len(otherKeys) + 1
+
+
+def test_put_and_get_give_back_the_plan(tmp_path):
+    cache = PlanCache(str(tmp_path))
+    key = PlanCache.key(CYLINDERS)
+    assert cache.get(key) is None
+    cache.put(key, [2, 0, 1], [(0, 0), (9.0, 3.0), (1.0, 2.0), (5.0, 6.0)], ['TURN 18.43', 'GO 9.49', 'FINISH'])
+    assert cache.get(key) == ([2, 0, 1], [(0.0, 0.0), (9.0, 3.0), (1.0, 2.0), (5.0, 6.0)], ['TURN 18.43', 'GO 9.49', 'FINISH'])
+
+
+def test_least_recently_used_plans_are_evicted(tmp_path):
+    cache = PlanCache(str(tmp_path))
+    cache.put('a', [0], [(0, 0), (1.0, 2.0)], ['FINISH'])
+    # Only one plan fits in the cache
+    cache.maxBytes = int(1.5 * os.path.getsize(os.path.join(str(tmp_path), 'a.npz')))
+    cache.put('b', [0], [(0, 0), (1.0, 2.0)], ['FINISH'])
+    assert cache.get('a') is None
+    assert cache.get('b') is not None
@@ -0,0 +1,17 @@
+import os
+import inoutfilereader as io
+import pipeline
+import replay
+
+EVAL_MAP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples', 'maps-eval', 'donnees-map-1.txt')
+
+
+def test_drift_is_measured_against_the_planned_path():
+    _, _, movements = pipeline.planMovements(io.loadCylinders(EVAL_MAP), (0, 0), True)
+    planOptions = (True, 'midpoint', 'heuristic', None)
+    result, = replay.replayMany([('script-1', movements)], [EVAL_MAP], workers=1, planOptions=planOptions)
+    assert 'error' not in result
+    assert max(result['maxDrift'], result['endDrift']) < replay.MAX_DRIFT
+    # A whole tour is another path : the script stops far from its end
+    result, = replay.replayMany([('script-1', movements)], [EVAL_MAP], workers=1, planOptions=(False,) + planOptions[1:])
+    assert result['endDrift'] > replay.MAX_DRIFT
@@ -0,0 +1,13 @@
+import math
+import pathsearch as ps
+import scoring
+from simulation import CylinderSet
+
+
+def test_pickup_radius_is_the_planner_one():
+    # A path that passes 1.62 m from the first cylinder and 1.7 m from the second one
+    cylinders = CylinderSet([5, 10], [1.62, 1.7], [1, 1])
+    score = scoring.scorePath([(0, 0), (20, 0)], cylinders)
+    assert math.isclose(ps.TOO_CLOSE_CYLINDER, 1.65)
+    assert score.collected == [0]
+    assert score.truncationIndex is None